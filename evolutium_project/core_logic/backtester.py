@@ -0,0 +1,146 @@
+import logging
+import math
+import numpy as np
+import pandas as pd
+from . import config
+from .risk_manager import is_trade_allowed
+
+TRADING_DAYS_PER_YEAR = 252
+
+class BacktestPosition:
+    """Posição simulada; expõe `ticker` como o modelo Position, para ser usada pelo risk_manager."""
+    def __init__(self, ticker: str, quantity: int, buy_price: float, opened_at):
+        self.ticker = ticker
+        self.quantity = quantity
+        self.buy_price = buy_price
+        self.opened_at = opened_at
+        self.last_price = buy_price
+
+class BacktestResult:
+    def __init__(self, equity_curve: pd.Series, trades: list, initial_balance: float):
+        self.equity_curve = equity_curve
+        self.trades = pd.DataFrame(trades, columns=["timestamp", "ticker", "side", "quantity", "price", "value", "pnl"])
+        self.stats = compute_summary_stats(equity_curve, self.trades, initial_balance)
+
+def compute_summary_stats(equity_curve: pd.Series, trades: pd.DataFrame, initial_balance: float) -> dict:
+    """CAGR, Sharpe anualizado (taxa livre de risco zero), drawdown máximo e estatísticas das operações."""
+    stats = {
+        "initial_balance": initial_balance, "final_equity": initial_balance, "total_return": 0.0,
+        "cagr": 0.0, "sharpe": 0.0, "max_drawdown": 0.0, "trades": len(trades), "win_rate": 0.0,
+    }
+    if equity_curve.empty:
+        return stats
+    final_equity = float(equity_curve.iloc[-1])
+    stats["final_equity"] = final_equity
+    stats["total_return"] = final_equity / initial_balance - 1
+    years = len(equity_curve) / TRADING_DAYS_PER_YEAR
+    if years > 0 and final_equity > 0:
+        stats["cagr"] = (final_equity / initial_balance) ** (1 / years) - 1
+    returns = equity_curve.pct_change().dropna()
+    if len(returns) > 1 and returns.std() > 0:
+        stats["sharpe"] = float(returns.mean() / returns.std() * np.sqrt(TRADING_DAYS_PER_YEAR))
+    running_max = equity_curve.cummax()
+    stats["max_drawdown"] = float((equity_curve / running_max - 1).min())
+    closed = trades[trades["side"] == "SELL"]
+    if len(closed):
+        stats["win_rate"] = float((closed["pnl"] > 0).mean())
+    return stats
+
+class Backtester:
+    """
+    Laço de eventos do backtest: percorre os pregões do BacktestDataProvider, aplica o risk_manager,
+    simula as execuções ao preço de fechamento e mantém o caixa e as posições.
+    """
+    def __init__(self, data_provider, decider, initial_balance: float = 100000.0,
+                 risk_percentage: float | None = None, slippage: float = 0.0):
+        self.data_provider = data_provider
+        self.decider = decider
+        self.initial_balance = initial_balance
+        self.risk_percentage = risk_percentage if risk_percentage is not None else config.RISK_PERCENTAGE_PER_TRADE
+        self.slippage = slippage
+
+    def run(self) -> BacktestResult:
+        cash = self.initial_balance
+        positions = {}
+        trades = []
+        equity_points = []
+        trading_days = self.data_provider.get_trading_days()
+        logging.info(f"[BACKTEST] Simulando {len(trading_days)} pregões com {len(self.data_provider.panel.tickers)} tickers...")
+
+        for day in trading_days:
+            self.data_provider.set_current_date(day)
+            snapshot = self.data_provider.get_snapshot()
+            if snapshot is None:
+                continue
+            market_context = self.data_provider.get_market_context() if hasattr(self.data_provider, 'get_market_context') else {"ibov_change": "N/A"}
+            trade_history = trades[-5:]
+
+            for ticker, position in positions.items():
+                column = snapshot.panel.ticker_index[ticker]
+                if snapshot.valid[column]:
+                    position.last_price = float(snapshot.close[column])
+
+            sell_decisions = self._decide_sells(snapshot, positions, trade_history, market_context)
+            for ticker in list(positions):
+                position = positions[ticker]
+                if sell_decisions.get(ticker, {}).get("decision") != "SELL":
+                    continue
+                price = position.last_price * (1 - self.slippage)
+                value = price * position.quantity
+                if not is_trade_allowed(cash, list(positions.values()), ticker, value, 'SELL'):
+                    continue
+                cash += value
+                pnl = (price - position.buy_price) * position.quantity
+                trades.append(self._trade(day, ticker, 'SELL', position.quantity, price, pnl))
+                del positions[ticker]
+
+            decision = self._decide_buy(snapshot, positions, market_context)
+            ticker = decision.get('ticker')
+            if decision.get("decision") == "BUY" and ticker in snapshot.panel.ticker_index and ticker not in positions:
+                column = snapshot.panel.ticker_index[ticker]
+                if snapshot.valid[column]:
+                    price = float(snapshot.close[column]) * (1 + self.slippage)
+                    quantity = math.floor(cash * self.risk_percentage / price)
+                    value = price * quantity
+                    if quantity > 0 and is_trade_allowed(cash, list(positions.values()), ticker, value, 'BUY', self.risk_percentage):
+                        cash -= value
+                        positions[ticker] = BacktestPosition(ticker, quantity, price, day)
+                        trades.append(self._trade(day, ticker, 'BUY', quantity, price, None))
+
+            equity_points.append(cash + sum(p.quantity * p.last_price for p in positions.values()))
+
+        equity_curve = pd.Series(equity_points, index=pd.DatetimeIndex(trading_days), name="equity", dtype="f8")
+        result = BacktestResult(equity_curve, trades, self.initial_balance)
+        logging.info(f"[BACKTEST] Concluído: {result.stats}")
+        return result
+
+    def _decide_sells(self, snapshot, positions: dict, trade_history: list, market_context: dict) -> dict:
+        reviews = []
+        for ticker, position in positions.items():
+            data = snapshot.market_data(ticker)
+            if data is not None:
+                reviews.append((data, {'ticker': ticker, 'quantity': position.quantity, 'buy_price': position.buy_price}))
+        if not reviews:
+            return {}
+        # Decisores com revisão em lote (SynthesisEngine) avaliam todas as posições do dia em uma única chamada.
+        if hasattr(self.decider, 'should_sell_positions'):
+            return self.decider.should_sell_positions(reviews, trade_history, market_context)
+        return {
+            current_pos['ticker']: self.decider.should_sell_position(data, current_pos, trade_history, market_context)
+            for data, current_pos in reviews
+        }
+
+    def _decide_buy(self, snapshot, positions: dict, market_context: dict) -> dict:
+        # Decisores vetorizados avaliam o pregão inteiro em arrays; os demais recebem a lista de dicionários.
+        if hasattr(self.decider, 'decide_best_investment_snapshot'):
+            return self.decider.decide_best_investment_snapshot(snapshot, set(positions), market_context)
+        candidates = [
+            data for ticker, valid in zip(snapshot.tickers, snapshot.valid)
+            if valid and ticker not in positions and (data := snapshot.market_data(ticker))
+        ]
+        if not candidates:
+            return {"decision": "HOLD", "ticker": None}
+        return self.decider.decide_best_investment_backtest(candidates, market_context)
+
+    def _trade(self, day, ticker: str, side: str, quantity: int, price: float, pnl) -> dict:
+        return {"timestamp": day, "ticker": ticker, "side": side, "quantity": quantity, "price": price, "value": price * quantity, "pnl": pnl}
@@ -0,0 +1,97 @@
+import logging
+import time
+import pandas as pd
+import yfinance as yf
+from . import config
+
+SUFFIX = ".SA"
+
+def yahoo_symbol(ticker: str) -> str:
+    """Símbolo no Yahoo: ações da B3 levam o sufixo .SA; índices (ex.: ^BVSP) vão como estão."""
+    return ticker if ticker.startswith("^") else f"{ticker}{SUFFIX}"
+
+def split_multi_ticker_frame(df: pd.DataFrame, tickers: list) -> dict:
+    """
+    Separa o DataFrame de um yf.download com vários tickers (colunas MultiIndex, em qualquer ordem de níveis)
+    em um DataFrame por ticker, no layout de uma coluna por campo usado pelo restante do código.
+    Tickers ausentes ou sem nenhum candle ficam de fora.
+    """
+    if df is None or df.empty:
+        return {}
+    if not isinstance(df.columns, pd.MultiIndex):
+        return {tickers[0]: df.dropna(how="all")} if len(tickers) == 1 else {}
+    symbols = {yahoo_symbol(ticker): ticker for ticker in tickers}
+    level = next((i for i in range(df.columns.nlevels) if symbols.keys() & set(df.columns.get_level_values(i))), None)
+    if level is None:
+        return {}
+    frames = {}
+    for symbol in df.columns.get_level_values(level).unique():
+        ticker = symbols.get(symbol)
+        if ticker is None:
+            continue
+        frame = df.xs(symbol, axis=1, level=level).dropna(how="all")
+        frame.columns.name = None
+        if not frame.empty:
+            frames[ticker] = frame
+    return frames
+
+def download_histories(tickers: list, start: pd.Timestamp, end: pd.Timestamp) -> dict:
+    """Candles diários de vários tickers da B3 em [start, end) com uma única requisição ao Yahoo."""
+    df = yf.download(
+        [yahoo_symbol(ticker) for ticker in tickers], start=start.strftime('%Y-%m-%d'), end=end.strftime('%Y-%m-%d'),
+        group_by="ticker", auto_adjust=False, progress=False, threads=True,
+    )
+    return split_multi_ticker_frame(df, tickers)
+
+def per_ticker(download):
+    """Adapta uma função de download de um ticker (ticker, start, end) para a interface em lote."""
+    def download_many(tickers, start, end):
+        return {ticker: download(ticker, start, end) for ticker in tickers}
+    return download_many
+
+class BulkDownloader:
+    """
+    Baixa o histórico do universo em lotes de `chunk_size` tickers por requisição. Tickers que falham
+    (exceção no lote ou nenhum candle devolvido) são tentados de novo, só eles, até `max_attempts` vezes.
+    """
+    def __init__(self, download_many=None, chunk_size: int | None = None, max_attempts: int | None = None,
+                 retry_pause: float | None = None):
+        self.download_many = download_many if download_many else download_histories
+        self.chunk_size = chunk_size if chunk_size else config.BULK_DOWNLOAD_CHUNK_SIZE
+        self.max_attempts = max_attempts if max_attempts else config.BULK_DOWNLOAD_MAX_ATTEMPTS
+        self.retry_pause = retry_pause if retry_pause is not None else config.BULK_DOWNLOAD_RETRY_PAUSE_SECONDS
+        self.last_report = {}
+
+    def fetch(self, tickers: list, start: pd.Timestamp, end: pd.Timestamp, max_attempts: int | None = None) -> dict:
+        """`max_attempts` substitui o do downloader só nesta busca (ex.: 1 no caminho ao vivo, sem pausas entre tentativas)."""
+        max_attempts = max_attempts if max_attempts else self.max_attempts
+        pending = list(dict.fromkeys(tickers))
+        results, requests = {}, 0
+        for attempt in range(1, max_attempts + 1):
+            failed = []
+            for i in range(0, len(pending), self.chunk_size):
+                chunk = pending[i:i + self.chunk_size]
+                requests += 1
+                try:
+                    frames = self.download_many(chunk, start, end)
+                except Exception as e:
+                    logging.error(f"[BULK] Falha no lote de {len(chunk)} tickers ({chunk[0]}...{chunk[-1]}): {e}")
+                    failed.extend(chunk)
+                    continue
+                for ticker in chunk:
+                    df = frames.get(ticker)
+                    if df is None or df.empty:
+                        failed.append(ticker)
+                    else:
+                        results[ticker] = df
+            pending = failed
+            if not pending or attempt == max_attempts:
+                break
+            logging.warning(f"[BULK] {len(pending)} ticker(s) sem dados; nova tentativa ({attempt + 1}/{max_attempts}) só para eles.")
+            time.sleep(self.retry_pause * attempt)
+        self.last_report = {"tickers": len(results) + len(pending), "requests": requests, "failed": pending}
+        logging.info(
+            f"[BULK] {len(results)} de {len(results) + len(pending)} tickers baixados de {start.date()} a {end.date()} "
+            f"em {requests} requisição(ões)."
+        )
+        return results
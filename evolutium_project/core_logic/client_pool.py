@@ -0,0 +1,77 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from . import config
+
+class KeyedClientPool:
+    """
+    Pool de clientes por chave (ex.: um SynthesisEngine por chave de API), criados sob demanda pela `factory`.
+    Clientes sem uso há mais de `idle_ttl` segundos são descartados e, acima de `max_size`, saem os usados há mais tempo.
+    As chaves são guardadas como hash, para que a chave de API não fique em memória como índice.
+    """
+    def __init__(self, factory, idle_ttl: float | None = None, max_size: int | None = None, name: str = "clientes"):
+        self.factory = factory
+        self.idle_ttl = idle_ttl if idle_ttl is not None else config.CLIENT_POOL_IDLE_SECONDS
+        self.max_size = max_size if max_size else config.CLIENT_POOL_MAX_SIZE
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _hash(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        hashed = self._hash(key)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._entries.get(hashed)
+            if entry is not None:
+                self._entries[hashed] = (now, entry[1])
+                self._entries.move_to_end(hashed)
+                self._stats["hits"] += 1
+                return entry[1]
+            # A criação fica sob o lock para que duas análises simultâneas da mesma chave não criem dois clientes.
+            client = self.factory(key)
+            self._entries[hashed] = (now, client)
+            self._stats["misses"] += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        logging.info(f"[POOL] Novo cliente criado no pool de {self.name} ({len(self._entries)} ativo(s)).")
+        return client
+
+    def _evict_idle(self, now: float):
+        if not self.idle_ttl:
+            return
+        expired = [hashed for hashed, (last_used, _) in self._entries.items() if now - last_used > self.idle_ttl]
+        for hashed in expired:
+            del self._entries[hashed]
+        self._stats["evictions"] += len(expired)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "size": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def _make_engine(api_key: str):
+    from .synthesis_engine import SynthesisEngine
+    return SynthesisEngine(api_key=api_key)
+
+_engine_pool = None
+_engine_pool_lock = threading.Lock()
+
+def get_engine_pool() -> KeyedClientPool:
+    """Pool do processo com um SynthesisEngine por chave de API, reaproveitado entre análises e usuários."""
+    global _engine_pool
+    with _engine_pool_lock:
+        if _engine_pool is None:
+            _engine_pool = KeyedClientPool(_make_engine, name="motores do Gemini")
+        return _engine_pool
@@ -55,3 +55,67 @@ TICKERS_TO_MONITOR = [
 ]
 
 RISK_PERCENTAGE_PER_TRADE = 0.25
+
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", 16))
+FETCH_TIMEOUT_SECONDS = float(os.getenv("FETCH_TIMEOUT_SECONDS", 30))
+
+MARKET_CACHE_TTL_INFO = float(os.getenv("MARKET_CACHE_TTL_INFO", 900))
+MARKET_CACHE_TTL_HISTORY = float(os.getenv("MARKET_CACHE_TTL_HISTORY", 900))
+MARKET_CACHE_TTL_NEWS = float(os.getenv("MARKET_CACHE_TTL_NEWS", 1800))
+# Cotações da marcação a mercado do painel: curtas, mas compartilhadas por todos os usuários.
+MARKET_CACHE_TTL_QUOTE = float(os.getenv("MARKET_CACHE_TTL_QUOTE", 60))
+MARKET_CACHE_MAX_ENTRIES = int(os.getenv("MARKET_CACHE_MAX_ENTRIES", 2000))
+# Caminho de um arquivo SQLite para compartilhar o cache entre processos. Vazio = apenas memória.
+MARKET_CACHE_DB = os.getenv("MARKET_CACHE_DB", "")
+
+HISTORY_STORE_DIR = os.getenv("HISTORY_STORE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "market_data", "history"))
+HISTORY_LIVE_PERIOD_DAYS = int(os.getenv("HISTORY_LIVE_PERIOD_DAYS", 150))
+# Dias recentes em que a falta de candles depois do último recebido pode ser só atraso do Yahoo: não contam como cobertos.
+HISTORY_SETTLE_DAYS = int(os.getenv("HISTORY_SETTLE_DAYS", 5))
+
+SWEEP_MAX_WORKERS = int(os.getenv("SWEEP_MAX_WORKERS", os.cpu_count() or 1))
+
+ANALYSIS_JOB_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", 4))
+# Jobs ativos há mais tempo que isso são considerados perdidos (ex.: processo reiniciado) e liberam uma nova submissão.
+ANALYSIS_JOB_STALE_SECONDS = float(os.getenv("ANALYSIS_JOB_STALE_SECONDS", 1800))
+
+# Pré-triagem técnica antes do LLM: só os PRESCREEN_TOP_K melhores candidatos entram no prompt (0 desativa).
+PRESCREEN_TOP_K = int(os.getenv("PRESCREEN_TOP_K", 15))
+PRESCREEN_MIN_TRADED_VALUE = float(os.getenv("PRESCREEN_MIN_TRADED_VALUE", 1_000_000))
+PRESCREEN_RSI_LOW = float(os.getenv("PRESCREEN_RSI_LOW", 40))
+PRESCREEN_RSI_HIGH = float(os.getenv("PRESCREEN_RSI_HIGH", 70))
+
+# Orçamento do prompt de compra: acima dele o PromptBuilder corta manchetes e depois os candidatos de menor nota.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 6000))
+PROMPT_MAX_NEWS_PER_CANDIDATE = int(os.getenv("PROMPT_MAX_NEWS_PER_CANDIDATE", 3))
+PROMPT_NEWS_MAX_CHARS = int(os.getenv("PROMPT_NEWS_MAX_CHARS", 100))
+
+# Cache persistente das respostas do LLM (chave = sha256 do modelo + prompt). TTL 0 = sem expiração.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "market_data", "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 20000))
+
+# Cliente do LLM: limite de taxa por chave de API (token bucket), novas tentativas com backoff e prazo por chamada.
+LLM_RATE_LIMIT_PER_MINUTE = float(os.getenv("LLM_RATE_LIMIT_PER_MINUTE", 60))
+LLM_RATE_LIMIT_BURST = int(os.getenv("LLM_RATE_LIMIT_BURST", 5))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", 1))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", 20))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 90))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+
+# Backend de decisão padrão dos comandos ('gemini' ou 'rules'); cada usuário pode escolher o seu no perfil.
+DECISION_BACKEND = os.getenv("DECISION_BACKEND", "gemini")
+
+# Pool de motores e clientes do LLM por chave de API.
+CLIENT_POOL_IDLE_SECONDS = float(os.getenv("CLIENT_POOL_IDLE_SECONDS", 1800))
+CLIENT_POOL_MAX_SIZE = int(os.getenv("CLIENT_POOL_MAX_SIZE", 100))
+
+# Download em lote do histórico: tickers por requisição ao yf.download e tentativas para os tickers que falharem.
+BULK_DOWNLOAD_CHUNK_SIZE = int(os.getenv("BULK_DOWNLOAD_CHUNK_SIZE", 100))
+BULK_DOWNLOAD_MAX_ATTEMPTS = int(os.getenv("BULK_DOWNLOAD_MAX_ATTEMPTS", 3))
+BULK_DOWNLOAD_RETRY_PAUSE_SECONDS = float(os.getenv("BULK_DOWNLOAD_RETRY_PAUSE_SECONDS", 2))
+
+# Contexto de mercado (Ibovespa, amplitude, regime de volatilidade) compartilhado pelas análises ao vivo.
+MARKET_CONTEXT_TTL_SECONDS = float(os.getenv("MARKET_CONTEXT_TTL_SECONDS", 900))
@@ -1,47 +1,65 @@
 import yfinance as yf
+import numpy as np
 import pandas as pd
 import logging
-import pandas_ta as ta
+import threading
+from .indicators import apply_indicators
+from .market_cache import MarketDataCache, get_shared_cache
+from .history_store import HistoryStore, get_shared_history_store
+from .market_context import BREADTH_FIELD, MarketContextService, context_from_row
+from .market_panel import MarketPanel, MarketSnapshot
+from .streaming_indicators import StreamingIndicatorBook
+from .trading_calendar import TradingCalendar, get_shared_calendar
 
 class DataProvider:
+    def __init__(self, cache: MarketDataCache | None = None, history_store: HistoryStore | None = None,
+                 calendar: TradingCalendar | None = None):
+        self.cache = cache if cache is not None else get_shared_cache()
+        self.history_store = history_store if history_store is not None else get_shared_history_store()
+        self.calendar = calendar if calendar is not None else get_shared_calendar()
+        # Indicadores mantidos entre análises: cada atualização do histórico aplica só as barras novas e revisa a do dia.
+        self.indicators = StreamingIndicatorBook()
+
+    def prefetch_history(self, tickers) -> int:
+        """
+        Baixa em lote o histórico recente dos tickers que não estão no cache, para que get_market_data não faça
+        uma requisição de histórico por ticker. Devolve quantos tickers foram carregados.
+        Na análise ao vivo é uma única tentativa, sem pausas nem novas tentativas ticker a ticker: quem falhar no lote
+        fica fora do cache e é buscado uma vez pelo próprio get_market_data. As repetições ficam para o backtest.
+        """
+        stale = [ticker for ticker in dict.fromkeys(tickers) if not self.cache.has("history", ticker)]
+        if not stale:
+            return 0
+        frames = self.history_store.prefetch(stale, *self.history_store.recent_window(), max_attempts=1, fallback=False)
+        for ticker, df in frames.items():
+            self.cache.set("history", ticker, df)
+        return len(frames)
+
     def get_market_data(self, ticker: str) -> dict | None:
         yf_ticker_str = f"{ticker}.SA"
         logging.info(f"[DATA PROV] Buscando dados para {yf_ticker_str}...")
         try:
             yf_ticker = yf.Ticker(yf_ticker_str)
-            info = yf_ticker.info
+            info = self.cache.get_or_fetch("info", ticker, lambda: yf_ticker.info)
             if not info or 'currentPrice' not in info:
                 logging.warning(f"[DATA PROV] Não foram encontrados dados para {yf_ticker_str}.")
                 return None
             
-            hist_df = yf_ticker.history(period="150d", interval="1d", auto_adjust=False)
-            
-            if isinstance(hist_df.columns, pd.MultiIndex):
-                hist_df.columns = hist_df.columns.droplevel(1)
+            hist_df = self.cache.get_or_fetch("history", ticker, lambda: self.history_store.get_recent(ticker))
 
             technical_indicators = {}
             if not hist_df.empty and len(hist_df) > 50:
-                hist_df.ta.sma(length=21, append=True)
-                hist_df.ta.sma(length=50, append=True)
-                hist_df.ta.rsi(length=14, append=True)
-                hist_df.ta.bbands(length=20, append=True)
-                hist_df.ta.macd(fast=12, slow=26, signal=9, append=True)
-                last_row = hist_df.iloc[-1]
-                technical_indicators = {
-                    "SMA_21": last_row.get('SMA_21'), "SMA_50": last_row.get('SMA_50'),
-                    "RSI_14": last_row.get('RSI_14'), "BBL_20_2.0": last_row.get('BBL_20_2.0'),
-                    "BBU_20_2.0": last_row.get('BBU_20_2.0'), "MACD_12_26_9": last_row.get('MACD_12_26_9'),
-                    "MACDh_12_26_9": last_row.get('MACDh_12_26_9'), "MACDs_12_26_9": last_row.get('MACDs_12_26_9'),
-                }
+                hist_df = self.calendar.align(hist_df)
+                technical_indicators = self.indicators.refresh(ticker, hist_df)
             
             fundamentals = {
                 "Preço Atual": info.get('currentPrice'), "P/L": info.get('trailingPE'),
                 "ROE": info.get('returnOnEquity'), "Dívida/Patrimônio": info.get('debtToEquity'),
                 "Dividend Yield": info.get('dividendYield'), "Margem Líquida": info.get('profitMargins'),
-                "Setor": info.get('sector'), "Resumo": info.get('longBusinessSummary')
+                "Setor": info.get('sector')
             }
             
-            news = yf_ticker.news
+            news = self.cache.get_or_fetch("news", ticker, lambda: yf_ticker.news)
             recent_news = [item['title'] for item in news[:5] if 'title' in item] if news else ["Nenhuma notícia recente encontrada."]
 
             logging.info(f"-> Dados para {ticker} obtidos com sucesso.")
@@ -53,35 +71,68 @@ class DataProvider:
             logging.error(f"[DATA PROV] Falha ao obter dados do yfinance para {ticker}: {e}", exc_info=True)
             return None
 
+_shared_provider = None
+_shared_provider_lock = threading.Lock()
+
+def get_shared_data_provider() -> DataProvider:
+    """DataProvider único do processo (cache, histórico e calendário já são compartilhados)."""
+    global _shared_provider
+    with _shared_provider_lock:
+        if _shared_provider is None:
+            _shared_provider = DataProvider()
+        return _shared_provider
+
 class BacktestDataProvider:
-    def __init__(self, tickers: list, start_date: str, end_date: str):
+    def __init__(self, tickers: list, start_date: str, end_date: str, history_store: HistoryStore | None = None):
         self.tickers = tickers
         self.start_date = start_date
         self.end_date = end_date
-        self.historical_data = self._preload_all_data()
+        self.history_store = history_store if history_store is not None else get_shared_history_store()
+        # O calendário é calculado uma única vez aqui e compartilhado com o motor de indicadores e o backtester.
+        self.calendar = TradingCalendar.b3(start_date, end_date)
+        raw_data = self._preload_all_data()
+        self.historical_data = apply_indicators(raw_data, calendar=self.calendar)
+        self.trading_days = self._active_sessions()
+        self.panel = MarketPanel.from_frames(
+            self.historical_data, dates=self.trading_days,
+            observed={ticker: df.index for ticker, df in raw_data.items()}
+        )
+        self.market_context = self._build_market_context()
         self.current_date = None
+        self.current_index = None
+
+    def _build_market_context(self) -> pd.DataFrame:
+        """Contexto de cada pregão (Ibovespa, amplitude, volatilidade) calculado uma vez, só com dados até o dia."""
+        close = self.panel.field("Close")
+        slow_average = self.panel.field(BREADTH_FIELD) if BREADTH_FIELD in self.panel.field_index else None
+        observed_close = np.where(self.panel.observed, close, np.nan)
+        return MarketContextService(self.history_store, universe=self.tickers).table(self.trading_days, observed_close, slow_average)
+
+    def _active_sessions(self) -> pd.DatetimeIndex:
+        """Pregões do calendário entre a primeira e a última barra carregada."""
+        if not self.historical_data:
+            return pd.DatetimeIndex([])
+        first = min(df.index[0] for df in self.historical_data.values())
+        last = max(df.index[-1] for df in self.historical_data.values())
+        return self.calendar.between(first, last + pd.Timedelta(days=1))
 
     def _preload_all_data(self) -> dict:
         logging.info(f"[BACKTEST DATA] Pré-carregando todos os dados de {self.start_date} a {self.end_date}...")
+        try:
+            # Um download em lote para o universo inteiro em vez de uma requisição por ticker.
+            frames = self.history_store.prefetch(self.tickers, self.start_date, self.end_date)
+        except Exception as e:
+            logging.error(f"[BACKTEST DATA] Falha no download em lote; carregando ticker a ticker: {e}")
+            frames = {}
         all_data = {}
         for ticker in self.tickers:
-            yf_ticker_str = f"{ticker}.SA"
             try:
-                df = yf.download(yf_ticker_str, start=self.start_date, end=self.end_date, progress=False, auto_adjust=False)
-                
+                df = frames[ticker] if ticker in frames else self.history_store.get_range(ticker, self.start_date, self.end_date)
+
                 if df.empty:
                     logging.warning(f" -> Nenhum dado encontrado para {ticker} no período.")
                     continue
 
-                if isinstance(df.columns, pd.MultiIndex):
-                    df.columns = df.columns.droplevel(1)
-
-                df.ta.sma(length=21, append=True)
-                df.ta.sma(length=50, append=True)
-                df.ta.rsi(length=14, append=True)
-                df.ta.bbands(length=20, append=True)
-                df.ta.macd(fast=12, slow=26, signal=9, append=True)
-                
                 all_data[ticker] = df
                 logging.info(f" -> Dados para {ticker} carregados com sucesso.")
             except Exception as e:
@@ -90,37 +141,30 @@ class BacktestDataProvider:
 
     def set_current_date(self, date):
         self.current_date = date
+        self.current_index = self.panel.date_index(date) if date is not None else None
 
     def get_trading_days(self) -> pd.DatetimeIndex:
-        if not self.historical_data:
-            return pd.DatetimeIndex([])
-        all_days = pd.DatetimeIndex([])
-        for ticker in self.historical_data:
-            all_days = all_days.union(self.historical_data[ticker].index)
-        return all_days.sort_values()
+        return self.trading_days
+
+    def get_market_context(self, index: int | None = None) -> dict:
+        index = self.current_index if index is None else index
+        if index is None or self.market_context.empty:
+            return {"ibov_change": "N/A"}
+        return context_from_row(self.trading_days[index], self.market_context.iloc[index])
+
+    def get_snapshot(self, index: int | None = None) -> MarketSnapshot | None:
+        """Todos os tickers do pregão `index` (ou da data corrente) em arrays, numa única chamada."""
+        index = self.current_index if index is None else index
+        if index is None:
+            return None
+        return self.panel.snapshot(index)
 
     def get_market_data(self, ticker: str) -> dict | None:
-        if ticker not in self.historical_data or self.current_date is None:
+        if self.current_index is None:
             return None
-        df = self.historical_data[ticker]
-        try:
-            day_data = df.loc[self.current_date]
-        except KeyError:
+        column = self.panel.ticker_index.get(ticker)
+        if column is None:
             return None
-        current_price = day_data.get('Close')
-        if pd.isna(current_price):
+        if not self.panel.observed[self.current_index, column]:
             return None
-        technical_indicators = {
-            "SMA_21": day_data.get('SMA_21'), "SMA_50": day_data.get('SMA_50'),
-            "RSI_14": day_data.get('RSI_14'), "BBL_20_2.0": day_data.get('BBL_20_2.0'),
-            "BBU_20_2.0": day_data.get('BBU_20_2.0'), "MACD_12_26_9": day_data.get('MACD_12_26_9'),
-            "MACDh_12_26_9": day_data.get('MACDh_12_26_9'), "MACDs_12_26_9": day_data.get('MACDs_12_26_9'),
-        }
-        fundamentals = {"Preço Atual": current_price}
-        return {
-            "ticker": ticker, "fundamental_data": fundamentals,
-            "technical_indicators": technical_indicators,
-            "recent_news": ["Notícias não disponíveis em modo de backtest."]
-        }
-    
-    
\ No newline at end of file
+        return self.panel.build_market_data(ticker, self.panel.values[self.current_index, column])
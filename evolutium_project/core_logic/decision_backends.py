@@ -0,0 +1,107 @@
+import math
+import numpy as np
+from . import config
+from .client_pool import get_engine_pool
+
+class RuleBasedDecider:
+    """
+    Decisor determinístico e local, com o mesmo contrato do SynthesisEngine (análise ao vivo e backtest).
+    Segue as regras descritas no prompt de backtest: tendência de alta, RSI não sobrecomprado e MACD positivo.
+    """
+    def __init__(self, rsi_overbought: float = 70.0, stop_loss: float = 0.08, take_profit: float = 0.20,
+                 sma_fast: int = 21, sma_slow: int = 50, rsi_length: int = 14,
+                 macd_fast: int = 12, macd_slow: int = 26, macd_signal: int = 9):
+        self.rsi_overbought = rsi_overbought
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        # Nomes das colunas no padrão do pandas_ta, para que as varreduras possam trocar os comprimentos dos indicadores.
+        self.sma_fast_column = f"SMA_{sma_fast}"
+        self.sma_slow_column = f"SMA_{sma_slow}"
+        self.rsi_column = f"RSI_{rsi_length}"
+        self.macd_hist_column = f"MACDh_{macd_fast}_{macd_slow}_{macd_signal}"
+
+    def _score(self, data: dict) -> float | None:
+        price = data['fundamental_data'].get('Preço Atual')
+        technicals = data.get('technical_indicators', {})
+        sma_fast, sma_slow = technicals.get(self.sma_fast_column), technicals.get(self.sma_slow_column)
+        rsi, macd_hist = technicals.get(self.rsi_column), technicals.get(self.macd_hist_column)
+        values = (price, sma_fast, sma_slow, rsi, macd_hist)
+        if any(v is None or (isinstance(v, float) and math.isnan(v)) for v in values):
+            return None
+        if not (price > sma_fast > sma_slow) or rsi >= self.rsi_overbought or macd_hist <= 0:
+            return None
+        return macd_hist / price
+
+    def decide_best_investment(self, candidates: list, trade_history: list, market_context: dict) -> dict:
+        # Mesma regra do prompt de compra: não recomprar um ativo vendido nas transações recentes.
+        recently_sold = {t['ticker'] for t in trade_history if t.get('side') == 'SELL'}
+        return self.decide_best_investment_backtest([c for c in candidates if c['ticker'] not in recently_sold], market_context)
+
+    def decide_best_investment_backtest(self, candidates: list, market_context: dict) -> dict:
+        best_ticker, best_score = None, None
+        for data in candidates:
+            score = self._score(data)
+            if score is not None and (best_score is None or score > best_score):
+                best_ticker, best_score = data['ticker'], score
+        if best_ticker is None:
+            return {"decision": "HOLD", "ticker": None, "rationale": "Nenhum candidato com sinais técnicos positivos."}
+        return {"decision": "BUY", "ticker": best_ticker, "rationale": f"Maior momentum (MACDh/preço = {best_score:.4f}) em tendência de alta."}
+
+    def decide_best_investment_snapshot(self, snapshot, excluded: set, market_context: dict) -> dict:
+        """Mesma regra de decide_best_investment_backtest, avaliada de uma vez sobre os arrays do pregão."""
+        price, sma_fast, sma_slow = snapshot.close, snapshot.field(self.sma_fast_column), snapshot.field(self.sma_slow_column)
+        rsi, macd_hist = snapshot.field(self.rsi_column), snapshot.field(self.macd_hist_column)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            eligible = snapshot.valid & (price > sma_fast) & (sma_fast > sma_slow) & (rsi < self.rsi_overbought) & (macd_hist > 0)
+            scores = np.where(eligible, macd_hist / price, -np.inf)
+        for ticker in excluded:
+            column = snapshot.panel.ticker_index.get(ticker)
+            if column is not None:
+                scores[column] = -np.inf
+        best = int(np.argmax(scores)) if len(scores) else 0
+        if not len(scores) or scores[best] == -np.inf:
+            return {"decision": "HOLD", "ticker": None, "rationale": "Nenhum candidato com sinais técnicos positivos."}
+        return {"decision": "BUY", "ticker": snapshot.tickers[best], "rationale": f"Maior momentum (MACDh/preço = {scores[best]:.4f}) em tendência de alta."}
+
+    def should_sell_position(self, position_data: dict, current_position: dict, trade_history: list, market_context: dict) -> dict:
+        price = position_data['fundamental_data'].get('Preço Atual')
+        technicals = position_data.get('technical_indicators', {})
+        buy_price = current_position.get('buy_price')
+        if price is None or not buy_price or (isinstance(price, float) and math.isnan(price)):
+            # Sem cotação (ou sem preço de compra) não há como medir o resultado: a posição é mantida.
+            return {"decision": "HOLD", "rationale": "Cotação indisponível para avaliar a posição."}
+        change = (price / buy_price) - 1
+        if change <= -self.stop_loss:
+            return {"decision": "SELL", "rationale": f"Stop loss atingido ({change:.2%})."}
+        if change >= self.take_profit:
+            return {"decision": "SELL", "rationale": f"Alvo de lucro atingido ({change:.2%})."}
+        sma_fast, macd_hist = technicals.get(self.sma_fast_column), technicals.get(self.macd_hist_column)
+        if sma_fast is not None and macd_hist is not None and price < sma_fast and macd_hist < 0:
+            return {"decision": "SELL", "rationale": "Preço abaixo da média curta com MACD negativo."}
+        return {"decision": "HOLD", "rationale": "Tendência preservada."}
+
+    def should_sell_positions(self, positions: list, trade_history: list, market_context: dict) -> dict:
+        return {
+            position['ticker']: self.should_sell_position(data, position, trade_history, market_context)
+            for data, position in positions
+        }
+
+GEMINI, RULES = 'gemini', 'rules'
+DECISION_BACKEND_CHOICES = [(GEMINI, 'Gemini (IA)'), (RULES, 'Regras técnicas (offline)')]
+
+def get_decision_backend(name: str | None = None, api_key: str | None = None, **options):
+    """
+    Cria o decisor pelo nome: 'gemini' (SynthesisEngine, exige chave de API) ou 'rules' (RuleBasedDecider, sem rede).
+    Todos atendem ao mesmo contrato: decide_best_investment, should_sell_position(s) e decide_best_investment_backtest.
+    """
+    name = (name or config.DECISION_BACKEND).lower()
+    if name == RULES:
+        return RuleBasedDecider(**options)
+    if name == GEMINI:
+        # Importado aqui para que o backend por regras não dependa do SDK do Gemini.
+        from .synthesis_engine import SynthesisEngine
+        api_key = api_key or config.GEMINI_API_KEY
+        if api_key and not options:
+            return get_engine_pool().get(api_key)
+        return SynthesisEngine(api_key=api_key, **options)
+    raise ValueError(f"Backend de decisão desconhecido: '{name}'. Opções: {', '.join(c for c, _ in DECISION_BACKEND_CHOICES)}.")
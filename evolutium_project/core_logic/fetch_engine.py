@@ -0,0 +1,75 @@
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from . import config
+
+class ConcurrentFetcher:
+    """
+    Busca os dados de mercado de vários tickers em paralelo, com um número limitado de workers.
+    Cada ticker é isolado: exceções e timeouts são registrados e o ticker é simplesmente descartado.
+    Além do timeout por ticker há um prazo total (as rodadas de `max_workers` buscas, cada uma com o seu timeout,
+    mais uma margem): se todos os workers ficarem presos, os tickers ainda na fila não seguram o laço para sempre.
+    """
+    DEADLINE_MARGIN_SECONDS = 1.0
+
+    def __init__(self, data_provider, max_workers: int | None = None, timeout: float | None = None):
+        self.data_provider = data_provider
+        self.max_workers = max_workers if max_workers else config.FETCH_MAX_WORKERS
+        self.timeout = timeout if timeout else config.FETCH_TIMEOUT_SECONDS
+
+    def iter_market_data(self, tickers):
+        """Gera os dados de cada ticker à medida que as buscas terminam (ordem de conclusão)."""
+        tickers = list(tickers)
+        if not tickers:
+            return
+        logging.info(f"[FETCH] Buscando {len(tickers)} tickers com até {self.max_workers} workers (timeout de {self.timeout:g}s por ticker)...")
+        started_at = {}
+        deadline = time.monotonic() + math.ceil(len(tickers) / self.max_workers) * self.timeout + self.DEADLINE_MARGIN_SECONDS
+
+        def _fetch(ticker):
+            started_at[ticker] = time.monotonic()
+            return self.data_provider.get_market_data(ticker)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fetch")
+        futures = {executor.submit(_fetch, ticker): ticker for ticker in tickers}
+        pending = set(futures)
+        try:
+            while pending:
+                timeout = min(self._next_deadline(pending, futures, started_at), max(deadline - time.monotonic(), 0.01))
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ticker = futures[future]
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        logging.error(f"[FETCH] Falha ao buscar {ticker}: {e}")
+                        continue
+                    if data:
+                        yield data
+                now = time.monotonic()
+                expired = {f for f in pending if futures[f] in started_at and now - started_at[futures[f]] > self.timeout}
+                for future in expired:
+                    logging.warning(f"[FETCH] Timeout ao buscar {futures[future]} após {self.timeout:g}s. Ticker ignorado.")
+                    future.cancel()
+                pending -= expired
+                if pending and now >= deadline:
+                    logging.warning(f"[FETCH] Prazo total esgotado; {len(pending)} ticker(s) ainda pendentes foram ignorados.")
+                    for future in pending:
+                        future.cancel()
+                    pending = set()
+        finally:
+            # Threads presas em I/O não podem ser interrompidas; apenas deixamos de esperar por elas.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def fetch_all(self, tickers) -> list:
+        """Busca todos os tickers em paralelo e devolve os resultados na ordem da lista de entrada."""
+        tickers = list(tickers)
+        results = {data['ticker']: data for data in self.iter_market_data(tickers)}
+        logging.info(f"[FETCH] {len(results)} de {len(tickers)} tickers obtidos com sucesso.")
+        return [results[ticker] for ticker in tickers if ticker in results]
+
+    def _next_deadline(self, pending, futures, started_at) -> float:
+        now = time.monotonic()
+        remaining = [self.timeout - (now - started_at[futures[f]]) for f in pending if futures[f] in started_at]
+        return max(min(remaining), 0.01) if remaining else self.timeout
@@ -0,0 +1,236 @@
+import json
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from collections import defaultdict
+from . import config
+from .bulk_download import BulkDownloader, per_ticker, yahoo_symbol
+from .trading_calendar import TradingCalendar, get_shared_calendar
+
+FIELDS = ("Open", "High", "Low", "Close", "Adj Close", "Volume")
+_DTYPE = np.dtype([("date", "M8[D]")] + [(field, "f8") for field in FIELDS])
+
+def download_history(ticker: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """Baixa os candles diários de um ticker da B3 no intervalo [start, end)."""
+    df = yf.download(yahoo_symbol(ticker), start=start.strftime('%Y-%m-%d'), end=end.strftime('%Y-%m-%d'), progress=False, auto_adjust=False)
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.droplevel(1)
+    return df
+
+class HistoryStore:
+    """
+    Armazena o histórico OHLC de cada ticker em um arquivo NumPy (.npy) local, indexado por data.
+    Só os candles que ainda não estão em disco são baixados; o restante é lido direto do arquivo.
+    `prefetch` baixa os trechos que faltam de muitos tickers de uma vez, com o `bulk_download` (BulkDownloader).
+    """
+    def __init__(self, root: str | None = None, download=None, calendar: TradingCalendar | None = None,
+                 bulk_download: BulkDownloader | None = None):
+        self.root = root if root else config.HISTORY_STORE_DIR
+        self.download = download if download else download_history
+        # Um `download` próprio sem versão em lote (ex.: nos testes) é usado ticker a ticker também no prefetch.
+        if bulk_download is None:
+            bulk_download = BulkDownloader() if download is None else BulkDownloader(per_ticker(download), max_attempts=1)
+        self.bulk_download = bulk_download
+        self.calendar = calendar if calendar is not None else get_shared_calendar()
+        os.makedirs(self.root, exist_ok=True)
+        self._manifest_path = os.path.join(self.root, "manifest.json")
+        self._manifest = self._read_manifest()
+        self._lock = threading.Lock()
+
+    def load(self, ticker: str) -> pd.DataFrame | None:
+        """Lê o histórico completo de um ticker do disco, sem acessar a rede."""
+        path = self._path(ticker)
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        index = pd.DatetimeIndex(data["date"].astype("datetime64[ns]"), name="Date")
+        return pd.DataFrame({field: data[field] for field in FIELDS}, index=index)
+
+    def get_range(self, ticker: str, start, end) -> pd.DataFrame:
+        """Histórico em [start, end), baixando apenas os trechos que faltam no disco."""
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        return self._slice(self._ensure_coverage(ticker, start, end), start, end)
+
+    def get_recent(self, ticker: str, days: int | None = None) -> pd.DataFrame:
+        """Histórico dos últimos `days` dias corridos até hoje, equivalente ao antigo period='150d'."""
+        return self.get_range(ticker, *self.recent_window(days))
+
+    @staticmethod
+    def recent_window(days: int | None = None) -> tuple:
+        days = days if days else config.HISTORY_LIVE_PERIOD_DAYS
+        today = pd.Timestamp.today().normalize()
+        return today - pd.Timedelta(days=days), today + pd.Timedelta(days=1)
+
+    def prefetch(self, tickers: list, start, end, max_attempts: int | None = None, fallback: bool = True) -> dict:
+        """
+        Equivale a get_range para cada ticker, mas os trechos que faltam são baixados em lote: tickers com o mesmo
+        trecho faltante vão juntos para o BulkDownloader (com até `max_attempts` tentativas, se informado).
+        Quem falhar no lote cai no download individual; com `fallback=False` fica de fora do resultado.
+        """
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        stored = {ticker: self.load(ticker) for ticker in dict.fromkeys(tickers)}
+        groups = defaultdict(list)
+        for ticker, df in stored.items():
+            for gap in self._missing_ranges(ticker, df, start, end):
+                groups[gap].append(ticker)
+
+        fetched, failed = defaultdict(dict), set()
+        for gap, group in groups.items():
+            frames = self.bulk_download.fetch(group, *gap, max_attempts=max_attempts)
+            for ticker in group:
+                if ticker in frames:
+                    fetched[ticker][gap] = self._normalize(frames[ticker])
+                else:
+                    failed.add(ticker)
+
+        coverage_updates = {}
+        for ticker in {t for group in groups.values() for t in group} - failed:
+            merged = self._merge([stored[ticker]] + list(fetched[ticker].values()))
+            if merged is not None:
+                self._save(ticker, merged)
+            stored[ticker] = merged
+            coverage = self._new_coverage(ticker, fetched[ticker])
+            if coverage is not None:
+                coverage_updates[ticker] = coverage
+        if coverage_updates:
+            self._update_manifest_many(coverage_updates)
+
+        frames = {}
+        for ticker, df in stored.items():
+            if ticker in failed:
+                if not fallback:
+                    continue
+                df = self._ensure_coverage(ticker, start, end)
+            frames[ticker] = self._slice(df, start, end)
+        return frames
+
+    def _slice(self, df: pd.DataFrame | None, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        if df is None:
+            return pd.DataFrame(columns=list(FIELDS))
+        return df.loc[(df.index >= start) & (df.index < end)]
+
+    def _missing_ranges(self, ticker: str, stored: pd.DataFrame | None, start: pd.Timestamp, end: pd.Timestamp) -> list:
+        coverage = self._manifest.get(ticker)
+        missing = []
+        if stored is None or coverage is None:
+            missing.append((start, end))
+        else:
+            covered_start, covered_end = pd.Timestamp(coverage["start"]), pd.Timestamp(coverage["end"])
+            # Trechos sem nenhum pregão (fins de semana, feriados da B3) não precisam ir à rede.
+            if start < covered_start and self.calendar.has_sessions(start, covered_start):
+                missing.append((start, covered_start))
+            if end > covered_end and self.calendar.has_sessions(covered_end, end):
+                # covered_end é exclusivo: um candle gravado nesse dia ainda estava em formação e é baixado de novo.
+                missing.append((covered_end, end))
+        return missing
+
+    def _new_coverage(self, ticker: str, fetched: dict) -> tuple | None:
+        """
+        Cobertura (start, end) após baixar os trechos `fetched` ({(início, fim): candles recebidos}).
+        Só trechos que devolveram candles contam: um download vazio ou com falha não avança a cobertura, senão o
+        trecho nunca mais seria pedido. O fim coberto vai até o último candle recebido; a parte do trecho depois dele
+        só é dada como coberta quando é mais antiga que HISTORY_SETTLE_DAYS (ex.: ticker que deixou de negociar),
+        porque nos dias recentes a falta pode ser só atraso na publicação.
+        """
+        coverage = self._manifest.get(ticker)
+        covered = (pd.Timestamp(coverage["start"]), pd.Timestamp(coverage["end"])) if coverage else None
+        # O candle de hoje ainda está em formação, então hoje nunca é considerado coberto.
+        today = pd.Timestamp.today().normalize()
+        settled = today - pd.Timedelta(days=config.HISTORY_SETTLE_DAYS)
+        for (fetch_start, fetch_end), df in fetched.items():
+            if df is None or df.empty:
+                continue
+            received_end = max(df.index.max() + pd.Timedelta(days=1), min(fetch_end, settled))
+            received_end = min(received_end, fetch_end, today)
+            if covered is None:
+                covered = (fetch_start, received_end)
+            else:
+                covered = (min(covered[0], fetch_start), max(covered[1], received_end))
+        return covered
+
+    def _ensure_coverage(self, ticker: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame | None:
+        stored = self.load(ticker)
+        missing = self._missing_ranges(ticker, stored, start, end)
+        if not missing:
+            return stored
+
+        fetched = {}
+        for fetch_start, fetch_end in missing:
+            logging.info(f"[HISTORY] Baixando {ticker} de {fetch_start.date()} a {fetch_end.date()}...")
+            df = self.download(ticker, fetch_start, fetch_end)
+            if df is not None and not df.empty:
+                fetched[(fetch_start, fetch_end)] = self._normalize(df)
+        if not fetched:
+            logging.warning(f"[HISTORY] Nenhum candle de {ticker}; a cobertura em disco não foi alterada.")
+            return stored
+        merged = self._merge([stored] + list(fetched.values()))
+        if merged is not None:
+            self._save(ticker, merged)
+        coverage = self._new_coverage(ticker, fetched)
+        if coverage is not None:
+            self._update_manifest_many({ticker: coverage})
+        return merged
+
+    def _normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = df.columns.droplevel(1)
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        df = df.reindex(columns=list(FIELDS)).astype("f8")
+        df.index = index.normalize().rename("Date")
+        return df
+
+    def _merge(self, frames: list) -> pd.DataFrame | None:
+        frames = [f for f in frames if f is not None and not f.empty]
+        if not frames:
+            return None
+        merged = pd.concat(frames)
+        return merged[~merged.index.duplicated(keep="last")].sort_index()
+
+    def _save(self, ticker: str, df: pd.DataFrame):
+        data = np.empty(len(df), dtype=_DTYPE)
+        data["date"] = df.index.values.astype("datetime64[D]")
+        for field in FIELDS:
+            data[field] = df[field].to_numpy(dtype="f8")
+        tmp_path = f"{self._path(ticker)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, data)
+        os.replace(tmp_path, self._path(ticker))
+
+    def _path(self, ticker: str) -> str:
+        return os.path.join(self.root, f"{ticker}.npy")
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self._manifest_path, "r") as f:
+                return json.load(f)
+        except (IOError, json.JSONDecodeError):
+            return {}
+
+    def _update_manifest_many(self, coverage: dict):
+        """Grava a cobertura (start, end) de vários tickers com uma única escrita do manifesto."""
+        with self._lock:
+            # Relê o manifesto para não sobrescrever o que outros processos gravaram.
+            manifest = {**self._manifest, **self._read_manifest()}
+            for ticker, (start, end) in coverage.items():
+                manifest[ticker] = {"start": start.strftime('%Y-%m-%d'), "end": end.strftime('%Y-%m-%d')}
+            tmp_path = f"{self._manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, self._manifest_path)
+            self._manifest = manifest
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+def get_shared_history_store() -> HistoryStore:
+    """Store único do processo, usado pelo DataProvider e pelo BacktestDataProvider."""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = HistoryStore()
+        return _shared_store
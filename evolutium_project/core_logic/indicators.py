@@ -0,0 +1,217 @@
+import sys
+import numpy as np
+import pandas as pd
+
+# Reproduz, de forma vetorizada sobre uma matriz (barras x tickers), os indicadores que antes eram
+# calculados ticker a ticker com pandas_ta (sma, rsi, bbands e macd), com os mesmos nomes de coluna.
+
+_WINDOW_CHUNK_ROWS = 256
+
+def _as_2d(close) -> np.ndarray:
+    close = np.asarray(close, dtype="f8")
+    return close.reshape(-1, 1) if close.ndim == 1 else close
+
+def _first_valid_rows(values: np.ndarray) -> np.ndarray:
+    """Índice da primeira linha não-NaN de cada coluna (len(values) se a coluna for toda NaN)."""
+    valid = ~np.isnan(values)
+    return np.where(valid.any(axis=0), valid.argmax(axis=0), len(values))
+
+def _rolling(values: np.ndarray, length: int, func) -> np.ndarray:
+    """Janela móvel com min_periods=length: qualquer NaN na janela gera NaN, como no pandas."""
+    out = np.full_like(values, np.nan)
+    if len(values) < length:
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(values, length, axis=0)
+    for start in range(0, len(windows), _WINDOW_CHUNK_ROWS):
+        chunk = windows[start:start + _WINDOW_CHUNK_ROWS]
+        out[start + length - 1:start + length - 1 + len(chunk)] = func(chunk, axis=-1)
+    return out
+
+def _last_valid_rows(values: np.ndarray) -> np.ndarray:
+    valid = ~np.isnan(values)
+    return len(values) - 1 - valid[::-1].argmax(axis=0)
+
+def _ewm_mean_dense(values: np.ndarray, starts: np.ndarray, alpha: float, adjust: bool) -> np.ndarray:
+    """Caminho rápido para colunas sem NaN entre a primeira e a última observação."""
+    out = np.empty_like(values)
+    decay = 1.0 - alpha
+    num = np.full(values.shape[1], np.nan)
+    den = np.ones(values.shape[1])
+    starting = {row: np.flatnonzero(starts == row) for row in np.unique(starts) if row < len(values)}
+    for row in range(len(values)):
+        cur = values[row]
+        if adjust:
+            num *= decay
+            num += cur
+            den *= decay
+            den += 1.0
+        else:
+            num *= decay
+            num += alpha * cur
+        cols = starting.get(row)
+        if cols is not None:
+            num[cols] = cur[cols]
+            den[cols] = 1.0
+        np.divide(num, den, out=out[row])
+    return out
+
+def _ewm_mean_general(values: np.ndarray, alpha: float, adjust: bool) -> np.ndarray:
+    """Mesma recursão do pandas (ignore_na=False), tratando NaN no meio da série."""
+    out = np.empty_like(values)
+    n_cols = values.shape[1]
+    weighted = np.full(n_cols, np.nan)
+    old_wt = np.ones(n_cols)
+    new_wt = 1.0 if adjust else alpha
+    decay = 1.0 - alpha
+    for row in range(len(values)):
+        cur = values[row]
+        is_obs = ~np.isnan(cur)
+        started = ~np.isnan(weighted)
+        old_wt = np.where(started, old_wt * decay, old_wt)
+        update = started & is_obs
+        with np.errstate(invalid="ignore"):
+            blended = (old_wt * weighted + new_wt * cur) / (old_wt + new_wt)
+        weighted = np.where(update, blended, np.where(is_obs & ~started, cur, weighted))
+        if adjust:
+            old_wt = np.where(update, old_wt + new_wt, old_wt)
+        else:
+            old_wt = np.where(update, 1.0, old_wt)
+        out[row] = weighted
+    return out
+
+def _ewm_mean(values: np.ndarray, alpha: float, adjust: bool, min_periods: int = 0) -> np.ndarray:
+    """
+    Equivalente a pandas.DataFrame.ewm(alpha=..., adjust=..., min_periods=...).mean(), coluna a coluna.
+    Barras depois da última observação de cada coluna ficam NaN.
+    """
+    isnan = np.isnan(values)
+    starts = _first_valid_rows(values)
+    lasts = _last_valid_rows(values)
+    counts = (~isnan).sum(axis=0)
+    gaps = (lasts - starts + 1) > counts
+    min_periods = max(min_periods, 1)
+
+    if not gaps.any():
+        out = _ewm_mean_dense(values, starts, alpha, adjust)
+    else:
+        out = np.full_like(values, np.nan)
+        dense = ~gaps
+        if dense.any():
+            out[:, dense] = _ewm_mean_dense(values[:, dense], starts[dense], alpha, adjust)
+        out[:, gaps] = _ewm_mean_general(values[:, gaps], alpha, adjust)
+        nobs = np.cumsum(~isnan[:, gaps], axis=0)
+        gap_out = out[:, gaps]
+        gap_out[nobs < min_periods] = np.nan
+        out[:, gaps] = gap_out
+
+    for col in range(values.shape[1]):
+        if not gaps[col]:
+            out[:starts[col] + min_periods - 1, col] = np.nan
+        out[lasts[col] + 1:, col] = np.nan
+    return out
+
+def _ema(values: np.ndarray, length: int) -> np.ndarray:
+    """EMA do pandas_ta: semente com a média das `length` primeiras barras de cada coluna e adjust=False."""
+    seeded = np.full_like(values, np.nan)
+    starts = _first_valid_rows(values)
+    for col, start in enumerate(starts):
+        if start >= len(values):
+            continue
+        seeded[start + length - 1:, col] = values[start + length - 1:, col]
+        if start + length - 1 < len(values):
+            with np.errstate(invalid="ignore"):
+                seeded[start + length - 1, col] = np.nanmean(values[start:start + length, col])
+    return _ewm_mean(seeded, alpha=2.0 / (length + 1), adjust=False)
+
+def _non_zero_range(high: np.ndarray, low: np.ndarray) -> np.ndarray:
+    diff = high - low
+    # pandas_ta soma epsilon à série inteira quando há alguma diferença exatamente zero.
+    has_zero = (diff == 0).any(axis=0)
+    return diff + np.where(has_zero, sys.float_info.epsilon, 0.0)
+
+def sma(close, length: int) -> np.ndarray:
+    return _rolling(_as_2d(close), length, np.mean)
+
+def rsi(close, length: int = 14) -> np.ndarray:
+    close = _as_2d(close)
+    diff = np.full_like(close, np.nan)
+    diff[1:] = close[1:] - close[:-1]
+    positive = np.where(diff > 0, diff, np.where(np.isnan(diff), np.nan, 0.0))
+    negative = np.where(diff < 0, diff, np.where(np.isnan(diff), np.nan, 0.0))
+    positive_avg = _ewm_mean(positive, alpha=1.0 / length, adjust=True, min_periods=length)
+    negative_avg = _ewm_mean(negative, alpha=1.0 / length, adjust=True, min_periods=length)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100 * positive_avg / (positive_avg + np.abs(negative_avg))
+
+def bbands(close, length: int = 20, std: float = 2.0) -> dict:
+    close = _as_2d(close)
+    mid = _rolling(close, length, np.mean)
+    deviations = std * _rolling(close, length, np.std)
+    lower = mid - deviations
+    upper = mid + deviations
+    ulr = _non_zero_range(upper, lower)
+    suffix = f"_{length}_{float(std)}"
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            f"BBL{suffix}": lower, f"BBM{suffix}": mid, f"BBU{suffix}": upper,
+            f"BBB{suffix}": 100 * ulr / mid, f"BBP{suffix}": _non_zero_range(close, lower) / ulr,
+        }
+
+def macd(close, fast: int = 12, slow: int = 26, signal: int = 9) -> dict:
+    close = _as_2d(close)
+    macd_line = _ema(close, fast) - _ema(close, slow)
+    signal_line = _ema(macd_line, signal)
+    suffix = f"_{fast}_{slow}_{signal}"
+    return {f"MACD{suffix}": macd_line, f"MACDh{suffix}": macd_line - signal_line, f"MACDs{suffix}": signal_line}
+
+def compute_indicators(close, sma_lengths=(21, 50), rsi_length: int = 14, bb_length: int = 20, bb_std: float = 2.0,
+                       macd_fast: int = 12, macd_slow: int = 26, macd_signal: int = 9) -> dict:
+    """
+    Calcula todos os indicadores usados pelo sistema para uma matriz de fechamentos (barras x tickers).
+    Colunas podem começar com NaN (ativo ainda não listado); a contagem de cada indicador começa na primeira barra válida.
+    """
+    close = _as_2d(close)
+    indicators = {f"SMA_{length}": sma(close, length) for length in sma_lengths}
+    indicators[f"RSI_{rsi_length}"] = rsi(close, rsi_length)
+    indicators.update(bbands(close, bb_length, bb_std))
+    indicators.update(macd(close, macd_fast, macd_slow, macd_signal))
+    return indicators
+
+def _min_bars(column: str) -> int:
+    """Quantidade mínima de barras que o pandas_ta exigia para gerar a coluna."""
+    lengths = [int(part) for part in column.split("_")[1:] if part.isdigit()]
+    return max(lengths) if lengths else 0
+
+def apply_indicators(frames: dict, calendar=None, **params) -> dict:
+    """
+    Anexa as colunas de indicadores a cada DataFrame OHLC, calculando todos os tickers em uma única passada.
+    As séries são alinhadas pela barra (e não pela data), então cada ticker tem o mesmo resultado que teria sozinho.
+    Com um TradingCalendar, cada série é antes alinhada aos pregões da B3 (forward-fill nos pregões sem negociação).
+    """
+    frames = {ticker: df for ticker, df in frames.items() if df is not None and not df.empty}
+    if calendar is not None:
+        frames = {ticker: calendar.align(df) for ticker, df in frames.items()}
+        frames = {ticker: df for ticker, df in frames.items() if not df.empty}
+    if not frames:
+        return {}
+    tickers = list(frames)
+    lengths = np.array([len(frames[ticker]) for ticker in tickers])
+    close = np.full((lengths.max(), len(tickers)), np.nan)
+    for col, ticker in enumerate(tickers):
+        close[:lengths[col], col] = frames[ticker]['Close'].to_numpy(dtype="f8")
+
+    indicators = compute_indicators(close, **params)
+    columns = list(indicators)
+
+    result = {}
+    for col, ticker in enumerate(tickers):
+        df = frames[ticker]
+        names = [column for column in columns if lengths[col] >= _min_bars(column)]
+        values = [indicators[column][:lengths[col], col] for column in names]
+        base = df.drop(columns=names) if df.columns.isin(names).any() else df
+        if (base.dtypes == np.float64).all():
+            # Caminho rápido: um único bloco float64, sem concatenação de DataFrames.
+            result[ticker] = pd.DataFrame(np.column_stack([base.to_numpy()] + values), index=df.index, columns=list(base.columns) + names)
+        else:
+            result[ticker] = pd.concat([base, pd.DataFrame(dict(zip(names, values)), index=df.index)], axis=1)
+    return result
@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from . import config
+
+def prompt_key(model_name: str, prompt: str) -> str:
+    """Chave endereçada por conteúdo: o mesmo modelo com o mesmo prompt (byte a byte) dá a mesma chave."""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+class LLMResponseCache:
+    """
+    Cache persistente (SQLite) das respostas do LLM, com TTL e limite de entradas (as menos usadas saem primeiro).
+    Só respostas não vazias são gravadas, para que uma falha da API não fique em cache.
+    """
+    # A remoção por tamanho roda a cada N gravações, não em toda gravação.
+    EVICTION_INTERVAL = 50
+
+    def __init__(self, path: str | None = None, ttl: float | None = None, max_entries: int | None = None):
+        self.path = path if path else config.LLM_CACHE_DB
+        self.ttl = ttl if ttl is not None else config.LLM_CACHE_TTL_SECONDS
+        self.max_entries = max_entries if max_entries else config.LLM_CACHE_MAX_ENTRIES
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, model TEXT NOT NULL, stored_at REAL NOT NULL, "
+                "last_used_at REAL NOT NULL, response TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, stat: str, amount: int = 1):
+        with self._lock:
+            self._stats[stat] += amount
+
+    def get(self, model_name: str, prompt: str) -> str | None:
+        key = prompt_key(model_name, prompt)
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT stored_at, response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[0] > self.ttl:
+                with conn:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                with conn:
+                    conn.execute("UPDATE llm_cache SET last_used_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logging.warning(f"[LLM CACHE] Falha ao ler o cache: {e}")
+            row = None
+        self._count("hits" if row is not None else "misses")
+        return row[1] if row is not None else None
+
+    def set(self, model_name: str, prompt: str, response: str):
+        if not response or not response.strip():
+            return
+        now = time.time()
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, stored_at, last_used_at, response) VALUES (?, ?, ?, ?, ?)",
+                    (prompt_key(model_name, prompt), model_name, now, now, response)
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"[LLM CACHE] Falha ao gravar no cache: {e}")
+            return
+        self._count("writes")
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.EVICTION_INTERVAL == 0
+        if evict:
+            self.evict()
+
+    def get_or_generate(self, model_name: str, prompt: str, generate) -> str:
+        cached = self.get(model_name, prompt)
+        if cached is not None:
+            return cached
+        response = generate()
+        self.set(model_name, prompt, response)
+        return response
+
+    def evict(self):
+        """Remove as entradas expiradas e, acima de max_entries, as usadas há mais tempo."""
+        try:
+            with self._connection() as conn:
+                removed = 0
+                if self.ttl:
+                    removed += conn.execute("DELETE FROM llm_cache WHERE stored_at < ?", (time.time() - self.ttl,)).rowcount
+                removed += conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+        except sqlite3.Error as e:
+            logging.warning(f"[LLM CACHE] Falha ao remover entradas antigas: {e}")
+            return
+        if removed:
+            self._count("evictions", removed)
+            logging.info(f"[LLM CACHE] {removed} resposta(s) removida(s) do cache.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_shared_llm_cache() -> LLMResponseCache | None:
+    """Cache único do processo, ou None se LLM_CACHE_ENABLED estiver desligado."""
+    global _shared_cache
+    if not config.LLM_CACHE_ENABLED:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = LLMResponseCache()
+        return _shared_cache
@@ -0,0 +1,209 @@
+import bisect
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from . import config
+from .client_pool import KeyedClientPool
+
+# Códigos HTTP (atributo `code` das exceções do google.api_core) que valem uma nova tentativa.
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+class LLMError(Exception):
+    """Falha definitiva de uma chamada ao LLM, depois das novas tentativas. `kind` classifica o erro nas métricas."""
+    def __init__(self, message: str, kind: str = "other", attempts: int = 1):
+        super().__init__(message)
+        self.kind = kind
+        self.attempts = attempts
+
+class LLMTimeoutError(LLMError):
+    def __init__(self, message: str, attempts: int = 1):
+        super().__init__(message, kind="timeout", attempts=attempts)
+
+def classify_error(error: Exception) -> tuple:
+    """(tipo do erro, se vale nova tentativa) a partir da exceção levantada pelo modelo."""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        if code == 429:
+            return "rate_limited", True
+        if code in RETRYABLE_STATUS_CODES:
+            return "timeout" if code in (408, 504) else "server", True
+        return "client", False
+    if isinstance(error, (TimeoutError, FutureTimeoutError)):
+        return "timeout", True
+    if isinstance(error, ConnectionError):
+        return "connection", True
+    return "other", False
+
+class TokenBucket:
+    """Limitador de taxa: `rate` chamadas por segundo em média, com rajadas de até `capacity`. rate <= 0 = sem limite."""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Consome uma ficha, esperando no máximo `timeout` segundos; False se não houver ficha a tempo."""
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining < wait:
+                    return False
+            time.sleep(wait)
+
+class LatencyHistogram:
+    """Histograma cumulativo de latências (segundos) em faixas fixas, no formato usado por Prometheus."""
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+
+    def quantile(self, q: float) -> float | None:
+        """Estimativa do quantil pelo limite superior da faixa em que ele cai (inf na última faixa)."""
+        with self._lock:
+            counts, total = list(self._counts), sum(self._counts)
+        if not total:
+            return None
+        target, seen = q * total, 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, total = list(self._counts), sum(self._counts)
+            mean = self._sum / total if total else None
+        buckets = {f"<={bound:g}s": count for bound, count in zip(self.buckets, counts)}
+        buckets[f">{self.buckets[-1]:g}s"] = counts[-1]
+        return {"count": total, "mean": mean, "p50": self.quantile(0.5), "p95": self.quantile(0.95), "buckets": buckets}
+
+class LLMClientMetrics:
+    """Latência das tentativas bem-sucedidas, erros por tipo, novas tentativas e espera no limitador de taxa."""
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.throttle_wait = LatencyHistogram()
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0}
+        self._errors = {}
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def error(self, kind: str):
+        with self._lock:
+            self._errors[kind] = self._errors.get(kind, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters, errors = dict(self._counters), dict(self._errors)
+        return {**counters, "errors": errors, "latency": self.latency.snapshot(), "throttle_wait": self.throttle_wait.snapshot()}
+
+class LLMClient:
+    """
+    Camada de chamada ao LLM compartilhada por todos os motores da mesma chave de API: limita a taxa com um
+    token bucket, repete os erros transitórios (429, 5xx, timeouts) com backoff exponencial e jitter, impõe um
+    prazo total a cada chamada e registra histogramas de latência e de erros. Funciona com qualquer objeto que
+    tenha `generate_content(prompt, request_options=...)`, como o GenerativeModel, o que permite testar com um modelo falso.
+    """
+    def __init__(self, rate_per_minute: float | None = None, burst: int | None = None, max_retries: int | None = None,
+                 backoff_base: float | None = None, backoff_max: float | None = None, timeout: float | None = None,
+                 max_concurrency: int | None = None):
+        rate_per_minute = rate_per_minute if rate_per_minute is not None else config.LLM_RATE_LIMIT_PER_MINUTE
+        self.rate_limiter = TokenBucket(rate_per_minute / 60, burst if burst is not None else config.LLM_RATE_LIMIT_BURST)
+        self.max_retries = max_retries if max_retries is not None else config.LLM_MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else config.LLM_BACKOFF_BASE_SECONDS
+        self.backoff_max = backoff_max if backoff_max is not None else config.LLM_BACKOFF_MAX_SECONDS
+        self.timeout = timeout if timeout is not None else config.LLM_TIMEOUT_SECONDS
+        self.max_concurrency = max_concurrency if max_concurrency else config.LLM_MAX_CONCURRENCY
+        self.metrics = LLMClientMetrics()
+        # Cada tentativa roda em uma thread deste pool para que o prazo valha mesmo se o SDK não tiver timeout próprio.
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm-call")
+
+    def generate(self, model, prompt: str, timeout: float | None = None) -> str:
+        """Texto da resposta do modelo. Levanta LLMError (ou LLMTimeoutError) quando todas as tentativas falham."""
+        self.metrics.count("calls")
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                text = self._attempt(model, prompt, deadline)
+                self.metrics.count("succeeded")
+                return text
+            except Exception as e:
+                kind, retryable = classify_error(e)
+                self.metrics.error(kind)
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+                remaining = deadline - time.monotonic()
+                if not retryable or attempt > self.max_retries or remaining <= delay:
+                    self.metrics.count("failed")
+                    if kind == "timeout":
+                        raise LLMTimeoutError(str(e) or kind, attempts=attempt) from e
+                    raise LLMError(str(e) or kind, kind=kind, attempts=attempt) from e
+                logging.warning(f"[LLM] Tentativa {attempt} falhou ({kind}: {e}); nova tentativa em {delay:.2f}s.")
+                self.metrics.count("retries")
+                time.sleep(delay)
+
+    def _attempt(self, model, prompt: str, deadline: float) -> str:
+        waited_from = time.monotonic()
+        if not self.rate_limiter.acquire(timeout=deadline - waited_from):
+            raise TimeoutError("prazo esgotado aguardando o limitador de taxa")
+        self.metrics.throttle_wait.observe(time.monotonic() - waited_from)
+        started_at = time.monotonic()
+        # O prazo vai também para o SDK, que encerra a requisição HTTP: sem ele, uma chamada travada ocupa a thread do pool
+        # mesmo depois que deixamos de esperar por ela.
+        request_options = {"timeout": max(deadline - started_at, 0.001)}
+        future = self._executor.submit(model.generate_content, prompt, request_options=request_options)
+        try:
+            response = future.result(timeout=max(deadline - started_at, 0))
+        except FutureTimeoutError:
+            # A thread presa na chamada não pode ser interrompida; apenas deixamos de esperar por ela.
+            future.cancel()
+            raise TimeoutError(f"sem resposta do modelo em {deadline - started_at:.1f}s")
+        self.metrics.latency.observe(time.monotonic() - started_at)
+        return response.text
+
+    def generate_many(self, model, prompts: list, timeout: float | None = None) -> list:
+        """Várias chamadas em paralelo (até max_concurrency); cada posição traz o texto ou o LLMError correspondente."""
+        def _generate(prompt):
+            try:
+                return self.generate(model, prompt, timeout=timeout)
+            except LLMError as e:
+                return e
+        if len(prompts) <= 1:
+            return [_generate(prompt) for prompt in prompts]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(prompts)), thread_name_prefix="llm-batch") as executor:
+            return list(executor.map(_generate, prompts))
+
+_clients = KeyedClientPool(lambda api_key: LLMClient(), name="clientes do LLM")
+
+def get_llm_client(api_key: str) -> LLMClient:
+    """
+    Cliente único por chave de API no processo, para que o limite de taxa valha para todas as análises da chave.
+    Fica num KeyedClientPool: chaves sem uso há CLIENT_POOL_IDLE_SECONDS e o excesso sobre CLIENT_POOL_MAX_SIZE são descartados.
+    """
+    return _clients.get(api_key)
@@ -0,0 +1,119 @@
+import json
+import logging
+import re
+import time
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from core_logic import config
+from core_logic.fetch_engine import ConcurrentFetcher
+from core_logic.indicators import apply_indicators
+from core_logic.llm_client import LLMClient
+from core_logic.prescreen import PreScreener
+from core_logic.prompt_builder import PromptBuilder, estimate_tokens
+from core_logic.response_decoder import ResponseDecoder
+from core_logic.synthesis_engine import SynthesisEngine
+
+class SimulatedResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class SimulatedModel:
+    """Modelo falso cuja latência cresce com o tamanho do prompt, como a de um LLM real."""
+    def __init__(self, base_latency: float, latency_per_1k_tokens: float):
+        self.base_latency = base_latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.prompt_tokens = []
+
+    def generate_content(self, prompt: str, request_options: dict | None = None) -> SimulatedResponse:
+        tokens = estimate_tokens(prompt)
+        self.prompt_tokens.append(tokens)
+        time.sleep(self.base_latency + self.latency_per_1k_tokens * tokens / 1000)
+        first = re.search(r"^(?!ticker\|)(\w+)\|", prompt, re.MULTILINE)
+        ticker = first.group(1) if first else None
+        return SimulatedResponse(json.dumps({"decision": "BUY" if ticker else "HOLD", "ticker": ticker, "rationale": "Simulado."}))
+
+class SimulatedEngine(SynthesisEngine):
+    def __init__(self, model: SimulatedModel, prompt_builder: PromptBuilder):
+        self.model = model
+        self.model_name = "simulado"
+        self.prompt_builder = prompt_builder
+        self.cache = None
+        self.decoder = ResponseDecoder()
+        self.client = LLMClient(rate_per_minute=0, max_retries=0)
+
+class SyntheticDataProvider:
+    """Candidatos com histórico e indicadores sintéticos, entregues com a latência de rede informada."""
+    def __init__(self, candidates: dict, latency: float):
+        self.candidates = candidates
+        self.latency = latency
+
+    def get_market_data(self, ticker: str) -> dict | None:
+        time.sleep(self.latency)
+        return self.candidates.get(ticker)
+
+def build_candidates(tickers: list, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=120, name="Date")
+    frames = {}
+    for ticker in tickers:
+        close = 20 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, len(index))))
+        volume = rng.lognormal(11, 1.5, len(index))
+        frames[ticker] = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": volume}, index=index)
+    candidates = {}
+    for ticker, df in apply_indicators(frames).items():
+        last = df.iloc[-1]
+        candidates[ticker] = {
+            "ticker": ticker, "historical_data": df,
+            "fundamental_data": {"Preço Atual": float(last["Close"]), "P/L": float(rng.uniform(3, 30)), "ROE": float(rng.uniform(-0.1, 0.3))},
+            "technical_indicators": {name: float(last[name]) for name in ("SMA_21", "SMA_50", "RSI_14", "BBL_20_2.0", "BBU_20_2.0", "MACD_12_26_9", "MACDh_12_26_9", "MACDs_12_26_9")},
+            "recent_news": [f"{ticker}: manchete simulada número {i} sobre resultados, guidance e cenário do setor" for i in range(5)],
+        }
+    return candidates
+
+class Command(BaseCommand):
+    help = "Mede o tempo ponta a ponta da análise de compra com e sem a pré-triagem técnica e o orçamento de tokens do prompt."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickers', type=int, default=len(config.TICKERS_TO_MONITOR), help="Tamanho do universo.")
+        parser.add_argument('--top-k', type=int, default=config.PRESCREEN_TOP_K, help="Candidatos enviados ao LLM após a pré-triagem.")
+        parser.add_argument('--fetch-latency', type=float, default=0.05, help="Latência (s) simulada da busca de cada ticker.")
+        parser.add_argument('--llm-latency', type=float, default=1.0, help="Latência fixa (s) simulada do LLM.")
+        parser.add_argument('--llm-latency-per-1k', type=float, default=0.15, help="Latência (s) adicional do LLM a cada 1000 tokens de prompt.")
+        parser.add_argument('--token-budget', type=int, default=config.PROMPT_TOKEN_BUDGET, help="Orçamento de tokens do prompt.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        logging.disable(logging.CRITICAL)
+        tickers = [f"T{i:03d}" for i in range(options['tickers'])]
+        provider = SyntheticDataProvider(build_candidates(tickers, options['seed']), options['fetch_latency'])
+        self.stdout.write(f"Universo sintético: {len(tickers)} tickers, top-K = {options['top_k']}")
+
+        rows = []
+        modes = (
+            ("Sem triagem, sem orçamento", 0, 10 ** 9),
+            ("Sem triagem, com orçamento", 0, options['token_budget']),
+            ("Triagem + orçamento       ", options['top_k'], options['token_budget']),
+        )
+        for label, top_k, token_budget in modes:
+            model = SimulatedModel(options['llm_latency'], options['llm_latency_per_1k'])
+            engine = SimulatedEngine(model, PromptBuilder(token_budget=token_budget))
+            start = time.perf_counter()
+            candidates = ConcurrentFetcher(provider).fetch_all(tickers)
+            fetched_at = time.perf_counter()
+            candidates = PreScreener(top_k=top_k).select(candidates)
+            screened_at = time.perf_counter()
+            decision = engine.decide_best_investment(candidates, [], {"ibov_change": "N/A"})
+            finished_at = time.perf_counter()
+            in_prompt = engine.prompt_builder.last_report['candidates']
+            rows.append((label, in_prompt, model.prompt_tokens[-1], fetched_at - start, screened_at - fetched_at, finished_at - screened_at, finished_at - start))
+            self.stdout.write(
+                f"{label}: {in_prompt:4d} candidatos no prompt, ~{model.prompt_tokens[-1]:8,.0f} tokens | "
+                f"busca {fetched_at - start:6.2f}s, triagem {(screened_at - fetched_at) * 1000:6.1f}ms, "
+                f"LLM {finished_at - screened_at:6.2f}s, total {finished_at - start:6.2f}s -> {decision.get('decision')} {decision.get('ticker')}"
+            )
+
+        full, screened = rows[0], rows[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f"Prompt {full[2] / screened[2]:.1f}x menor; LLM {full[5] / screened[5]:.1f}x mais rápido; ponta a ponta {full[6] / screened[6]:.1f}x mais rápido."
+        ))
@@ -0,0 +1,63 @@
+import logging
+import random
+import time
+from django.core.management.base import BaseCommand
+from core_logic import config
+from core_logic.fetch_engine import ConcurrentFetcher
+
+class FakeLatencyDataProvider:
+    """Fonte de dados falsa que simula as três chamadas de rede (.info, .history, .news) com latência."""
+    def __init__(self, latency: float, jitter: float = 0.0, failure_rate: float = 0.0, seed: int = 42):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    def get_market_data(self, ticker: str) -> dict | None:
+        for _ in range(3):
+            time.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+        if self._random.random() < self.failure_rate:
+            raise ConnectionError(f"Falha simulada para {ticker}")
+        return {
+            "ticker": ticker, "historical_data": None, "fundamental_data": {"Preço Atual": 10.0},
+            "recent_news": [], "technical_indicators": {}
+        }
+
+class Command(BaseCommand):
+    help = "Compara o tempo de busca serial com o ConcurrentFetcher usando uma fonte de dados com latência simulada."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickers', type=int, default=len(config.TICKERS_TO_MONITOR), help="Quantidade de tickers a buscar.")
+        parser.add_argument('--latency', type=float, default=0.05, help="Latência (s) de cada chamada de rede simulada.")
+        parser.add_argument('--jitter', type=float, default=0.01, help="Variação aleatória (s) da latência.")
+        parser.add_argument('--failure-rate', type=float, default=0.0, help="Fração de tickers que falham.")
+        parser.add_argument('--workers', type=int, default=config.FETCH_MAX_WORKERS, help="Workers do fetcher concorrente.")
+        parser.add_argument('--skip-serial', action='store_true', help="Não executa o caminho serial (lento).")
+
+    def handle(self, *args, **options):
+        logging.disable(logging.CRITICAL)
+        tickers = (config.TICKERS_TO_MONITOR * (options['tickers'] // len(config.TICKERS_TO_MONITOR) + 1))[:options['tickers']]
+        provider = FakeLatencyDataProvider(options['latency'], options['jitter'], options['failure_rate'])
+
+        serial_time = None
+        if not options['skip_serial']:
+            start = time.perf_counter()
+            serial = []
+            for ticker in tickers:
+                try:
+                    data = provider.get_market_data(ticker)
+                except ConnectionError:
+                    continue
+                if data:
+                    serial.append(data)
+            serial_time = time.perf_counter() - start
+            self.stdout.write(f"Serial:      {len(serial):4d} candidatos em {serial_time:8.2f}s")
+
+        fetcher = ConcurrentFetcher(provider, max_workers=options['workers'])
+        start = time.perf_counter()
+        concurrent = fetcher.fetch_all(tickers)
+        concurrent_time = time.perf_counter() - start
+        self.stdout.write(f"Concorrente: {len(concurrent):4d} candidatos em {concurrent_time:8.2f}s ({options['workers']} workers)")
+
+        if serial_time:
+            self.stdout.write(self.style.SUCCESS(f"Speedup: {serial_time / concurrent_time:.1f}x"))
@@ -0,0 +1,63 @@
+import time
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from core_logic.indicators import apply_indicators, compute_indicators
+
+try:
+    import pandas_ta  # noqa: F401 (registra o accessor df.ta)
+except ImportError:
+    pandas_ta = None
+
+class Command(BaseCommand):
+    help = "Mede o motor vetorizado de indicadores contra o cálculo ticker a ticker com pandas_ta."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickers', type=int, default=400)
+        parser.add_argument('--years', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        n_tickers, n_bars = options['tickers'], options['years'] * 252
+        rng = np.random.default_rng(options['seed'])
+        close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_bars, n_tickers)), axis=0))
+        index = pd.bdate_range("2015-01-01", periods=n_bars, name="Date")
+        frames = {
+            f"T{i:03d}": pd.DataFrame({"Open": close[:, i], "High": close[:, i], "Low": close[:, i], "Close": close[:, i], "Volume": 1e6}, index=index)
+            for i in range(n_tickers)
+        }
+        self.stdout.write(f"Universo sintético: {n_tickers} tickers x {n_bars} barras")
+
+        start = time.perf_counter()
+        compute_indicators(close)
+        self.stdout.write(f"compute_indicators (matriz 2-D):   {time.perf_counter() - start:8.3f}s")
+
+        start = time.perf_counter()
+        vectorized = apply_indicators(frames)
+        vectorized_time = time.perf_counter() - start
+        self.stdout.write(f"apply_indicators (DataFrames):     {vectorized_time:8.3f}s")
+
+        if pandas_ta is None:
+            self.stdout.write(self.style.WARNING("pandas_ta não está instalado; comparação ignorada."))
+            return
+
+        start = time.perf_counter()
+        reference = {}
+        for ticker, df in frames.items():
+            df = df.copy()
+            df.ta.sma(length=21, append=True)
+            df.ta.sma(length=50, append=True)
+            df.ta.rsi(length=14, append=True)
+            df.ta.bbands(length=20, append=True)
+            df.ta.macd(fast=12, slow=26, signal=9, append=True)
+            reference[ticker] = df
+        pandas_ta_time = time.perf_counter() - start
+        self.stdout.write(f"pandas_ta (ticker a ticker):       {pandas_ta_time:8.3f}s")
+
+        max_error = 0.0
+        for ticker, df in reference.items():
+            for column in df.columns.difference(frames[ticker].columns):
+                diff = np.abs(vectorized[ticker][column].to_numpy() - df[column].to_numpy())
+                max_error = max(max_error, np.nanmax(diff / np.maximum(1.0, np.abs(df[column].to_numpy()))))
+        self.stdout.write(f"Maior erro relativo: {max_error:.2e}")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {pandas_ta_time / vectorized_time:.1f}x"))
@@ -0,0 +1,68 @@
+import logging
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core_logic import config
+from core_logic.backtester import Backtester
+from core_logic.data_provider import BacktestDataProvider
+from core_logic.decision_backends import DECISION_BACKEND_CHOICES, get_decision_backend
+
+class Command(BaseCommand):
+    help = "Executa um backtest sobre o histórico da B3 e imprime as estatísticas (CAGR, Sharpe, drawdown máximo)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help="Data inicial (AAAA-MM-DD).")
+        parser.add_argument('--end', required=True, help="Data final, exclusiva (AAAA-MM-DD).")
+        parser.add_argument('--tickers', default="", help="Lista separada por vírgulas. Padrão: TICKERS_TO_MONITOR.")
+        parser.add_argument('--balance', type=float, default=100000.0, help="Saldo inicial simulado.")
+        parser.add_argument('--risk', type=float, default=config.RISK_PERCENTAGE_PER_TRADE, help="Fração do caixa por operação.")
+        parser.add_argument('--slippage', type=float, default=0.0, help="Slippage aplicado a cada execução (ex.: 0.001).")
+        parser.add_argument('--decider', choices=[c for c, _ in DECISION_BACKEND_CHOICES], default=config.DECISION_BACKEND,
+                            help="Decisor local por regras ou o Gemini. Padrão: DECISION_BACKEND.")
+        parser.add_argument('--output-dir', default="", help="Se informado, grava equity_curve.csv e trades.csv nesse diretório.")
+
+    def handle(self, *args, **options):
+        if options['verbosity'] < 2:
+            logging.disable(logging.INFO)
+        tickers = [t.strip().upper() for t in options['tickers'].split(',') if t.strip()] or config.TICKERS_TO_MONITOR
+
+        try:
+            decider = get_decision_backend(options['decider'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        start = time.perf_counter()
+        data_provider = BacktestDataProvider(tickers, options['start'], options['end'])
+        load_time = time.perf_counter() - start
+        if not data_provider.historical_data:
+            raise CommandError("Nenhum dado histórico foi carregado para o período informado.")
+
+        start = time.perf_counter()
+        result = Backtester(data_provider, decider, options['balance'], options['risk'], options['slippage']).run()
+        run_time = time.perf_counter() - start
+
+        stats = result.stats
+        self.stdout.write(f"Tickers carregados: {len(data_provider.historical_data)} (carga em {load_time:.2f}s, simulação em {run_time:.2f}s)")
+        self.stdout.write(f"Saldo inicial:      R$ {stats['initial_balance']:,.2f}")
+        self.stdout.write(f"Patrimônio final:   R$ {stats['final_equity']:,.2f}")
+        self.stdout.write(f"Retorno total:      {stats['total_return']:.2%}")
+        self.stdout.write(f"CAGR:               {stats['cagr']:.2%}")
+        self.stdout.write(f"Sharpe:             {stats['sharpe']:.2f}")
+        self.stdout.write(f"Drawdown máximo:    {stats['max_drawdown']:.2%}")
+        self.stdout.write(f"Operações:          {stats['trades']} (taxa de acerto {stats['win_rate']:.2%})")
+        if getattr(decider, 'cache', None) is not None:
+            self.stdout.write(f"Cache do LLM:       {decider.cache.stats()}")
+        if getattr(decider, 'decoder', None) is not None:
+            self.stdout.write(f"Respostas do LLM:   {decider.decoder.stats()}")
+        if getattr(decider, 'client', None) is not None:
+            metrics = decider.client.metrics.snapshot()
+            self.stdout.write(
+                f"Chamadas ao LLM:    {metrics['calls']} ({metrics['retries']} novas tentativas, erros {metrics['errors']}, "
+                f"latência p50 <= {metrics['latency']['p50']}s, p95 <= {metrics['latency']['p95']}s)"
+            )
+
+        if options['output_dir']:
+            os.makedirs(options['output_dir'], exist_ok=True)
+            result.equity_curve.to_csv(os.path.join(options['output_dir'], "equity_curve.csv"))
+            result.trades.to_csv(os.path.join(options['output_dir'], "trades.csv"), index=False)
+            self.stdout.write(self.style.SUCCESS(f"Resultados gravados em {options['output_dir']}"))
@@ -0,0 +1,62 @@
+import logging
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core_logic import config
+from core_logic.data_provider import BacktestDataProvider
+from core_logic.sweep import SweepRunner, parameter_grid, walk_forward_windows
+
+def _floats(value: str) -> list:
+    return [float(v) for v in value.split(',') if v.strip()]
+
+def _ints(value: str) -> list:
+    return [int(v) for v in value.split(',') if v.strip()]
+
+class Command(BaseCommand):
+    help = "Varre combinações de risco, comprimentos de indicadores e janelas walk-forward em paralelo e imprime a tabela comparativa."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help="Data inicial (AAAA-MM-DD).")
+        parser.add_argument('--end', required=True, help="Data final, exclusiva (AAAA-MM-DD).")
+        parser.add_argument('--tickers', default="", help="Lista separada por vírgulas. Padrão: TICKERS_TO_MONITOR.")
+        parser.add_argument('--risk', default=str(config.RISK_PERCENTAGE_PER_TRADE), help="Valores de risco por operação, ex.: 0.05,0.1,0.25.")
+        parser.add_argument('--sma-fast', default="21", help="Comprimentos da média curta, ex.: 10,21.")
+        parser.add_argument('--sma-slow', default="50", help="Comprimentos da média longa, ex.: 50,100.")
+        parser.add_argument('--rsi-length', default="14", help="Comprimentos do RSI.")
+        parser.add_argument('--window-days', type=int, default=0, help="Se informado, divide o período em janelas walk-forward com esse número de pregões.")
+        parser.add_argument('--step-days', type=int, default=0, help="Avanço entre janelas walk-forward (padrão: igual a --window-days).")
+        parser.add_argument('--workers', type=int, default=config.SWEEP_MAX_WORKERS, help="Número de processos.")
+        parser.add_argument('--output', default="", help="Se informado, grava a tabela comparativa neste CSV.")
+
+    def handle(self, *args, **options):
+        if options['verbosity'] < 2:
+            logging.disable(logging.INFO)
+        tickers = [t.strip().upper() for t in options['tickers'].split(',') if t.strip()] or config.TICKERS_TO_MONITOR
+
+        start = time.perf_counter()
+        data_provider = BacktestDataProvider(tickers, options['start'], options['end'])
+        if not data_provider.historical_data:
+            raise CommandError("Nenhum dado histórico foi carregado para o período informado.")
+        load_time = time.perf_counter() - start
+
+        windows = None
+        if options['window_days']:
+            windows = walk_forward_windows(data_provider.get_trading_days(), options['window_days'], options['step_days'])
+            if not windows:
+                raise CommandError("O período tem menos pregões do que --window-days.")
+        scenarios = parameter_grid(
+            windows, risk_percentage=_floats(options['risk']), sma_fast=_ints(options['sma_fast']),
+            sma_slow=_ints(options['sma_slow']), rsi_length=_ints(options['rsi_length']),
+        )
+
+        start = time.perf_counter()
+        table = SweepRunner(data_provider.panel, options['workers']).run(scenarios)
+        run_time = time.perf_counter() - start
+
+        self.stdout.write(f"{len(scenarios)} cenários, {options['workers']} processo(s): carga em {load_time:.2f}s, varredura em {run_time:.2f}s ({len(scenarios) / run_time:.1f} cenários/s)")
+        columns = ["scenario", "cagr", "sharpe", "max_drawdown", "total_return", "trades", "win_rate"]
+        with_pct = {c: "{:.2%}".format for c in ("cagr", "max_drawdown", "total_return", "win_rate")}
+        self.stdout.write(table[columns].to_string(index=False, formatters={**with_pct, "sharpe": "{:.2f}".format}))
+
+        if options['output']:
+            table.to_csv(options['output'], index=False)
+            self.stdout.write(self.style.SUCCESS(f"Tabela gravada em {options['output']}"))
@@ -0,0 +1,165 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from . import config
+
+_MISSING = object()
+
+def encode_value(value) -> str:
+    """
+    Serializa um valor do cache em JSON: DataFrames (histórico) viram colunas e índice em listas, o resto vai como está.
+    O json do Python grava floats com precisão total (e NaN), então os candles voltam idênticos.
+    """
+    if isinstance(value, pd.DataFrame):
+        dated = isinstance(value.index, pd.DatetimeIndex)
+        return json.dumps({"frame": {
+            "columns": [str(column) for column in value.columns],
+            "data": [value[column].tolist() for column in value.columns],
+            "index": [ts.isoformat() for ts in value.index] if dated else value.index.tolist(),
+            "index_name": value.index.name, "dated": dated,
+        }})
+    return json.dumps({"value": value})
+
+def decode_value(payload: str):
+    decoded = json.loads(payload)
+    if "frame" not in decoded:
+        return decoded["value"]
+    frame = decoded["frame"]
+    index = pd.DatetimeIndex(frame["index"]) if frame["dated"] else pd.Index(frame["index"])
+    return pd.DataFrame(dict(zip(frame["columns"], frame["data"])), index=index.rename(frame["index_name"]), columns=frame["columns"])
+
+class SQLiteCacheBackend:
+    """
+    Armazena as entradas do cache em um arquivo SQLite, compartilhado entre processos workers.
+    O conteúdo é gravado em JSON (nunca pickle): quem consegue escrever no arquivo não consegue executar código ao ser lido.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS market_cache (key TEXT PRIMARY KEY, stored_at REAL NOT NULL, payload BLOB NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._connection().execute("SELECT stored_at, payload FROM market_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return row[0], decode_value(row[1])
+        except (ValueError, KeyError, TypeError):
+            # Entrada ilegível (ex.: gravada no formato antigo): é tratada como ausente e regravada na próxima busca.
+            return None
+
+    def set(self, key: str, stored_at: float, value):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO market_cache (key, stored_at, payload) VALUES (?, ?, ?)",
+                (key, stored_at, encode_value(value))
+            )
+
+class MarketDataCache:
+    """
+    Cache LRU com TTL por tipo de dado ('info', 'history', 'news', 'quote').
+    Consulta primeiro a memória do processo e, se configurado, o backend SQLite compartilhado.
+    """
+    def __init__(self, ttls: dict | None = None, max_entries: int | None = None, backend: SQLiteCacheBackend | None = None):
+        self.ttls = ttls if ttls else {
+            "info": config.MARKET_CACHE_TTL_INFO,
+            "history": config.MARKET_CACHE_TTL_HISTORY,
+            "news": config.MARKET_CACHE_TTL_NEWS,
+            "quote": config.MARKET_CACHE_TTL_QUOTE,
+        }
+        self.max_entries = max_entries if max_entries else config.MARKET_CACHE_MAX_ENTRIES
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {kind: {"hits": 0, "misses": 0} for kind in self.ttls}
+
+    def get(self, kind: str, ticker: str):
+        """Devolve o valor em cache ou _MISSING se não houver entrada válida."""
+        value = self._lookup(kind, ticker)
+        with self._lock:
+            self._stats[kind]["misses" if value is _MISSING else "hits"] += 1
+        return value
+
+    def set(self, kind: str, ticker: str, value):
+        key = f"{kind}:{ticker}"
+        stored_at = time.time()
+        self._store_in_memory(key, stored_at, value)
+        if self.backend is not None:
+            try:
+                self.backend.set(key, stored_at, value)
+            except Exception as e:
+                logging.warning(f"[CACHE] Falha ao gravar no cache compartilhado ({key}): {e}")
+
+    def has(self, kind: str, ticker: str) -> bool:
+        """Como get, mas sem contar acerto ou falta: consultas de presença não distorcem as estatísticas."""
+        return self._lookup(kind, ticker) is not _MISSING
+
+    def get_or_fetch(self, kind: str, ticker: str, fetch):
+        value = self.get(kind, ticker)
+        if value is _MISSING:
+            value = fetch()
+            self.set(kind, ticker, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {kind: dict(counts) for kind, counts in self._stats.items()}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, kind: str, ticker: str):
+        """Busca na memória e depois no backend, respeitando o TTL do tipo; não mexe nas estatísticas."""
+        key = f"{kind}:{ticker}"
+        now = time.time()
+        ttl = self.ttls[kind]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= ttl:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+        if self.backend is not None:
+            try:
+                entry = self.backend.get(key)
+            except Exception as e:
+                logging.warning(f"[CACHE] Falha ao ler o cache compartilhado ({key}): {e}")
+                entry = None
+            if entry is not None and now - entry[0] <= ttl:
+                self._store_in_memory(key, entry[0], entry[1])
+                return entry[1]
+        return _MISSING
+
+    def _store_in_memory(self, key: str, stored_at: float, value):
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_shared_cache() -> MarketDataCache:
+    """Cache único do processo, compartilhado por todos os usuários e análises."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            backend = SQLiteCacheBackend(config.MARKET_CACHE_DB) if config.MARKET_CACHE_DB else None
+            _shared_cache = MarketDataCache(backend=backend)
+        return _shared_cache
@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+import numpy as np
+import pandas as pd
+from . import config
+from .history_store import HistoryStore, get_shared_history_store
+
+IBOV = "^BVSP"
+CHANGE_SESSIONS = 5
+VOLATILITY_WINDOW = 20
+# A volatilidade do dia é comparada à mediana do último ano de pregões para definir o regime.
+REGIME_BASELINE_WINDOW = 252
+HIGH_VOLATILITY_RATIO = 1.25
+LOW_VOLATILITY_RATIO = 0.8
+BREADTH_FIELD = "SMA_50"
+# Histórico do índice carregado antes do início do período, para que volatilidade e regime existam desde o primeiro dia.
+LOOKBACK_DAYS = 400
+
+def compute_context_table(index_close: pd.Series, dates: pd.DatetimeIndex, close: np.ndarray | None = None,
+                          slow_average: np.ndarray | None = None) -> pd.DataFrame:
+    """
+    Contexto de mercado de cada data de `dates`, usando apenas dados até aquela data:
+    variação do Ibovespa nos últimos 5 pregões, volatilidade anualizada de 20 pregões e seu regime e, se
+    `close` e `slow_average` (matrizes datas x tickers) forem dados, a amplitude (fração dos ativos acima da SMA 50).
+    """
+    index_close = index_close.dropna()
+    index_close.index = pd.DatetimeIndex(index_close.index)
+    index_close = index_close.sort_index()
+    returns = index_close.pct_change()
+    volatility = returns.rolling(VOLATILITY_WINDOW).std() * np.sqrt(252)
+    baseline = volatility.rolling(REGIME_BASELINE_WINDOW, min_periods=60).median()
+    regime = pd.Series(
+        np.select([volatility > HIGH_VOLATILITY_RATIO * baseline, volatility < LOW_VOLATILITY_RATIO * baseline], ["alta", "baixa"], "normal"),
+        index=index_close.index,
+    )
+    table = pd.DataFrame({
+        "ibov_change": index_close / index_close.shift(CHANGE_SESSIONS) - 1,
+        "volatility": volatility,
+        "volatility_regime": regime.where(baseline.notna()),
+    })
+    # As-of: num dia sem pregão do índice vale o último valor conhecido, nunca um posterior.
+    table = table.reindex(dates, method="ffill")
+    if close is not None and slow_average is not None:
+        with np.errstate(invalid="ignore"):
+            comparable = ~np.isnan(close) & ~np.isnan(slow_average)
+            above = (close > slow_average) & comparable
+            counts = comparable.sum(axis=1)
+            table["breadth"] = np.where(counts > 0, above.sum(axis=1) / np.maximum(counts, 1), np.nan)
+    return table
+
+def context_from_row(date, row: pd.Series | None) -> dict:
+    """Dicionário usado nos prompts; `ibov_change` continua formatado como antes ('1.23%' ou 'N/A')."""
+    def value(name):
+        v = row.get(name) if row is not None else None
+        return None if v is None or (isinstance(v, float) and np.isnan(v)) else v
+    change, breadth, volatility = value("ibov_change"), value("breadth"), value("volatility")
+    return {
+        "date": pd.Timestamp(date).strftime('%Y-%m-%d'),
+        "ibov_change": f"{change:.2%}" if change is not None else "N/A",
+        "ibov_change_value": float(change) if change is not None else None,
+        "breadth": float(breadth) if breadth is not None else None,
+        "volatility": float(volatility) if volatility is not None else None,
+        "volatility_regime": value("volatility_regime"),
+    }
+
+class MarketContextService:
+    """
+    Calcula o contexto de mercado a partir do HistoryStore compartilhado, em vez de uma requisição ao ^BVSP por análise.
+    `current()` serve a análise ao vivo e fica em cache por MARKET_CONTEXT_TTL_SECONDS; `table()` dá o contexto
+    ponto a ponto de um backtest, calculado uma única vez para todos os pregões.
+    """
+    def __init__(self, history_store: HistoryStore | None = None, universe: list | None = None, ttl: float | None = None):
+        self.history_store = history_store if history_store is not None else get_shared_history_store()
+        self.universe = universe if universe is not None else config.TICKERS_TO_MONITOR
+        self.ttl = ttl if ttl is not None else config.MARKET_CONTEXT_TTL_SECONDS
+        self._current = None
+        self._lock = threading.Lock()
+
+    def index_history(self, start, end) -> pd.Series:
+        start = pd.Timestamp(start) - pd.Timedelta(days=LOOKBACK_DAYS)
+        df = self.history_store.get_range(IBOV, start, end)
+        return df["Close"] if not df.empty else pd.Series(dtype="f8")
+
+    def table(self, dates: pd.DatetimeIndex, close: np.ndarray | None = None, slow_average: np.ndarray | None = None) -> pd.DataFrame:
+        if len(dates) == 0:
+            return pd.DataFrame()
+        try:
+            index_close = self.index_history(dates[0], dates[-1] + pd.Timedelta(days=1))
+        except Exception as e:
+            logging.error(f"[CONTEXT] Falha ao carregar o histórico do Ibovespa: {e}")
+            index_close = pd.Series(dtype="f8")
+        return compute_context_table(index_close, dates, close, slow_average)
+
+    def current(self) -> dict:
+        with self._lock:
+            if self._current is not None and time.monotonic() - self._current[0] <= self.ttl:
+                return self._current[1]
+        context = self._compute_current()
+        with self._lock:
+            self._current = (time.monotonic(), context)
+        return context
+
+    def _compute_current(self) -> dict:
+        start, end = self.history_store.recent_window(LOOKBACK_DAYS)
+        today = pd.Timestamp.today().normalize()
+        try:
+            index_close = self.history_store.get_range(IBOV, start, end)["Close"]
+        except Exception as e:
+            logging.error(f"[CONTEXT] Falha ao carregar o histórico do Ibovespa: {e}")
+            index_close = pd.Series(dtype="f8")
+        dates = pd.DatetimeIndex([index_close.index[-1] if len(index_close) else today])
+        close, slow_average = self._universe_breadth_inputs()
+        table = compute_context_table(index_close, dates, close, slow_average)
+        context = context_from_row(dates[0], table.iloc[0])
+        logging.info(f"[CONTEXT] Contexto de mercado atualizado: {context}")
+        return context
+
+    def _universe_breadth_inputs(self) -> tuple:
+        """Último fechamento e SMA 50 de cada ticker do universo, lidos do disco (sem rede)."""
+        close, slow_average = [], []
+        for ticker in self.universe:
+            df = self.history_store.load(ticker)
+            if df is None:
+                continue
+            closes = df["Close"].dropna()
+            if len(closes) >= 50:
+                close.append(closes.iloc[-1])
+                slow_average.append(closes.iloc[-50:].mean())
+        if not close:
+            return None, None
+        return np.array([close]), np.array([slow_average])
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+def get_market_context_service() -> MarketContextService:
+    """Serviço único do processo: todas as análises ao vivo compartilham o mesmo contexto do dia."""
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is None:
+            _shared_service = MarketContextService()
+        return _shared_service
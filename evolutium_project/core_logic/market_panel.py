@@ -0,0 +1,126 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from .indicators import compute_indicators
+
+TECHNICAL_FIELDS = (
+    "SMA_21", "SMA_50", "RSI_14", "BBL_20_2.0", "BBU_20_2.0",
+    "MACD_12_26_9", "MACDh_12_26_9", "MACDs_12_26_9",
+)
+PRICE_FIELDS = ("Close", "Volume")
+PANEL_FIELDS = PRICE_FIELDS + TECHNICAL_FIELDS
+
+class MarketSnapshot:
+    """Preços e indicadores de todos os tickers em um único pregão, como arrays alinhados por ticker."""
+    def __init__(self, panel: "MarketPanel", index: int):
+        self.panel = panel
+        self.index = index
+        self.date = panel.dates[index]
+        self.tickers = panel.tickers
+        self.values = panel.values[index]
+        self.close = self.values[:, panel.field_index["Close"]]
+        self.valid = panel.observed[index] & ~np.isnan(self.close)
+
+    def field(self, name: str) -> np.ndarray:
+        return self.values[:, self.panel.field_index[name]]
+
+    def market_data(self, ticker: str) -> dict | None:
+        """Visão em dicionário de um ticker, no formato devolvido por BacktestDataProvider.get_market_data."""
+        column = self.panel.ticker_index.get(ticker)
+        if column is None or not self.valid[column]:
+            return None
+        return self.panel.build_market_data(ticker, self.values[column])
+
+class MarketPanel:
+    """
+    Painel datas x tickers x campos em NumPy, com índice inteiro de datas.
+    Um pregão sem candle para o ticker fica com NaN, ou com o valor repetido se os DataFrames vierem alinhados
+    a um TradingCalendar; `observed` marca os pregões em que o ticker de fato negociou.
+    """
+    def __init__(self, dates: pd.DatetimeIndex, tickers: list, fields: tuple, values: np.ndarray, observed: np.ndarray | None = None):
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.fields = tuple(fields)
+        self.values = values
+        self.observed = observed if observed is not None else ~np.isnan(values[:, :, self.fields.index("Close")])
+        self.ticker_index = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.field_index = {field: i for i, field in enumerate(self.fields)}
+        self.technical_fields = TECHNICAL_FIELDS + tuple(f for f in self.fields if f not in TECHNICAL_FIELDS and f not in PRICE_FIELDS)
+        self._date_positions = {date: i for i, date in enumerate(dates)}
+
+    @classmethod
+    def from_frames(cls, frames: dict, fields: tuple = PANEL_FIELDS, dates: pd.DatetimeIndex | None = None,
+                    observed: dict | None = None) -> "MarketPanel":
+        """
+        `dates` fixa o eixo de pregões (por padrão, a união das datas dos DataFrames); barras fora dele são ignoradas.
+        `observed` mapeia ticker -> datas em que houve negociação, para DataFrames já alinhados com forward-fill.
+        """
+        tickers = list(frames)
+        if dates is None:
+            dates = pd.DatetimeIndex([])
+            if tickers:
+                dates = pd.DatetimeIndex(np.unique(np.concatenate([frames[t].index.values for t in tickers])))
+        values = np.full((len(dates), len(tickers), len(fields)), np.nan)
+        traded = np.zeros((len(dates), len(tickers)), dtype=bool)
+        for column, ticker in enumerate(tickers):
+            df = frames[ticker]
+            rows = dates.get_indexer(df.index)
+            inside = rows >= 0
+            for k, field in enumerate(fields):
+                if field in df.columns:
+                    values[rows[inside], column, k] = df[field].to_numpy(dtype="f8")[inside]
+            observed_dates = observed.get(ticker, df.index) if observed is not None else df.index
+            observed_rows = dates.get_indexer(observed_dates)
+            traded[observed_rows[observed_rows >= 0], column] = True
+        traded &= ~np.isnan(values[:, :, fields.index("Close")])
+        return cls(dates, tickers, fields, values, traded)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str | None = "r") -> "MarketPanel":
+        """Abre um painel gravado por `save`; com mmap_mode os arrays são mapeados do disco e compartilhados entre processos."""
+        with open(os.path.join(directory, "meta.json"), "r") as f:
+            meta = json.load(f)
+        values = np.load(os.path.join(directory, "values.npy"), mmap_mode=mmap_mode)
+        observed = np.load(os.path.join(directory, "observed.npy"), mmap_mode=mmap_mode)
+        return cls(pd.DatetimeIndex(meta["dates"]), meta["tickers"], tuple(meta["fields"]), values, observed)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "values.npy"), np.ascontiguousarray(self.values))
+        np.save(os.path.join(directory, "observed.npy"), np.ascontiguousarray(self.observed))
+        meta = {"dates": [d.strftime('%Y-%m-%d') for d in self.dates], "tickers": self.tickers, "fields": list(self.fields)}
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def window(self, start=None, end=None) -> "MarketPanel":
+        """Recorte dos pregões em [start, end), sem copiar os arrays."""
+        first = self.dates.searchsorted(pd.Timestamp(start)) if start is not None else 0
+        last = self.dates.searchsorted(pd.Timestamp(end)) if end is not None else len(self.dates)
+        return MarketPanel(self.dates[first:last], self.tickers, self.fields, self.values[first:last], self.observed[first:last])
+
+    def with_indicators(self, **params) -> "MarketPanel":
+        """Novo painel com Close/Volume deste e os indicadores recalculados com outros parâmetros (ver compute_indicators)."""
+        prices = [self.field(name) for name in PRICE_FIELDS]
+        indicators = compute_indicators(self.field("Close"), **params)
+        values = np.stack(prices + list(indicators.values()), axis=2)
+        return MarketPanel(self.dates, self.tickers, PRICE_FIELDS + tuple(indicators), values, self.observed)
+
+    def date_index(self, date) -> int | None:
+        return self._date_positions.get(pd.Timestamp(date))
+
+    def snapshot(self, index: int) -> MarketSnapshot:
+        return MarketSnapshot(self, index)
+
+    def field(self, name: str) -> np.ndarray:
+        """Matriz datas x tickers de um campo (view, sem cópia)."""
+        return self.values[:, :, self.field_index[name]]
+
+    def build_market_data(self, ticker: str, row: np.ndarray) -> dict:
+        field_index = self.field_index
+        technical_indicators = {name: row[field_index[name]] if name in field_index else None for name in self.technical_fields}
+        return {
+            "ticker": ticker, "fundamental_data": {"Preço Atual": row[field_index["Close"]]},
+            "technical_indicators": technical_indicators,
+            "recent_news": ["Notícias não disponíveis em modo de backtest."]
+        }
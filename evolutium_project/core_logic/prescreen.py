@@ -0,0 +1,73 @@
+import logging
+import numpy as np
+import pandas as pd
+from . import config
+
+# Peso de cada componente na nota final; todos os componentes ficam em [0, 1].
+DEFAULT_WEIGHTS = {"trend": 0.30, "rsi": 0.20, "macd": 0.25, "bollinger": 0.10, "liquidity": 0.15}
+LIQUIDITY_WINDOW = 20
+
+def _column(candidates: list, key: str) -> np.ndarray:
+    values = [c.get('technical_indicators', {}).get(key) for c in candidates]
+    return np.array([np.nan if v is None else v for v in values], dtype="f8")
+
+def _average_traded_value(candidate: dict) -> float:
+    """Volume financeiro médio (preço x volume) dos últimos pregões, a partir do histórico do DataProvider."""
+    hist = candidate.get('historical_data')
+    if not isinstance(hist, pd.DataFrame) or hist.empty or 'Volume' not in hist.columns:
+        return np.nan
+    close = hist['Close'].to_numpy(dtype="f8")[-LIQUIDITY_WINDOW:]
+    volume = hist['Volume'].to_numpy(dtype="f8")[-LIQUIDITY_WINDOW:]
+    return float(np.nanmean(close * volume))
+
+class PreScreener:
+    """
+    Etapa barata, antes do LLM: pontua todos os candidatos de uma vez com os indicadores técnicos que já
+    vêm do DataProvider e a liquidez, e só os `top_k` melhores seguem para o SynthesisEngine.
+    """
+    def __init__(self, top_k: int | None = None, weights: dict | None = None, min_traded_value: float | None = None,
+                 rsi_low: float | None = None, rsi_high: float | None = None):
+        self.top_k = top_k if top_k is not None else config.PRESCREEN_TOP_K
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.min_traded_value = min_traded_value if min_traded_value is not None else config.PRESCREEN_MIN_TRADED_VALUE
+        self.rsi_low = rsi_low if rsi_low is not None else config.PRESCREEN_RSI_LOW
+        self.rsi_high = rsi_high if rsi_high is not None else config.PRESCREEN_RSI_HIGH
+
+    def score(self, candidates: list) -> pd.DataFrame:
+        """Tabela (um candidato por linha, na ordem recebida) com os componentes e a nota final; NaN = descartado."""
+        price = np.array([c['fundamental_data'].get('Preço Atual') or np.nan for c in candidates], dtype="f8")
+        sma_21, sma_50 = _column(candidates, 'SMA_21'), _column(candidates, 'SMA_50')
+        rsi, macd_hist = _column(candidates, 'RSI_14'), _column(candidates, 'MACDh_12_26_9')
+        lower, upper = _column(candidates, 'BBL_20_2.0'), _column(candidates, 'BBU_20_2.0')
+        traded_value = np.array([_average_traded_value(c) for c in candidates], dtype="f8")
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            trend = ((price > sma_21).astype("f8") + (sma_21 > sma_50) + (price > sma_50)) / 3
+            # Nota máxima no meio da faixa de RSI e decaimento linear até zero a uma largura de faixa de distância.
+            band_mid, band_half = (self.rsi_low + self.rsi_high) / 2, (self.rsi_high - self.rsi_low) / 2
+            rsi_score = np.clip(1 - np.abs(rsi - band_mid) / (2 * band_half), 0, 1)
+            macd_score = 0.5 + 0.5 * np.tanh(100 * macd_hist / price)
+            # %B: perto da banda superior é tendência, acima dela é preço esticado.
+            percent_b = (price - lower) / (upper - lower)
+            bollinger = np.where(percent_b > 1, 0.0, np.clip(percent_b, 0, 1))
+            liquidity = np.clip(np.log10(traded_value / self.min_traded_value) / 2, 0, 1)
+
+        components = {"trend": trend, "rsi": rsi_score, "macd": macd_score, "bollinger": bollinger, "liquidity": liquidity}
+        total = sum(self.weights[name] * np.nan_to_num(values, nan=0.0) for name, values in components.items())
+        eligible = ~np.isnan(price) & ~np.isnan(sma_50) & ~np.isnan(rsi) & ~np.isnan(macd_hist)
+        if self.min_traded_value > 0:
+            eligible &= ~(traded_value < self.min_traded_value)
+        table = pd.DataFrame(components, index=[c['ticker'] for c in candidates])
+        table["traded_value"] = traded_value
+        table["score"] = np.where(eligible, total, np.nan)
+        return table
+
+    def select(self, candidates: list) -> list:
+        """Os `top_k` candidatos de maior nota, do melhor para o pior. Com top_k <= 0 a etapa fica desativada."""
+        if not candidates or self.top_k <= 0:
+            return list(candidates)
+        scores = self.score(candidates)["score"].to_numpy()
+        ranked = [i for i in np.argsort(-np.nan_to_num(scores, nan=-np.inf), kind="stable") if not np.isnan(scores[i])]
+        selected = [candidates[i] for i in ranked[:self.top_k]]
+        logging.info(f"[PRESCREEN] {len(selected)} de {len(candidates)} candidatos seguem para o LLM: {[c['ticker'] for c in selected]}")
+        return selected
@@ -0,0 +1,185 @@
+import logging
+import math
+from . import config
+
+# Estimativa conservadora para texto em português com números; o tokenizer real do Gemini costuma ficar abaixo disso.
+CHARS_PER_TOKEN = 3.5
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _number(value, digits: int = 2, scale: float = 1.0, suffix: str = "") -> str:
+    if not isinstance(value, (int, float)) or math.isnan(value):
+        return "-"
+    return f"{value * scale:.{digits}f}{suffix}"
+
+def _distance(price, reference) -> str:
+    """Distância percentual do preço para uma média, ex.: +3.2%."""
+    if not isinstance(price, (int, float)) or not isinstance(reference, (int, float)) or not reference or math.isnan(reference):
+        return "-"
+    return f"{(price / reference - 1) * 100:+.1f}%"
+
+def _percent_b(price, lower, upper) -> str:
+    if not all(isinstance(v, (int, float)) and not math.isnan(v) for v in (price, lower, upper)) or upper == lower:
+        return "-"
+    return f"{(price - lower) / (upper - lower):.2f}"
+
+def _macd(technicals: dict) -> str:
+    macd_line, signal_line = technicals.get('MACD_12_26_9'), technicals.get('MACDs_12_26_9')
+    if not isinstance(macd_line, (int, float)) or not isinstance(signal_line, (int, float)) or math.isnan(macd_line) or math.isnan(signal_line):
+        return "-"
+    return "alta" if macd_line > signal_line else "baixa"
+
+TECHNICAL_COLUMNS = "ticker|preço|dist_SMA21|dist_SMA50|RSI14|%B_bollinger|MACD"
+FUNDAMENTAL_COLUMNS = "P/L|ROE"
+POSITION_COLUMNS = "qtd|preço_compra|resultado"
+COLUMN_LEGEND = (
+    "dist_SMA21/dist_SMA50 = distância do preço às médias de 21/50 dias (positivo = acima, tendência de alta); "
+    "RSI14 > 70 sobrecomprado, < 30 sobrevendido; %B_bollinger > 1 acima da banda superior, < 0 abaixo da inferior; "
+    "MACD = linha MACD acima (alta) ou abaixo (baixa) da linha de sinal; '-' = dado indisponível."
+)
+
+def encode_candidate(data: dict, with_fundamentals: bool = True) -> str:
+    """Uma linha compacta, separada por '|', com os campos de TECHNICAL_COLUMNS (e FUNDAMENTAL_COLUMNS)."""
+    fundamentals = data['fundamental_data']
+    technicals = data.get('technical_indicators') or {}
+    price = fundamentals.get('Preço Atual')
+    fields = [
+        data['ticker'], _number(price), _distance(price, technicals.get('SMA_21')), _distance(price, technicals.get('SMA_50')),
+        _number(technicals.get('RSI_14'), 0), _percent_b(price, technicals.get('BBL_20_2.0'), technicals.get('BBU_20_2.0')),
+        _macd(technicals),
+    ]
+    if with_fundamentals:
+        fields += [_number(fundamentals.get('P/L'), 1), _number(fundamentals.get('ROE'), 1, 100, "%")]
+    return "|".join(fields)
+
+def encode_position(data: dict, position: dict) -> str:
+    """Linha de encode_candidate seguida dos campos de POSITION_COLUMNS."""
+    price = data['fundamental_data'].get('Preço Atual')
+    buy_price = position.get('buy_price')
+    return "|".join([
+        encode_candidate(data), str(position.get('quantity', '-')), _number(buy_price), _distance(price, buy_price),
+    ])
+
+def encode_news(data: dict, max_items: int, max_chars: int) -> str:
+    headlines = [h.strip() for h in (data.get('recent_news') or [])[:max_items] if h and h.strip()]
+    headlines = [h if len(h) <= max_chars else h[:max_chars - 1].rstrip() + "…" for h in headlines]
+    return f"{data['ticker']}: " + " / ".join(headlines) if headlines else ""
+
+def format_market_context(market_context: dict) -> str:
+    """Linha de contexto dos prompts: Ibovespa e, quando disponíveis, amplitude e regime de volatilidade."""
+    parts = [f"Ibovespa (última semana) {market_context.get('ibov_change', 'N/A')}"]
+    if market_context.get('breadth') is not None:
+        parts.append(f"{market_context['breadth']:.0%} dos ativos acima da média de 50 dias")
+    if market_context.get('volatility_regime'):
+        volatility = market_context.get('volatility')
+        parts.append(f"volatilidade {market_context['volatility_regime']}" + (f" ({volatility:.0%} a.a.)" if volatility is not None else ""))
+    return "; ".join(parts)
+
+def format_trade_history(trade_history: list) -> str:
+    lines = [f"- {t['timestamp']}: {t['side']} {t['quantity']} {t['ticker']} @ R$ {t['price']:.2f}" for t in trade_history[-5:]]
+    return "\n".join(lines) if lines else "Nenhuma transação recente."
+
+class PromptBuilder:
+    """
+    Monta os prompts de compra e de reavaliação de venda com os ativos em tabela compacta, dentro de um orçamento de tokens.
+    Os candidatos devem chegar do melhor para o pior (ordem da pré-triagem): quando o prompt não cabe, primeiro
+    saem as manchetes, depois os candidatos do fim da lista. O tamanho final fica em `last_report`.
+    """
+    def __init__(self, token_budget: int | None = None, max_news: int | None = None, news_max_chars: int | None = None):
+        self.token_budget = token_budget if token_budget is not None else config.PROMPT_TOKEN_BUDGET
+        self.max_news = max_news if max_news is not None else config.PROMPT_MAX_NEWS_PER_CANDIDATE
+        self.news_max_chars = news_max_chars if news_max_chars is not None else config.PROMPT_NEWS_MAX_CHARS
+        self.last_report = {}
+
+    def build_buy_prompt(self, candidates: list, trade_history: list, market_context: dict) -> str:
+        header = (
+            "Análise comparativa de portfólio para seleção de ativo.\n"
+            f"Contexto de mercado: {format_market_context(market_context)}.\n"
+            f"Transações recentes (5 últimas):\n{format_trade_history(trade_history)}\n\n"
+            "Tarefa:\n"
+            "1. Considere o contexto: em mercado de baixa (Ibovespa caindo) seja mais cauteloso; em mercado de alta, mais confiante.\n"
+            "2. Compare os candidatos combinando fundamentos, notícias e análise técnica.\n"
+            "3. Evite \"flip-flopping\": não compre um ativo vendido recentemente sem uma nova e forte razão.\n"
+            "4. Escolha o melhor e único ativo para comprar; se nenhum for favorável, escolha \"HOLD\".\n\n"
+            f"Legenda: {COLUMN_LEGEND}\n"
+        )
+        footer = (
+            "\nIMPORTANTE: responda APENAS com um objeto JSON com as chaves \"decision\" (\"BUY\" ou \"HOLD\"), "
+            "\"ticker\" (ticker escolhido ou null) e \"rationale\" (explicação da comparação)."
+        )
+        return self._fit(candidates, header, footer, with_fundamentals=True, with_news=True)
+
+    def build_buy_prompt_backtest(self, candidates: list, market_context: dict) -> str:
+        header = (
+            "Análise comparativa para backtest (foco técnico e contexto).\n"
+            f"Contexto de mercado: {format_market_context(market_context)}.\n\n"
+            "Tarefa:\n"
+            "1. Em mercado de baixa (Ibovespa caindo), seja mais seletivo e exija sinais técnicos mais fortes.\n"
+            "2. Um candidato ideal tem tendência de alta clara (preço acima das médias), RSI abaixo de 70 e MACD em alta.\n"
+            "3. Escolha o melhor e único ativo apenas pelos indicadores técnicos e pelo contexto; se nenhum for claramente positivo, escolha \"HOLD\".\n\n"
+            f"Legenda: {COLUMN_LEGEND}\n"
+        )
+        footer = (
+            "\nIMPORTANTE: responda APENAS com um objeto JSON com as chaves \"decision\" (\"BUY\" ou \"HOLD\"), "
+            "\"ticker\" (ticker escolhido ou null) e \"rationale\" (explicação da comparação técnica)."
+        )
+        return self._fit(candidates, header, footer, with_fundamentals=False, with_news=False)
+
+    def build_sell_review_prompt(self, positions: list, trade_history: list, market_context: dict) -> str:
+        """Reavaliação de todas as posições (lista de pares (market_data, posição)) em um único prompt."""
+        header = (
+            "Reavaliação de todas as posições da carteira para venda.\n"
+            f"Contexto de mercado: {format_market_context(market_context)}.\n"
+            f"Transações recentes (5 últimas):\n{format_trade_history(trade_history)}\n\n"
+            "Tarefa:\n"
+            "1. Avalie cada posição abaixo de forma independente, com fundamentos, notícias, análise técnica e resultado atual.\n"
+            "2. Se o mercado geral está em forte queda (Ibovespa caindo), pode ser prudente realizar lucros ou cortar perdas mesmo em posições boas.\n"
+            "3. Considere o histórico: se um ativo acabou de ser comprado, a justificativa para vendê-lo precisa ser muito forte.\n\n"
+            f"Legenda: {COLUMN_LEGEND} qtd/preço_compra = posição atual; resultado = variação do preço desde a compra.\n"
+        )
+        footer = (
+            "\nIMPORTANTE: responda APENAS com um objeto JSON com a chave \"decisions\": uma lista com um objeto por posição, "
+            "cada um com as chaves \"ticker\", \"decision\" (\"SELL\" ou \"HOLD\") e \"rationale\" (string)."
+        )
+        # Nenhuma posição pode ficar de fora da reavaliação; só as manchetes são cortadas para caber no orçamento.
+        return self._fit(
+            [data for data, _ in positions], header, footer, with_fundamentals=True, with_news=True, allow_drop=False,
+            rows=[encode_position(data, position) for data, position in positions],
+            columns=f"{TECHNICAL_COLUMNS}|{FUNDAMENTAL_COLUMNS}|{POSITION_COLUMNS}", title="Posições",
+        )
+
+    def _fit(self, candidates: list, header: str, footer: str, with_fundamentals: bool, with_news: bool,
+             allow_drop: bool = True, rows: list | None = None, columns: str | None = None,
+             title: str = "Candidatos (melhor pré-triagem primeiro)") -> str:
+        columns = columns if columns else TECHNICAL_COLUMNS + ("|" + FUNDAMENTAL_COLUMNS if with_fundamentals else "")
+        rows = rows if rows is not None else [encode_candidate(data, with_fundamentals) for data in candidates]
+        fixed_tokens = estimate_tokens(header) + estimate_tokens(footer) + estimate_tokens(columns) + 10
+        row_tokens = [estimate_tokens(row) + 1 for row in rows]
+
+        # Corta as manchetes (de max_news até zero por candidato) antes de abrir mão de qualquer candidato.
+        news_items = self.max_news if with_news else 0
+        while True:
+            news = [encode_news(data, news_items, self.news_max_chars) for data in candidates] if news_items else []
+            news_tokens = [estimate_tokens(line) + 1 if line else 0 for line in news] or [0] * len(rows)
+            total = fixed_tokens + sum(row_tokens) + sum(news_tokens)
+            if total <= self.token_budget or news_items == 0:
+                break
+            news_items -= 1
+
+        kept = len(rows)
+        while allow_drop and kept > 1 and total > self.token_budget:
+            kept -= 1
+            total -= row_tokens[kept] + news_tokens[kept]
+
+        body = f"\n{title}:\n{columns}\n" + "\n".join(rows[:kept]) + "\n"
+        if news_items and any(news[:kept]):
+            body += "\nManchetes recentes:\n" + "\n".join(line for line in news[:kept] if line) + "\n"
+        prompt = header + body + footer
+
+        self.last_report = {
+            "tokens": estimate_tokens(prompt), "chars": len(prompt), "budget": self.token_budget,
+            "candidates": kept, "dropped_candidates": len(rows) - kept, "news_per_candidate": news_items,
+        }
+        logging.info(f"[PROMPT] Prompt com {kept}/{len(rows)} candidatos, {news_items} manchete(s) cada, ~{self.last_report['tokens']} tokens (orçamento {self.token_budget}).")
+        return prompt
@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+import pandas as pd
+from .bulk_download import BulkDownloader
+from .market_cache import _MISSING, MarketDataCache, get_shared_cache
+
+# Janela do download de cotações: cobre fins de semana e feriados, para que sempre haja o último pregão.
+QUOTE_LOOKBACK_DAYS = 7
+
+def last_prices(frames: dict) -> dict:
+    """Último fechamento (ou preço do pregão em andamento) de cada DataFrame diário, com a data do candle."""
+    quotes = {}
+    for ticker, df in frames.items():
+        closes = df["Close"].dropna() if "Close" in df else pd.Series(dtype="f8")
+        if not closes.empty:
+            quotes[ticker] = {"price": float(closes.iloc[-1]), "as_of": pd.Timestamp(closes.index[-1]).strftime('%Y-%m-%d')}
+    return quotes
+
+class QuoteService:
+    """
+    Cotações atuais para a marcação a mercado das carteiras, servidas do MarketDataCache (tipo 'quote', TTL curto).
+    Numa falta, uma única requisição em lote traz os tickers pedidos junto com todos os do `universe`
+    (ex.: tudo o que está em carteira em todos os portfólios) que também venceram, então os usuários seguintes
+    encontram o cache pronto. Buscas simultâneas esperam a que está em andamento em vez de repetir o download.
+    Tickers sem cotação ficam em cache como None pelo mesmo TTL, para não serem pedidos de novo a cada página.
+    """
+    def __init__(self, cache: MarketDataCache | None = None, downloader: BulkDownloader | None = None):
+        self.cache = cache if cache is not None else get_shared_cache()
+        self.downloader = downloader if downloader is not None else BulkDownloader(max_attempts=1)
+        self._fetch_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "tickers_fetched": 0}
+
+    def cached(self, tickers) -> dict:
+        """Cotações já em cache, sem acessar a rede (tickers ausentes ou sem cotação ficam de fora)."""
+        quotes = {}
+        for ticker in dict.fromkeys(tickers):
+            quote = self.cache.get("quote", ticker)
+            if quote is not _MISSING and quote is not None:
+                quotes[ticker] = quote
+        return quotes
+
+    def _missing(self, tickers) -> list:
+        return [ticker for ticker in dict.fromkeys(tickers) if not self.cache.has("quote", ticker)]
+
+    def get_quotes(self, tickers, universe=None) -> dict:
+        """
+        Cotações de `tickers` ({ticker: {"price", "as_of"}}). `universe` (iterável ou função que o devolve) só é
+        avaliado quando há falta no cache.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        with self._lock:
+            self._stats["requests"] += 1
+        if self._missing(tickers):
+            with self._fetch_lock:
+                missing = self._missing(tickers)
+                if missing:
+                    extra = universe() if callable(universe) else (universe or [])
+                    self._fetch(missing + [ticker for ticker in self._missing(extra) if ticker not in missing])
+        return self.cached(tickers)
+
+    def _fetch(self, tickers: list):
+        end = pd.Timestamp.today().normalize() + pd.Timedelta(days=1)
+        start = end - pd.Timedelta(days=QUOTE_LOOKBACK_DAYS + 1)
+        started_at = time.perf_counter()
+        try:
+            quotes = last_prices(self.downloader.fetch(tickers, start, end))
+        except Exception as e:
+            logging.error(f"[QUOTES] Falha ao buscar cotações de {len(tickers)} ticker(s): {e}")
+            quotes = {}
+        for ticker in tickers:
+            self.cache.set("quote", ticker, quotes.get(ticker))
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["tickers_fetched"] += len(tickers)
+        logging.info(
+            f"[QUOTES] {len(quotes)} de {len(tickers)} cotações atualizadas em {time.perf_counter() - started_at:.2f}s."
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, **self.cache.stats().get("quote", {})}
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+def get_quote_service() -> QuoteService:
+    """Serviço único do processo: todos os usuários compartilham as mesmas cotações em cache."""
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is None:
+            _shared_service = QuoteService()
+        return _shared_service
@@ -0,0 +1,137 @@
+import json
+import logging
+import threading
+
+_decoder = json.JSONDecoder()
+
+def _json_values(text: str):
+    """Cada valor JSON completo (objeto ou lista) do texto, na ordem em que aparece."""
+    position = 0
+    while True:
+        starts = [i for i in (text.find("{", position), text.find("[", position)) if i != -1]
+        if not starts:
+            return
+        start = min(starts)
+        try:
+            value, position = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            position = start + 1
+            continue
+        yield value
+
+def _is_decision(value) -> bool:
+    if isinstance(value, dict):
+        return "decision" in value or "decisions" in value
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) and "decision" in item for item in value)
+
+def extract_json(text: str):
+    """
+    Primeiro JSON de decisão (objeto com "decision"/"decisions", ou lista deles) dentro do texto, ignorando cercas
+    de código, frases ao redor e outros JSONs citados antes (ex.: 'Nota [1]: {...}'). Sem nenhum, devolve o primeiro
+    JSON encontrado, para que a validação aponte o erro; None se não houver JSON válido.
+    """
+    if not text:
+        return None
+    first = None
+    for value in _json_values(text):
+        if _is_decision(value):
+            return value
+        if first is None:
+            first = value
+    return first
+
+def _decision_object(value) -> dict | None:
+    # Alguns modelos devolvem o objeto dentro de uma lista de um elemento.
+    if isinstance(value, list) and len(value) == 1:
+        value = value[0]
+    return value if isinstance(value, dict) else None
+
+def buy_decision_schema(candidate_tickers):
+    """Valida {"decision": "BUY"|"HOLD", "ticker", "rationale"}; numa compra o ticker precisa estar entre os candidatos."""
+    tickers = {t.upper() for t in candidate_tickers}
+
+    def validate(value) -> tuple:
+        obj = _decision_object(value)
+        if obj is None:
+            return None, "a resposta não é um objeto JSON"
+        decision = str(obj.get("decision", "")).strip().upper()
+        if decision not in ("BUY", "HOLD"):
+            return None, f"\"decision\" deve ser \"BUY\" ou \"HOLD\", recebido {obj.get('decision')!r}"
+        ticker = obj.get("ticker")
+        ticker = str(ticker).strip().upper() if ticker else None
+        if decision == "BUY" and ticker not in tickers:
+            return None, f"\"ticker\" {obj.get('ticker')!r} não está entre os candidatos ({', '.join(sorted(tickers)[:30])})"
+        return {"decision": decision, "ticker": ticker if decision == "BUY" else None, "rationale": str(obj.get("rationale", ""))}, None
+    return validate
+
+def sell_decision_schema(value) -> tuple:
+    """Valida {"decision": "SELL"|"HOLD", "rationale"}."""
+    obj = _decision_object(value)
+    if obj is None:
+        return None, "a resposta não é um objeto JSON"
+    decision = str(obj.get("decision", "")).strip().upper()
+    if decision not in ("SELL", "HOLD"):
+        return None, f"\"decision\" deve ser \"SELL\" ou \"HOLD\", recebido {obj.get('decision')!r}"
+    return {"decision": decision, "rationale": str(obj.get("rationale", ""))}, None
+
+class ResponseDecoder:
+    """
+    Extrai e valida o JSON das respostas do LLM. Quando a resposta não segue o formato, `decode` faz uma única
+    chamada de reparo, barata: só a resposta anterior e o erro, sem reenviar os dados da análise.
+    Conta respostas válidas de primeira, reparadas e perdidas, para acompanhar a taxa de falha.
+    """
+    REPAIR_EXCERPT_CHARS = 1500
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"decoded": 0, "valid": 0, "repaired": 0, "failed": 0, "empty": 0}
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["failure_rate"] = stats["failed"] / stats["decoded"] if stats["decoded"] else 0.0
+        return stats
+
+    def validate(self, response_text: str, schema) -> tuple:
+        value = extract_json(response_text)
+        if value is None:
+            return None, "nenhum JSON válido encontrado"
+        return schema(value)
+
+    def decode(self, response_text: str, schema, expected_format: str, repair=None) -> dict:
+        """
+        Decisão validada por `schema`, ou {"decision": "ERROR"}. `repair(prompt) -> str` envia o pedido de reparo;
+        respostas vazias (falha da API, já repetida pelo LLMClient) não são reparadas.
+        """
+        self._count("decoded")
+        if not response_text or not response_text.strip():
+            self._count("empty")
+            self._count("failed")
+            return {"decision": "ERROR", "rationale": "Resposta vazia ou bloqueada pela API."}
+        decision, error = self.validate(response_text, schema)
+        if decision is not None:
+            self._count("valid")
+            return decision
+        logging.warning(f"[DECODER] Resposta fora do formato ({error}); tentando reparo.")
+        if repair is not None:
+            repaired_text = repair(self.repair_prompt(response_text, error, expected_format))
+            decision, repair_error = self.validate(repaired_text, schema)
+            if decision is not None:
+                self._count("repaired")
+                return decision
+            error = repair_error
+        self._count("failed")
+        logging.error(f"[DECODER] Não foi possível aproveitar a resposta do LLM: {error}. Resposta: '{response_text[:300]}'")
+        return {"decision": "ERROR", "rationale": f"Resposta do LLM fora do formato esperado: {error}."}
+
+    def repair_prompt(self, response_text: str, error: str, expected_format: str) -> str:
+        return (
+            "Sua resposta anterior não seguiu o formato exigido.\n"
+            f"Problema: {error}.\n"
+            f"Resposta anterior:\n{response_text[:self.REPAIR_EXCERPT_CHARS]}\n\n"
+            f"Reescreva a MESMA decisão respondendo APENAS com {expected_format}, sem nenhum texto fora do JSON."
+        )
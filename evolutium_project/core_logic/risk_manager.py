@@ -1,12 +1,13 @@
 from . import config
 import logging
 
-def is_trade_allowed(account_balance: float, open_positions: list, ticker_to_trade: str, trade_value: float, side: str) -> bool:
+def is_trade_allowed(account_balance: float, open_positions: list, ticker_to_trade: str, trade_value: float, side: str, risk_percentage: float | None = None) -> bool:
     """Verifica as regras de segurança antes de permitir uma operação."""
     logging.info("[RISCO] Verificando regras de segurança...")
 
     if side == 'BUY':
-        max_value_per_trade = account_balance * config.RISK_PERCENTAGE_PER_TRADE
+        risk_percentage = risk_percentage if risk_percentage is not None else config.RISK_PERCENTAGE_PER_TRADE
+        max_value_per_trade = account_balance * risk_percentage
         if trade_value > max_value_per_trade:
             logging.warning(f"[RISCO] COMPRA NEGADA: Valor (R$ {trade_value:,.2f}) excede o limite de risco por operação de R$ {max_value_per_trade:,.2f}.")
             return False
@@ -0,0 +1,225 @@
+import copy
+import math
+import threading
+from collections import deque
+
+# Versões incrementais (O(1) por barra) dos indicadores de core_logic/indicators.py.
+# Cada objeto recebe um fechamento por vez e devolve None enquanto não tiver barras suficientes.
+
+class RollingSMA:
+    def __init__(self, length: int):
+        self.length = length
+        self._window = deque()
+        self._sum = 0.0
+        self.value = None
+
+    def update(self, close: float) -> float | None:
+        self._window.append(close)
+        self._sum += close
+        if len(self._window) > self.length:
+            self._sum -= self._window.popleft()
+        self.value = self._sum / self.length if len(self._window) == self.length else None
+        return self.value
+
+class RollingBollinger:
+    """Bandas de Bollinger com média e variância (populacional) mantidas pelo algoritmo de Welford com remoção."""
+    def __init__(self, length: int = 20, std: float = 2.0):
+        self.length = length
+        self.std = std
+        self._window = deque()
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.lower = self.mid = self.upper = None
+
+    def update(self, close: float) -> tuple | None:
+        self._window.append(close)
+        if len(self._window) > self.length:
+            old = self._window.popleft()
+            old_mean = self._mean
+            self._mean += (close - old) / self.length
+            self._m2 += (close - old) * (close - self._mean + old - old_mean)
+        else:
+            delta = close - self._mean
+            self._mean += delta / len(self._window)
+            self._m2 += delta * (close - self._mean)
+        if len(self._window) < self.length:
+            return None
+        deviation = self.std * math.sqrt(max(self._m2, 0.0) / self.length)
+        self.mid = self._mean
+        self.lower = self._mean - deviation
+        self.upper = self._mean + deviation
+        return self.lower, self.mid, self.upper
+
+class _AdjustedEWM:
+    """Média exponencial com adjust=True do pandas (usada pela RMA de Wilder do pandas_ta)."""
+    def __init__(self, alpha: float, min_periods: int):
+        self.decay = 1.0 - alpha
+        self.min_periods = min_periods
+        self._weighted = None
+        self._old_wt = 1.0
+        self._nobs = 0
+
+    def update(self, value: float) -> float | None:
+        self._nobs += 1
+        if self._weighted is None:
+            self._weighted = value
+        else:
+            self._old_wt *= self.decay
+            self._weighted = (self._old_wt * self._weighted + value) / (self._old_wt + 1.0)
+            self._old_wt += 1.0
+        return self._weighted if self._nobs >= self.min_periods else None
+
+class WilderRSI:
+    def __init__(self, length: int = 14):
+        self.length = length
+        self._previous = None
+        self._gains = _AdjustedEWM(1.0 / length, length)
+        self._losses = _AdjustedEWM(1.0 / length, length)
+        self.value = None
+
+    def update(self, close: float) -> float | None:
+        if self._previous is not None:
+            change = close - self._previous
+            gain = self._gains.update(max(change, 0.0))
+            loss = self._losses.update(min(change, 0.0))
+            if gain is not None and loss is not None:
+                total = gain + abs(loss)
+                self.value = 100 * gain / total if total else None
+        self._previous = close
+        return self.value
+
+class SeededEMA:
+    """EMA do pandas_ta: a semente é a média simples das `length` primeiras barras."""
+    def __init__(self, length: int):
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self._seed = []
+        self.value = None
+
+    def update(self, close: float) -> float | None:
+        if self.value is None:
+            self._seed.append(close)
+            if len(self._seed) == self.length:
+                self.value = sum(self._seed) / self.length
+                self._seed = []
+            return self.value
+        self.value += self.alpha * (close - self.value)
+        return self.value
+
+class StreamingMACD:
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self._fast = SeededEMA(fast)
+        self._slow = SeededEMA(slow)
+        self._signal = SeededEMA(signal)
+        self.macd = self.signal = self.histogram = None
+
+    def update(self, close: float):
+        fast = self._fast.update(close)
+        slow = self._slow.update(close)
+        if fast is None or slow is None:
+            return None
+        self.macd = fast - slow
+        self.signal = self._signal.update(self.macd)
+        self.histogram = self.macd - self.signal if self.signal is not None else None
+        return self.macd, self.histogram, self.signal
+
+class StreamingIndicators:
+    """
+    Conjunto de indicadores de um ticker, atualizado barra a barra.
+    Uma barra com a mesma data da última recebida revisa essa barra (o candle do dia ainda em formação) em vez de
+    acrescentar outra: o estado volta ao de antes dela e o novo fechamento é aplicado.
+    """
+    def __init__(self):
+        self.sma_21 = RollingSMA(21)
+        self.sma_50 = RollingSMA(50)
+        self.rsi = WilderRSI(14)
+        self.bbands = RollingBollinger(20, 2.0)
+        self.macd = StreamingMACD(12, 26, 9)
+        self.last_close = None
+        self.last_date = None
+        self._before_last = None
+
+    @classmethod
+    def from_history(cls, df) -> "StreamingIndicators":
+        """Semeia o estado repassando uma única vez os fechamentos de um DataFrame OHLC (indexado por data)."""
+        state = cls()
+        closes = df['Close'].to_numpy(dtype="f8")
+        for close in closes[:-1]:
+            state.update(close)
+        if len(closes):
+            # Só a última barra guarda o estado anterior: é a única que uma atualização seguinte pode revisar.
+            state.update(closes[-1], df.index[-1])
+        return state
+
+    def update(self, close: float, date=None) -> dict:
+        if close is None or math.isnan(close):
+            return self.technical_indicators()
+        if date is not None and date == self.last_date and self._before_last is not None:
+            self._restore(self._before_last)
+        else:
+            self._before_last = self._state() if date is not None else None
+            self.last_date = date
+        self.last_close = close
+        self.sma_21.update(close)
+        self.sma_50.update(close)
+        self.rsi.update(close)
+        self.bbands.update(close)
+        self.macd.update(close)
+        return self.technical_indicators()
+
+    def _state(self) -> tuple:
+        return copy.deepcopy((self.sma_21, self.sma_50, self.rsi, self.bbands, self.macd, self.last_close))
+
+    def _restore(self, state: tuple):
+        self.sma_21, self.sma_50, self.rsi, self.bbands, self.macd, self.last_close = copy.deepcopy(state)
+
+    def technical_indicators(self) -> dict:
+        """Mesmo formato de `technical_indicators` devolvido pelos DataProviders."""
+        return {
+            "SMA_21": self.sma_21.value, "SMA_50": self.sma_50.value,
+            "RSI_14": self.rsi.value, "BBL_20_2.0": self.bbands.lower,
+            "BBU_20_2.0": self.bbands.upper, "MACD_12_26_9": self.macd.macd,
+            "MACDh_12_26_9": self.macd.histogram, "MACDs_12_26_9": self.macd.signal,
+        }
+
+class StreamingIndicatorBook:
+    """Indicadores incrementais de todo o universo, indexados por ticker. Pode ser usado por várias threads."""
+    def __init__(self):
+        self.states = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_historical_data(cls, historical_data: dict) -> "StreamingIndicatorBook":
+        """Semeia a partir de BacktestDataProvider.historical_data (ou qualquer dict ticker -> DataFrame OHLC)."""
+        book = cls()
+        for ticker, df in historical_data.items():
+            book.states[ticker] = StreamingIndicators.from_history(df)
+        return book
+
+    def update(self, ticker: str, close: float, date=None) -> dict:
+        with self._lock:
+            state = self.states.get(ticker)
+            if state is None:
+                state = self.states[ticker] = StreamingIndicators()
+            return state.update(close, date)
+
+    def refresh(self, ticker: str, df) -> dict:
+        """
+        Atualiza o ticker com o histórico `df` mais recente: só as barras a partir da última já processada são aplicadas,
+        e essa última é revisada com o fechamento atual. Sem estado anterior (ou se `df` não alcança a última barra
+        processada), o estado é semeado de novo com o histórico inteiro.
+        """
+        with self._lock:
+            state = self.states.get(ticker)
+            if state is None or state.last_date is None or state.last_date not in df.index:
+                state = self.states[ticker] = StreamingIndicators.from_history(df)
+            else:
+                closes = df['Close'].loc[state.last_date:]
+                for date, close in zip(closes.index, closes.to_numpy(dtype="f8")):
+                    state.update(close, date)
+            return state.technical_indicators()
+
+    def technical_indicators(self, ticker: str) -> dict:
+        with self._lock:
+            state = self.states.get(ticker)
+            return state.technical_indicators() if state else {}
@@ -0,0 +1,163 @@
+import itertools
+import logging
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from . import config
+from .backtester import Backtester
+from .decision_backends import RuleBasedDecider
+from .market_panel import MarketPanel
+
+DEFAULT_INDICATOR_PARAMS = {"sma_fast": 21, "sma_slow": 50, "rsi_length": 14, "macd_fast": 12, "macd_slow": 26, "macd_signal": 9}
+
+class Scenario:
+    """Um ponto da varredura: janela de datas, risco por operação, comprimentos dos indicadores e regras do decisor."""
+    def __init__(self, name: str | None = None, start=None, end=None, risk_percentage: float | None = None,
+                 slippage: float = 0.0, initial_balance: float = 100000.0, rsi_overbought: float = 70.0,
+                 stop_loss: float = 0.08, take_profit: float = 0.20, **indicator_params):
+        unknown = set(indicator_params) - set(DEFAULT_INDICATOR_PARAMS)
+        if unknown:
+            raise ValueError(f"Parâmetros de indicador desconhecidos: {sorted(unknown)}")
+        self.start = pd.Timestamp(start) if start is not None else None
+        self.end = pd.Timestamp(end) if end is not None else None
+        self.risk_percentage = risk_percentage if risk_percentage is not None else config.RISK_PERCENTAGE_PER_TRADE
+        self.slippage = slippage
+        self.initial_balance = initial_balance
+        self.rsi_overbought = rsi_overbought
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.indicator_params = {**DEFAULT_INDICATOR_PARAMS, **indicator_params}
+        self.name = name if name else self._default_name()
+
+    def _default_name(self) -> str:
+        window = f"{self.start.date() if self.start is not None else '...'}:{self.end.date() if self.end is not None else '...'}"
+        p = self.indicator_params
+        return f"risk={self.risk_percentage:g} sma={p['sma_fast']}/{p['sma_slow']} rsi={p['rsi_length']} {window}"
+
+    def compute_params(self) -> dict:
+        """Parâmetros no formato de compute_indicators."""
+        p = self.indicator_params
+        return {
+            "sma_lengths": (p["sma_fast"], p["sma_slow"]), "rsi_length": p["rsi_length"],
+            "macd_fast": p["macd_fast"], "macd_slow": p["macd_slow"], "macd_signal": p["macd_signal"],
+        }
+
+    def decider(self) -> RuleBasedDecider:
+        return RuleBasedDecider(self.rsi_overbought, self.stop_loss, self.take_profit, **self.indicator_params)
+
+    def as_row(self) -> dict:
+        return {
+            "scenario": self.name, "start": self.start, "end": self.end, "risk_percentage": self.risk_percentage,
+            "slippage": self.slippage, "rsi_overbought": self.rsi_overbought, "stop_loss": self.stop_loss,
+            "take_profit": self.take_profit, **self.indicator_params,
+        }
+
+def parameter_grid(windows: list | None = None, **axes) -> list:
+    """Produto cartesiano dos eixos (ex.: risk_percentage=[0.1, 0.25], sma_fast=[10, 21]) para cada janela (start, end)."""
+    windows = windows if windows else [(None, None)]
+    names = list(axes)
+    scenarios = []
+    for start, end in windows:
+        for values in itertools.product(*(axes[name] for name in names)):
+            scenarios.append(Scenario(start=start, end=end, **dict(zip(names, values))))
+    return scenarios
+
+def walk_forward_windows(trading_days: pd.DatetimeIndex, window_days: int, step_days: int | None = None) -> list:
+    """Janelas consecutivas de `window_days` pregões, avançando `step_days` (padrão: sem sobreposição)."""
+    step_days = step_days if step_days else window_days
+    windows = []
+    for first in range(0, len(trading_days) - window_days + 1, step_days):
+        last = first + window_days
+        end = trading_days[last] if last < len(trading_days) else trading_days[-1] + pd.Timedelta(days=1)
+        windows.append((trading_days[first], end))
+    return windows
+
+class PanelDataProvider:
+    """Fonte de dados do Backtester sobre um MarketPanel já carregado, sem acesso ao HistoryStore."""
+    def __init__(self, panel: MarketPanel):
+        self.panel = panel
+        self.current_date = None
+        self.current_index = None
+
+    def get_trading_days(self) -> pd.DatetimeIndex:
+        return self.panel.dates
+
+    def set_current_date(self, date):
+        self.current_date = date
+        self.current_index = self.panel.date_index(date) if date is not None else None
+
+    def get_snapshot(self, index: int | None = None):
+        index = self.current_index if index is None else index
+        return self.panel.snapshot(index) if index is not None else None
+
+# Estado de cada processo do pool: o painel mapeado do disco e os painéis de indicadores já recalculados.
+_worker_panel = None
+_worker_indicator_panels = {}
+
+def _init_worker(panel_dir: str):
+    global _worker_panel
+    logging.disable(logging.INFO)
+    _worker_panel = MarketPanel.load(panel_dir, mmap_mode="r")
+    _worker_indicator_panels.clear()
+
+def _indicator_panel(panel: MarketPanel, scenario: Scenario, cache: dict) -> MarketPanel:
+    if scenario.indicator_params == DEFAULT_INDICATOR_PARAMS:
+        return panel
+    key = tuple(sorted(scenario.indicator_params.items()))
+    if key not in cache:
+        # Os indicadores são recalculados sobre o histórico inteiro, para que cada janela já comece aquecida.
+        cache[key] = panel.with_indicators(**scenario.compute_params())
+    return cache[key]
+
+def run_scenario(panel: MarketPanel, scenario: Scenario, cache: dict | None = None) -> dict:
+    started_at = time.perf_counter()
+    cache = cache if cache is not None else {}
+    window = _indicator_panel(panel, scenario, cache).window(scenario.start, scenario.end)
+    result = Backtester(
+        PanelDataProvider(window), scenario.decider(), scenario.initial_balance,
+        scenario.risk_percentage, scenario.slippage
+    ).run()
+    return {**scenario.as_row(), **result.stats, "sessions": len(window.dates), "seconds": time.perf_counter() - started_at}
+
+def _run_in_worker(scenario: Scenario) -> dict:
+    return run_scenario(_worker_panel, scenario, _worker_indicator_panels)
+
+class SweepRunner:
+    """
+    Distribui os cenários por um pool de processos. O painel é gravado uma única vez em .npy e cada processo
+    o abre com memory-map, de modo que só os cenários (alguns bytes) são serializados para os workers.
+    """
+    def __init__(self, panel: MarketPanel, max_workers: int | None = None):
+        self.panel = panel
+        self.max_workers = max_workers if max_workers else config.SWEEP_MAX_WORKERS
+
+    def run(self, scenarios: list) -> pd.DataFrame:
+        scenarios = list(scenarios)
+        logging.info(f"[SWEEP] Executando {len(scenarios)} cenários com {self.max_workers} processo(s)...")
+        if self.max_workers <= 1 or len(scenarios) <= 1:
+            cache = {}
+            rows = [run_scenario(self.panel, scenario, cache) for scenario in scenarios]
+        else:
+            panel_dir = tempfile.mkdtemp(prefix="evolutium_sweep_")
+            try:
+                self.panel.save(panel_dir)
+                # Cenários com os mesmos indicadores ficam juntos, para aproveitar o cache de cada processo.
+                ordered = sorted(range(len(scenarios)), key=lambda i: tuple(sorted(scenarios[i].indicator_params.items())))
+                chunksize = max(1, len(scenarios) // (self.max_workers * 4))
+                with ProcessPoolExecutor(self.max_workers, initializer=_init_worker, initargs=(panel_dir,)) as executor:
+                    results = list(executor.map(_run_in_worker, [scenarios[i] for i in ordered], chunksize=chunksize))
+                rows = [None] * len(scenarios)
+                for i, row in zip(ordered, results):
+                    rows[i] = row
+            finally:
+                shutil.rmtree(panel_dir, ignore_errors=True)
+        return self.comparison_table(rows)
+
+    @staticmethod
+    def comparison_table(rows: list) -> pd.DataFrame:
+        table = pd.DataFrame(rows)
+        if table.empty:
+            return table
+        return table.sort_values("sharpe", ascending=False, kind="stable").reset_index(drop=True)
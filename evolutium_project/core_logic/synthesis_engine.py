@@ -1,19 +1,52 @@
 import google.generativeai as genai
-import json
+from google.ai import generativelanguage as glm
 from . import config
+from .prompt_builder import PromptBuilder, format_market_context
+from .llm_cache import LLMResponseCache, get_shared_llm_cache
+from .llm_client import LLMClient, LLMError, get_llm_client
+from .response_decoder import ResponseDecoder, buy_decision_schema, extract_json, sell_decision_schema
 import logging
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
+MODEL_NAME = 'gemini-flash-latest'
+BUY_FORMAT = 'um objeto JSON com as chaves "decision" ("BUY" ou "HOLD"), "ticker" (um dos candidatos, ou null) e "rationale" (string)'
+SELL_FORMAT = 'um objeto JSON com as chaves "decision" ("SELL" ou "HOLD") e "rationale" (string)'
+
+class GeminiModel:
+    """
+    Modelo do Gemini ligado a uma chave de API. Usa um GenerativeServiceClient próprio (client_options com a chave)
+    em vez do genai.configure, que é global no processo, para que motores de chaves diferentes convivam no pool.
+    Expõe o mesmo generate_content(prompt, request_options=...) do genai.GenerativeModel usado pelo LLMClient.
+    """
+    def __init__(self, api_key: str, model_name: str, safety_settings: dict):
+        self.model_name = model_name
+        self._service = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        self._safety_settings = [glm.SafetySetting(category=category, threshold=threshold) for category, threshold in safety_settings.items()]
+
+    def generate_content(self, prompt: str, request_options: dict | None = None):
+        request = glm.GenerateContentRequest(
+            model=f"models/{self.model_name}",
+            contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])],
+            safety_settings=self._safety_settings,
+        )
+        kwargs = {"timeout": request_options["timeout"]} if request_options and request_options.get("timeout") else {}
+        response = self._service.generate_content(request, **kwargs)
+        return genai.types.GenerateContentResponse.from_response(response)
+
 class SynthesisEngine:
-    def  __init__(self, api_key=None):
+    def  __init__(self, api_key=None, cache: LLMResponseCache | None = None, client: LLMClient | None = None):
         self.model = None
+        self.model_name = MODEL_NAME
+        self.prompt_builder = PromptBuilder()
+        self.decoder = ResponseDecoder()
+        self.cache = cache if cache is not None else get_shared_llm_cache()
         try:
             final_api_key = api_key if api_key else config.GEMINI_API_KEY
 
             if not final_api_key:
                 raise ValueError("A chave de API do Gemini não foi fornecida ou encontrada no ambiente.")
             
-            genai.configure(api_key=final_api_key)
+            self.client = client if client is not None else get_llm_client(final_api_key)
 
             safety_settings = {
                 HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
@@ -22,7 +55,7 @@ class SynthesisEngine:
                 HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
             }
 
-            self.model = genai.GenerativeModel('gemini-flash-latest', safety_settings=safety_settings)
+            self.model = GeminiModel(final_api_key, self.model_name, safety_settings)
             logging.info("[ENGINE] Motor de Síntese com 'gemini-2.5-flash' inicializado com SUCESSO.")
         except Exception as e:
             logging.critical(f"[ENGINE] ERRO FATAL NA INICIALIZAÇÃO DO GEMINI: {e}", exc_info=True)
@@ -35,26 +68,78 @@ class SynthesisEngine:
         return f"{value:.2f}"
 
     def _generate_content_safely(self, prompt: str) -> str:
+        # Prompts idênticos (backtests repetidos, usuários com a mesma posição) são respondidos pelo cache, sem chamar a API.
+        if self.cache is not None:
+            return self.cache.get_or_generate(self.model_name, prompt, lambda: self._call_model(prompt))
+        return self._call_model(prompt)
+
+    def _call_model(self, prompt: str) -> str:
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            logging.error(f"[ENGINE] A chamada para a API do Gemini falhou: {e}")
+            return self.client.generate(self.model, prompt)
+        except LLMError as e:
+            logging.error(f"[ENGINE] A chamada para a API do Gemini falhou após {e.attempts} tentativa(s) ({e.kind}): {e}")
             return ""
 
+    def _generate_many_safely(self, prompts: list) -> list:
+        """Como _generate_content_safely para vários prompts, com as chamadas que faltam no cache feitas em paralelo."""
+        responses = [self.cache.get(self.model_name, prompt) if self.cache is not None else None for prompt in prompts]
+        pending = [i for i, response in enumerate(responses) if response is None]
+        for i, result in zip(pending, self.client.generate_many(self.model, [prompts[i] for i in pending])):
+            if isinstance(result, LLMError):
+                logging.error(f"[ENGINE] A chamada para a API do Gemini falhou após {result.attempts} tentativa(s) ({result.kind}): {result}")
+                result = ""
+            elif self.cache is not None:
+                self.cache.set(self.model_name, prompts[i], result)
+            responses[i] = result
+        return responses
+
     def decide_best_investment(self, candidates: list, trade_history: list, market_context: dict) -> dict:
         if not self.model: return {"decision": "ERROR", "rationale": "Modelo não inicializado."}
         prompt = self._build_buy_prompt(candidates, trade_history, market_context)
         logging.info("[ENGINE] Enviando prompt de COMPRA para análise do Gemini...")
         response_text = self._generate_content_safely(prompt)
-        return self._parse_response(response_text)
+        return self._decode(response_text, buy_decision_schema(c['ticker'] for c in candidates), BUY_FORMAT)
 
     def should_sell_position(self, position_data: dict, current_position: dict, trade_history: list, market_context: dict) -> dict:
         if not self.model: return {"decision": "ERROR", "rationale": "Modelo não inicializado."}
         prompt = self._build_sell_prompt(position_data, current_position, trade_history, market_context)
         logging.info(f"[ENGINE] Enviando prompt de VENDA para reavaliação de {current_position['ticker']}...")
         response_text = self._generate_content_safely(prompt)
-        return self._parse_response(response_text)
+        return self._decode(response_text, sell_decision_schema, SELL_FORMAT)
+
+    def should_sell_positions(self, positions: list, trade_history: list, market_context: dict) -> dict:
+        """
+        Reavalia todas as posições em uma única chamada ao LLM. `positions` é uma lista de pares (market_data, posição)
+        e o retorno mapeia ticker -> {"decision", "rationale"}. Posições que o modelo não devolver (ou uma resposta
+        inválida) são reavaliadas individualmente, com as chamadas em paralelo.
+        """
+        if not positions:
+            return {}
+        if not self.model:
+            return {position['ticker']: {"decision": "ERROR", "rationale": "Modelo não inicializado."} for _, position in positions}
+        prompt = self.prompt_builder.build_sell_review_prompt(positions, trade_history, market_context)
+        logging.info(f"[ENGINE] Enviando prompt de VENDA em lote para reavaliação de {len(positions)} posições...")
+        decisions = self._parse_batch_decisions(self._generate_content_safely(prompt), {p['ticker'] for _, p in positions})
+
+        missing = [(data, position) for data, position in positions if position['ticker'] not in decisions]
+        if missing:
+            logging.warning(f"[ENGINE] Resposta em lote sem decisão para {[p['ticker'] for _, p in missing]}; reavaliando individualmente.")
+            prompts = [self._build_sell_prompt(data, position, trade_history, market_context) for data, position in missing]
+            for (_, position), response_text in zip(missing, self._generate_many_safely(prompts)):
+                decisions[position['ticker']] = self._decode(response_text, sell_decision_schema, SELL_FORMAT)
+        return {position['ticker']: decisions[position['ticker']] for _, position in positions}
+
+    def _parse_batch_decisions(self, response_text: str, tickers: set) -> dict:
+        parsed = extract_json(response_text)
+        items = parsed.get("decisions") if isinstance(parsed, dict) else parsed
+        decisions = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            ticker, decision = str(item.get("ticker", "")).strip().upper(), str(item.get("decision", "")).strip().upper()
+            if ticker in tickers and decision in ("SELL", "HOLD"):
+                decisions[ticker] = {"decision": decision, "rationale": item.get("rationale", "")}
+        return decisions
 
     def _get_full_technical_analysis_text(self, fundamentals: dict, technicals: dict) -> str:
         if not technicals: return "\n  - Análise Técnica: Dados insuficientes."
@@ -91,41 +176,7 @@ class SynthesisEngine:
         return "\n  - " + "\n  - ".join(analysis_items)
 
     def _build_buy_prompt(self, candidates: list, trade_history: list, market_context: dict) -> str:
-        candidates_str = ""
-        for data in candidates:
-            fundamentals = data['fundamental_data']
-            technicals = data.get('technical_indicators', {})
-            technical_text = self._get_full_technical_analysis_text(fundamentals, technicals)
-            candidates_str += f"""
-            ---
-            Candidato: {data['ticker']}
-            - Preço Atual: {self._format_value(fundamentals.get('Preço Atual'), is_currency=True)}
-            - Indicadores Fundamentalistas: P/L: {self._format_value(fundamentals.get('P/L'))}, ROE: {self._format_value(fundamentals.get('ROE'), is_percent=True)}
-            - Análise Técnica Detalhada:{technical_text}
-            - Notícias: {' | '.join(data['recent_news'])}
-            """
-        history_str = "\n".join([f"- {t['timestamp']}: {t['side']} {t['quantity']} {t['ticker']} @ R$ {t['price']:.2f}" for t in trade_history[-5:]])
-        if not history_str: history_str = "Nenhuma transação recente."
-        
-        context_str = f"  - Ibovespa (última semana): {market_context.get('ibov_change', 'N/A')}\n"
-
-        return f"""
-        **Análise Comparativa de Portfólio para Seleção de Ativo**
-        **Contexto Geral do Mercado:**
-        {context_str}
-        **Histórico de Transações Recentes (as 5 últimas):**
-        {history_str}
-        
-        **Sua Tarefa:**
-        1. Considere o contexto de mercado. Em um mercado de baixa (Ibovespa caindo), seja mais cauteloso. Em um mercado de alta, seja mais confiante.
-        2. Analise os ativos candidatos abaixo, combinando análise fundamentalista, de notícias e técnica.
-        3. **Use o histórico de transações para evitar "flip-flopping"**: não compre um ativo que foi vendido recentemente, a menos que haja uma nova e forte razão para isso.
-        4. Escolha o melhor e único ativo para comprar. Se nenhum candidato apresentar uma combinação favorável, escolha "HOLD".
-        
-        **Ativos Candidatos:**{candidates_str}
-        
-        **IMPORTANTE: Sua resposta deve ser APENAS um objeto JSON com as chaves "decision" (string: "BUY" ou "HOLD"), "ticker" (string com o ticker escolhido, ou null), e "rationale" (string explicando a comparação).**
-        """
+        return self.prompt_builder.build_buy_prompt(candidates, trade_history, market_context)
 
     def _build_sell_prompt(self, data: dict, position: dict, trade_history: list, market_context: dict) -> str:
         fundamentals = data['fundamental_data']
@@ -137,7 +188,7 @@ class SynthesisEngine:
         history_str = "\n".join([f"- {t['timestamp']}: {t['side']} {t['quantity']} {t['ticker']} @ R$ {t['price']:.2f}" for t in trade_history[-5:]])
         if not history_str: history_str = "Nenhuma transação recente."
 
-        context_str = f"  - Ibovespa (última semana): {market_context.get('ibov_change', 'N/A')}\n"
+        context_str = f"  - {format_market_context(market_context)}\n"
 
         return f"""
         **Reavaliação de Posição para Venda**
@@ -165,50 +216,17 @@ class SynthesisEngine:
         **IMPORTANTE: Sua resposta deve ser APENAS um objeto JSON com as chaves "decision" (string: "SELL" ou "HOLD") e "rationale" (string).**
         """
 
-    def _parse_response(self, response_text: str) -> dict:
+    def _decode(self, response_text: str, schema, expected_format: str) -> dict:
+        """Decisão validada pelo schema; fora do formato, o decoder faz uma chamada de reparo curta ao mesmo modelo."""
         logging.debug(f"[ENGINE] Resposta bruta recebida do Gemini: '{response_text}'")
-        if not response_text or not response_text.strip():
-            return {"decision": "ERROR", "rationale": "Resposta vazia ou bloqueada pela API."}
-        try:
-            json_str = response_text.strip().replace("```json", "").replace("```", "").strip()
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            logging.error(f"[ENGINE] Não foi possível processar o JSON da resposta do Gemini: {e}. Resposta: '{response_text}'")
-            return {"decision": "ERROR", "rationale": "Falha ao processar o formato JSON da resposta."}
+        return self.decoder.decode(response_text, schema, expected_format, repair=self._generate_content_safely)
 
     def _build_buy_prompt_backtest(self, candidates: list, market_context: dict) -> str:
-        candidates_str = ""
-        for data in candidates:
-            fundamentals = data['fundamental_data']
-            technicals = data.get('technical_indicators', {})
-            technical_text = self._get_full_technical_analysis_text(fundamentals, technicals)
-            candidates_str += f"""
-            ---
-            Candidato: {data['ticker']}
-            - Preço Atual: {self._format_value(fundamentals.get('Preço Atual'), is_currency=True)}
-            - Análise Técnica Detalhada:{technical_text}
-            """
-        
-        context_str = f"  - Ibovespa (última semana): {market_context.get('ibov_change', 'N/A')}\n"
-
-        return f"""
-        **Análise Comparativa para Backtest (Foco Técnico e Contexto)**
-        **Contexto Geral do Mercado:**
-        {context_str}
-        **Sua Tarefa:**
-        1. Considere o contexto de mercado. Em um mercado de baixa (Ibovespa caindo), seja mais seletivo e exija sinais técnicos mais fortes para comprar.
-        2. Analise os dados puramente técnicos dos ativos candidatos.
-        3. Um candidato ideal tem uma tendência de alta clara (preço acima das médias), um RSI que não esteja sobrecomprado (>70) e um sinal de MACD positivo.
-        4. Escolha o melhor e único ativo para comprar com base APENAS nos indicadores técnicos e no contexto de mercado. Se nenhum for claramente positivo, escolha "HOLD".
-        
-        **Ativos Candidatos:**{candidates_str}
-        
-        **IMPORTANTE: Sua resposta deve ser APENAS um objeto JSON com as chaves "decision" (string: "BUY" ou "HOLD"), "ticker" (string com o ticker escolhido, ou null), e "rationale" (string explicando a comparação técnica).**
-        """
+        return self.prompt_builder.build_buy_prompt_backtest(candidates, market_context)
 
     def decide_best_investment_backtest(self, candidates: list, market_context: dict) -> dict:
         if not self.model: return {"decision": "ERROR", "rationale": "Modelo não inicializado."}
         prompt = self._build_buy_prompt_backtest(candidates, market_context)
         logging.info("[ENGINE] Enviando prompt de COMPRA (modo backtest) para análise do Gemini...")
         response_text = self._generate_content_safely(prompt)
-        return self._parse_response(response_text)
+        return self._decode(response_text, buy_decision_schema(c['ticker'] for c in candidates), BUY_FORMAT)
@@ -0,0 +1,116 @@
+import threading
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from dateutil.easter import easter
+
+# Feriados nacionais fixos em que a B3 não abre, mais os dias sem pregão de fim de ano.
+_FIXED_HOLIDAYS = ((1, 1), (4, 21), (5, 1), (9, 7), (10, 12), (11, 2), (11, 15), (12, 24), (12, 25), (12, 31))
+# Feriados da cidade de São Paulo em que a B3 fechou até 2021 (aniversário da cidade, Revolução Constitucionalista e Consciência Negra).
+_SAO_PAULO_HOLIDAYS = ((1, 25), (7, 9), (11, 20))
+_SAO_PAULO_HOLIDAYS_UNTIL = 2021
+# Consciência Negra passou a ser feriado nacional em 2024.
+_NATIONAL_BLACK_CONSCIOUSNESS_SINCE = 2024
+# Offsets em dias a partir do domingo de Páscoa: Carnaval (segunda e terça), Sexta-feira Santa e Corpus Christi.
+_EASTER_OFFSETS = (-48, -47, -2, 60)
+
+SHARED_CALENDAR_START = "2000-01-01"
+
+@lru_cache(maxsize=None)
+def b3_holidays(year: int) -> frozenset:
+    """Datas (datetime.date) sem pregão na B3 no ano, a partir da tabela local; inclui feriados em fim de semana."""
+    holidays = {pd.Timestamp(year, month, day).date() for month, day in _FIXED_HOLIDAYS}
+    if year <= _SAO_PAULO_HOLIDAYS_UNTIL:
+        holidays.update(pd.Timestamp(year, month, day).date() for month, day in _SAO_PAULO_HOLIDAYS)
+    if year >= _NATIONAL_BLACK_CONSCIOUSNESS_SINCE:
+        holidays.add(pd.Timestamp(year, 11, 20).date())
+    easter_sunday = pd.Timestamp(easter(year))
+    holidays.update((easter_sunday + pd.Timedelta(days=offset)).date() for offset in _EASTER_OFFSETS)
+    return frozenset(holidays)
+
+class TradingCalendar:
+    """
+    Pregões da B3 em um intervalo, calculados uma única vez.
+    Faz o mapeamento data <-> índice inteiro e o alinhamento (com forward-fill) de tickers que não negociaram em algum pregão.
+    """
+    def __init__(self, sessions: pd.DatetimeIndex):
+        self.sessions = pd.DatetimeIndex(sessions).normalize().unique().sort_values()
+        self._values = self.sessions.values
+        self._positions = {date: i for i, date in enumerate(self.sessions)}
+
+    @classmethod
+    def b3(cls, start, end) -> "TradingCalendar":
+        """Pregões da B3 em [start, end)."""
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        holidays = set()
+        for year in range(start.year, end.year + 1):
+            holidays.update(b3_holidays(year))
+        days = np.arange(np.datetime64(start.date()), np.datetime64(end.date()), dtype="M8[D]")
+        sessions = days[np.is_busday(days, holidays=np.array(sorted(holidays), dtype="M8[D]"))]
+        return cls(pd.DatetimeIndex(sessions.astype("M8[ns]")))
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    @property
+    def start(self) -> pd.Timestamp | None:
+        return self.sessions[0] if len(self.sessions) else None
+
+    @property
+    def end(self) -> pd.Timestamp | None:
+        return self.sessions[-1] if len(self.sessions) else None
+
+    def is_session(self, date) -> bool:
+        return pd.Timestamp(date).normalize() in self._positions
+
+    def index_of(self, date) -> int | None:
+        """Índice do pregão `date`, ou None se a data não for pregão."""
+        return self._positions.get(pd.Timestamp(date).normalize())
+
+    def date_at(self, index: int) -> pd.Timestamp:
+        return self.sessions[index]
+
+    def locate(self, date) -> int:
+        """Índice do último pregão em ou antes de `date` (-1 se for anterior ao calendário)."""
+        return int(np.searchsorted(self._values, np.datetime64(pd.Timestamp(date).normalize()), side="right")) - 1
+
+    def between(self, start, end) -> pd.DatetimeIndex:
+        """Pregões em [start, end)."""
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        first, last = np.searchsorted(self._values, [np.datetime64(start), np.datetime64(end)])
+        return self.sessions[first:last]
+
+    def has_sessions(self, start, end) -> bool:
+        """Se há pregão em [start, end). Fora do intervalo conhecido a resposta é conservadora (True)."""
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        if not len(self.sessions) or start < self.start or end > self.end + pd.Timedelta(days=1):
+            return True
+        return len(self.between(start, end)) > 0
+
+    def align(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Reindexa um DataFrame OHLC aos pregões entre a sua primeira e a sua última barra.
+        Pregões sem negociação repetem o último preço e ficam com volume zero; barras fora do calendário são descartadas.
+        """
+        if df is None or df.empty:
+            return df
+        sessions = self.between(df.index[0], df.index[-1] + pd.Timedelta(days=1))
+        if len(sessions) == len(df) and sessions.equals(df.index):
+            return df
+        aligned = df.reindex(sessions).ffill()
+        if 'Volume' in aligned.columns:
+            aligned['Volume'] = df['Volume'].reindex(sessions).fillna(0.0)
+        aligned.index.name = df.index.name
+        return aligned
+
+_shared_calendar = None
+_shared_calendar_lock = threading.Lock()
+
+def get_shared_calendar() -> TradingCalendar:
+    """Calendário único do processo (de SHARED_CALENDAR_START até um ano à frente), usado pelo DataProvider e pelo HistoryStore."""
+    global _shared_calendar
+    with _shared_calendar_lock:
+        if _shared_calendar is None:
+            end = pd.Timestamp.today().normalize() + pd.Timedelta(days=366)
+            _shared_calendar = TradingCalendar.b3(SHARED_CALENDAR_START, end)
+        return _shared_calendar
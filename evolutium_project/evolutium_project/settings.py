@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,12 +51,57 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'evolutium_project.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Banco de dados escolhido por variáveis de ambiente: 'sqlite' (padrão, um único servidor) ou 'postgresql' (produção).
+# O PostgreSQL e o pool de conexões exigem psycopg e psycopg_pool: pip install -r requirements-postgres.txt.
+DATABASE_ENGINE = os.getenv('DATABASE_ENGINE', 'sqlite')
+# Conexões persistentes: cada worker reaproveita a sua por até esse tempo (s) em vez de abrir uma por requisição.
+DATABASE_CONN_MAX_AGE = int(os.getenv('DATABASE_CONN_MAX_AGE', 60))
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DATABASE_NAME', 'evolutium'),
+            'USER': os.getenv('DATABASE_USER', 'evolutium'),
+            'PASSWORD': os.getenv('DATABASE_PASSWORD', ''),
+            'HOST': os.getenv('DATABASE_HOST', 'localhost'),
+            'PORT': os.getenv('DATABASE_PORT', '5432'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    # Pool de conexões do psycopg 3 compartilhado pelas threads do worker; substitui as conexões persistentes.
+    if os.getenv('DATABASE_POOL_MAX_SIZE'):
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE')),
+        }
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+elif DATABASE_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            # Testes em arquivo, não em memória: o banco em memória compartilhado entre threads não espera pelo lock
+            # (falha com 'table is locked'), então não reproduziria o WAL e o timeout usados em produção.
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+            'OPTIONS': {
+                # IMMEDIATE: a transação pega o lock de escrita já no BEGIN, então escritas concorrentes esperam a vez
+                # (até `timeout` segundos) em vez de falharem ao promover o lock de leitura.
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': int(os.getenv('DATABASE_SQLITE_TIMEOUT', 20)),
+                # WAL: leituras não bloqueiam a escrita; synchronous=NORMAL é seguro em WAL e evita um fsync por commit.
+                'init_command': (
+                    'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY; '
+                    'PRAGMA cache_size=-20000; PRAGMA mmap_size=134217728;'
+                ),
+            },
+        }
     }
-}
+else:
+    raise ImproperlyConfigured(f"DATABASE_ENGINE inválido: {DATABASE_ENGINE!r} (use 'sqlite' ou 'postgresql').")
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
@@ -75,6 +75,107 @@ document.addEventListener('DOMContentLoaded', function() {
         analysisResultContainer.innerHTML = resultHtml;
     }
 
+    const POLL_INTERVAL_MS = 2000;
+    const loaderText = loaderContainer.querySelector('p');
+    const defaultLoaderText = loaderText ? loaderText.innerText : '';
+
+    function finishAnalysis(buttonText) {
+        loaderContainer.style.display = 'none';
+        if (loaderText) loaderText.innerText = defaultLoaderText;
+        analyzeBtn.disabled = false;
+        analyzeBtn.innerText = buttonText;
+    }
+
+    function handleJobUpdate(job) {
+        if (job.progress && loaderText) loaderText.innerText = job.progress;
+        if (job.status === 'SUCCEEDED') {
+            finishAnalysis('Analisar e Otimizar Novamente');
+            displayResults(job.result);
+            return true;
+        }
+        if (job.status === 'FAILED') {
+            finishAnalysis('Tentar Análise Novamente');
+            displayResults(job.result || { error: true, message: job.error });
+            return true;
+        }
+        return false;
+    }
+
+    function pollJob(statusUrl) {
+        fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Não foi possível consultar o andamento da análise.');
+                }
+                return response.json();
+            })
+            .then(job => {
+                if (!handleJobUpdate(job)) {
+                    setTimeout(() => pollJob(statusUrl), POLL_INTERVAL_MS);
+                }
+            })
+            .catch(error => {
+                console.error('Erro ao consultar a análise:', error);
+                finishAnalysis('Tentar Análise Novamente');
+                displayError(error.message);
+            });
+    }
+
+    function followJob(job) {
+        // Polling curto no endpoint de status: cada consulta ocupa o worker só por alguns milissegundos.
+        if (!handleJobUpdate(job)) {
+            setTimeout(() => pollJob(job.status_url), POLL_INTERVAL_MS);
+        }
+    }
+
+    const QUOTES_REFRESH_MS = 60000;
+    const positionsList = document.getElementById('positions-list');
+    const formatBRL = value => 'R$ ' + value.toLocaleString('pt-BR', { minimumFractionDigits: 2, maximumFractionDigits: 2 });
+
+    function setPnlClass(element, value) {
+        element.classList.remove('text-success', 'text-danger');
+        if (value > 0) element.classList.add('text-success');
+        if (value < 0) element.classList.add('text-danger');
+    }
+
+    function renderValuation(valuation) {
+        valuation.positions.forEach(position => {
+            const row = positionsList.querySelector(`[data-position-id="${position.id}"]`);
+            if (!row || position.price === null) return;
+            row.querySelector('[data-field="price"]').innerText = `Atual: ${formatBRL(position.price)}`;
+            const unrealized = row.querySelector('[data-field="unrealized"]');
+            // Posições com preço de compra zerado vêm sem percentual (null) do servidor.
+            const pct = position.unrealized_pct === null || position.unrealized_pct === undefined
+                ? '—' : `${position.unrealized_pct.toFixed(2)}%`;
+            unrealized.innerText = `${formatBRL(position.unrealized_pnl)} (${pct})`;
+            setPnlClass(unrealized, position.unrealized_pnl);
+        });
+        const totals = valuation.totals;
+        const unrealizedTotal = document.getElementById('unrealized-total');
+        unrealizedTotal.innerText = formatBRL(totals.unrealized_pnl);
+        setPnlClass(unrealizedTotal, totals.unrealized_pnl);
+        document.getElementById('equity-total').innerText = formatBRL(totals.equity);
+        document.getElementById('quotes-as-of').innerText = `${totals.quoted} de ${totals.positions} cotadas`;
+    }
+
+    // Marcação a mercado: as cotações vêm do cache compartilhado do servidor, sem recarregar a página.
+    function refreshQuotes() {
+        fetch(positionsList.dataset.quotesUrl, { headers: { 'Accept': 'application/json' } })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Não foi possível atualizar as cotações.');
+                }
+                return response.json();
+            })
+            .then(renderValuation)
+            .catch(error => console.error('Erro ao atualizar as cotações:', error))
+            .finally(() => setTimeout(refreshQuotes, QUOTES_REFRESH_MS));
+    }
+
+    if (positionsList) {
+        refreshQuotes();
+    }
+
     if (analyzeBtn) {
         analyzeBtn.addEventListener('click', function() {
             loaderContainer.style.display = 'block';
@@ -95,17 +196,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
                 return response.json();
             })
-            .then(data => {
-                loaderContainer.style.display = 'none';
-                analyzeBtn.disabled = false;
-                analyzeBtn.innerText = 'Analisar e Otimizar Novamente';
-                displayResults(data);
-            })
+            .then(job => followJob(job))
             .catch(error => {
                 console.error('Erro ao executar a análise:', error);
-                loaderContainer.style.display = 'none';
-                analyzeBtn.disabled = false;
-                analyzeBtn.innerText = 'Tentar Análise Novamente';
+                finishAnalysis('Tentar Análise Novamente');
                 displayError(error.message);
             });
         });
@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from core_logic.decision_backends import DECISION_BACKEND_CHOICES, GEMINI
 
 class CustomUserCreationForm(UserCreationForm):
     username = forms.CharField(
@@ -10,10 +11,17 @@ class CustomUserCreationForm(UserCreationForm):
     email = forms.EmailField(
         label="Endereço de E-mail"
     )
+    decision_backend = forms.ChoiceField(
+        label="Motor de decisão",
+        choices=DECISION_BACKEND_CHOICES,
+        initial=GEMINI,
+        help_text="As regras técnicas funcionam offline e não usam a API do Gemini."
+    )
     gemini_api_key = forms.CharField(
         label="Chave de API do Google Gemini",
         widget=forms.PasswordInput,
-        help_text="Sua chave é armazenada de forma segura e não será exibida."
+        required=False,
+        help_text="Obrigatória para o motor Gemini. Sua chave é armazenada de forma segura e não será exibida."
     )
     initial_balance = forms.DecimalField(
         label="Saldo Inicial para Simulação (R$)",
@@ -30,6 +38,12 @@ class CustomUserCreationForm(UserCreationForm):
         initial=False
     )
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('decision_backend') == GEMINI and not cleaned_data.get('gemini_api_key'):
+            self.add_error('gemini_api_key', "Informe a chave de API para usar o motor Gemini.")
+        return cleaned_data
+
     class Meta(UserCreationForm.Meta):
         model = User
         fields = UserCreationForm.Meta.fields + ('email',)
\ No newline at end of file
@@ -0,0 +1,73 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from core_logic import config
+from .models import AnalysisJob
+from . import tasks
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    """Pool de threads do processo que executa as análises fora do ciclo da requisição HTTP."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config.ANALYSIS_JOB_WORKERS, thread_name_prefix="analysis-job")
+        return _executor
+
+def _expire_stale_jobs(user_id):
+    cutoff = timezone.now() - timedelta(seconds=config.ANALYSIS_JOB_STALE_SECONDS)
+    AnalysisJob.objects.filter(user_id=user_id, status__in=AnalysisJob.ACTIVE_STATUSES, created_at__lt=cutoff).update(
+        status=AnalysisJob.FAILED, error="Job interrompido antes de terminar.", finished_at=timezone.now()
+    )
+
+def submit_analysis(user_id) -> tuple:
+    """
+    Enfileira uma análise para o usuário e devolve (job, created).
+    Se já houver uma análise ativa, ela é devolvida com created=False em vez de criar outra.
+    """
+    _expire_stale_jobs(user_id)
+    active = AnalysisJob.objects.filter(user_id=user_id, status__in=AnalysisJob.ACTIVE_STATUSES).first()
+    if active:
+        return active, False
+    try:
+        with transaction.atomic():
+            job = AnalysisJob.objects.create(user_id=user_id)
+    except IntegrityError:
+        # Outra requisição criou o job entre a consulta e o INSERT; a constraint única garante que só um vence.
+        return AnalysisJob.objects.get(user_id=user_id, status__in=AnalysisJob.ACTIVE_STATUSES), False
+    transaction.on_commit(lambda: get_executor().submit(run_job, job.id))
+    logging.info(f"[JOBS] Análise #{job.id} enfileirada para o usuário {user_id}.")
+    return job, True
+
+def _set_progress(job_id, message: str):
+    AnalysisJob.objects.filter(id=job_id).update(progress=message)
+
+def run_job(job_id):
+    """Executa o job no worker atual e grava o resultado (ou o erro) no banco."""
+    close_old_connections()
+    try:
+        updated = AnalysisJob.objects.filter(id=job_id, status=AnalysisJob.PENDING).update(
+            status=AnalysisJob.RUNNING, started_at=timezone.now()
+        )
+        if not updated:
+            return
+        job = AnalysisJob.objects.get(id=job_id)
+        logging.info(f"[JOBS] Iniciando análise #{job_id}...")
+        try:
+            result = tasks.perform_full_analysis(job.user_id, on_progress=lambda message: _set_progress(job_id, message))
+        except Exception as e:
+            logging.error(f"[JOBS] Análise #{job_id} falhou: {e}", exc_info=True)
+            result = {"error": True, "message": str(e)}
+        status = AnalysisJob.FAILED if result.get("error") else AnalysisJob.SUCCEEDED
+        AnalysisJob.objects.filter(id=job_id).update(
+            status=status, result=result, error=result.get("message", "") if result.get("error") else "",
+            progress="", finished_at=timezone.now()
+        )
+        logging.info(f"[JOBS] Análise #{job_id} finalizada com status {status}.")
+    finally:
+        close_old_connections()
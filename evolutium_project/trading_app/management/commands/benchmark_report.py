@@ -0,0 +1,90 @@
+import logging
+import time
+from decimal import Decimal
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from trading_app.models import Portfolio, TradeHistory
+from trading_app.reporting import portfolio_report, rebuild_snapshot
+from trading_app.views import report_view
+
+def legacy_pnl(portfolio) -> Decimal:
+    """Cálculo anterior do report_view: uma consulta extra por venda para achar a compra anterior."""
+    pnl = Decimal(0)
+    for trade in portfolio.trade_history.order_by('timestamp').all():
+        if trade.side == 'SELL':
+            buy_trade = portfolio.trade_history.filter(ticker=trade.ticker, side='BUY', timestamp__lt=trade.timestamp).last()
+            if buy_trade:
+                pnl += (trade.price - buy_trade.price) * trade.quantity
+    return pnl
+
+def synthetic_trades(portfolio, count: int, seed: int) -> list:
+    """Compras e vendas parciais alternadas em 50 tickers, sem vender mais do que a posição aberta."""
+    rng = np.random.default_rng(seed)
+    open_quantity = {}
+    trades = []
+    for i in range(count):
+        ticker = f"T{rng.integers(50):02d}"
+        held = open_quantity.get(ticker, 0)
+        price = Decimal(f"{rng.uniform(5, 100):.2f}")
+        if held and rng.random() < 0.5:
+            quantity = int(rng.integers(1, held + 1))
+            side = 'SELL'
+            open_quantity[ticker] = held - quantity
+        else:
+            quantity = int(rng.integers(1, 500))
+            side = 'BUY'
+            open_quantity[ticker] = held + quantity
+        trades.append(TradeHistory(portfolio=portfolio, ticker=ticker, side=side, quantity=quantity, price=price))
+    return trades
+
+class Command(BaseCommand):
+    help = "Mede o tempo do relatório de desempenho (motor FIFO, reconstrução do snapshot e página lida do snapshot) para contas com muitas operações."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="Quantidades de operações da conta.")
+        parser.add_argument('--legacy-max', type=int, default=2000, help="Maior conta em que o cálculo antigo (N+1 consultas) também é medido.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        logging.disable(logging.CRITICAL)
+        for size in options['sizes']:
+            # Tudo é desfeito ao final: o benchmark não deixa usuários nem operações no banco.
+            with transaction.atomic():
+                user = User.objects.create_user(username=f"benchmark_report_{size}", password="benchmark")
+                portfolio = Portfolio.objects.create(user=user, balance=Decimal("1000000"))
+                TradeHistory.objects.bulk_create(synthetic_trades(portfolio, size, options['seed']), batch_size=5000)
+
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    report = portfolio_report(portfolio)
+                    engine_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                rebuild_snapshot(portfolio)
+                rebuild_time = time.perf_counter() - start
+
+                request = RequestFactory().get('/report/')
+                request.user = user
+                with CaptureQueriesContext(connection) as page_queries:
+                    start = time.perf_counter()
+                    response = report_view(request)
+                    page_time = time.perf_counter() - start
+
+                line = (
+                    f"{size:7,d} operações: motor {engine_time * 1000:8.1f}ms em {len(queries)} consulta(s) "
+                    f"({engine_time / size * 1e6:5.2f}µs/operação), snapshot refeito em {rebuild_time * 1000:8.1f}ms, "
+                    f"página (snapshot) {page_time * 1000:6.1f}ms em {len(page_queries)} consultas, {report['total_trades']} vendas casadas"
+                )
+                if size <= options['legacy_max']:
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        legacy_pnl(portfolio)
+                        legacy_time = time.perf_counter() - start
+                    line += f" | antigo {legacy_time * 1000:8.1f}ms em {len(queries)} consultas"
+                self.stdout.write(line)
+                transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Motor linear, sem consultas por venda; a página lida do snapshot não depende do tamanho do histórico."))
@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from trading_app.models import Portfolio
+from trading_app.reporting import rebuild_snapshot
+
+class Command(BaseCommand):
+    help = "Refaz os snapshots de desempenho a partir do histórico de operações (todos os portfólios ou só os usuários informados)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', help="Usuário cujo snapshot será refeito (pode repetir).")
+
+    def handle(self, *args, **options):
+        portfolios = Portfolio.objects.select_related('user').order_by('id')
+        if options['usernames']:
+            portfolios = portfolios.filter(user__username__in=options['usernames'])
+            missing = set(options['usernames']) - set(portfolios.values_list('user__username', flat=True))
+            if missing:
+                raise CommandError(f"Usuário(s) sem portfólio: {', '.join(sorted(missing))}")
+
+        start = time.perf_counter()
+        rebuilt = 0
+        for portfolio in portfolios.iterator():
+            with transaction.atomic():
+                snapshot = rebuild_snapshot(portfolio)
+            rebuilt += 1
+            self.stdout.write(
+                f"{portfolio.user.username}: {snapshot.trade_count} operações, lucro realizado R$ {snapshot.realized_pnl:,.2f} "
+                f"({snapshot.wins} acertos, {snapshot.losses} erros)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{rebuilt} snapshot(s) refeito(s) em {time.perf_counter() - start:.2f}s."))
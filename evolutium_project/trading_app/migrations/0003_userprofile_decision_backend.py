@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_app', '0002_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='decision_backend',
+            field=models.CharField(choices=[('gemini', 'Gemini (IA)'), ('rules', 'Regras técnicas (offline)')], default='gemini', max_length=20, verbose_name='Motor de decisão'),
+        ),
+    ]
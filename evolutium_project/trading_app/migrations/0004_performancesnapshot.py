@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_app', '0003_userprofile_decision_backend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('realized_pnl', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Lucro realizado')),
+                ('wins', models.IntegerField(default=0)),
+                ('losses', models.IntegerField(default=0)),
+                ('trade_count', models.IntegerField(default=0)),
+                ('cash_flow', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('open_lots', models.JSONField(blank=True, default=dict)),
+                ('equity_points', models.JSONField(blank=True, default=list)),
+                ('last_trade_id', models.BigIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('portfolio', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='performance', to='trading_app.portfolio')),
+            ],
+        ),
+    ]
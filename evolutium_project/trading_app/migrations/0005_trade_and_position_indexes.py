@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_app', '0004_performancesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='position',
+            index=models.Index(fields=['portfolio', 'ticker'], name='position_portfolio_ticker_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tradehistory',
+            index=models.Index(fields=['portfolio', 'timestamp', 'id'], name='trade_portfolio_time_idx'),
+        ),
+    ]
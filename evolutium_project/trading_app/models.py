@@ -1,9 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
+from core_logic.decision_backends import DECISION_BACKEND_CHOICES, GEMINI
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     gemini_api_key = models.CharField(max_length=255, blank=True, null=True, verbose_name="Chave de API do Gemini")
+    decision_backend = models.CharField(max_length=20, choices=DECISION_BACKEND_CHOICES, default=GEMINI, verbose_name="Motor de decisão")
 
     def __str__(self):
         return self.user.username
@@ -21,6 +23,12 @@ class Position(models.Model):
     quantity = models.IntegerField()
     buy_price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Venda e análise buscam a posição por (portfólio, ticker).
+            models.Index(fields=['portfolio', 'ticker'], name='position_portfolio_ticker_idx'),
+        ]
+
     def __str__(self):
         return f"{self.quantity}x {self.ticker} @ {self.buy_price}"
 
@@ -32,5 +40,69 @@ class TradeHistory(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Histórico sempre lido por portfólio em ordem de data: as últimas operações (percorrendo o índice de trás
+            # para frente) e a reconstrução completa do snapshot, sem ordenar a tabela a cada página.
+            models.Index(fields=['portfolio', 'timestamp', 'id'], name='trade_portfolio_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"[{self.timestamp.strftime('%Y-%m-%d')}] {self.side} {self.ticker}"
+
+class PerformanceSnapshot(models.Model):
+    """
+    Desempenho acumulado do portfólio, atualizado a cada operação na mesma transação que a grava
+    (trading_app.reporting.record_trade), para que relatório e painel não percorram o histórico inteiro.
+    `open_lots` guarda os lotes de compra ainda abertos por ticker, em ordem FIFO: {ticker: [[quantidade, "preço"], ...]};
+    `equity_points` guarda [rótulo, "fluxo de caixa acumulado"], já amostrados.
+    """
+    portfolio = models.OneToOneField(Portfolio, on_delete=models.CASCADE, related_name='performance')
+    realized_pnl = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Lucro realizado")
+    wins = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    trade_count = models.IntegerField(default=0)
+    cash_flow = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    open_lots = models.JSONField(default=dict, blank=True)
+    equity_points = models.JSONField(default=list, blank=True)
+    last_trade_id = models.BigIntegerField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Desempenho de {self.portfolio.user.username}"
+
+class AnalysisJob(models.Model):
+    PENDING, RUNNING, SUCCEEDED, FAILED = 'PENDING', 'RUNNING', 'SUCCEEDED', 'FAILED'
+    STATUS_CHOICES = [(PENDING, 'Na fila'), (RUNNING, 'Em execução'), (SUCCEEDED, 'Concluída'), (FAILED, 'Falhou')]
+    ACTIVE_STATUSES = (PENDING, RUNNING)
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='analysis_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    progress = models.CharField(max_length=255, blank=True, default='')
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            # Uma única análise ativa por usuário: cliques repetidos reaproveitam o job em andamento.
+            models.UniqueConstraint(fields=['user'], condition=models.Q(status__in=['PENDING', 'RUNNING']), name='unique_active_analysis_job_per_user'),
+        ]
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def as_dict(self) -> dict:
+        return {
+            'job_id': self.id, 'status': self.status, 'progress': self.progress,
+            'result': self.result, 'error': self.error or None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
     def __str__(self):
-        return f"[{self.timestamp.strftime('%Y-%m-%d')}] {self.side} {self.ticker}"
\ No newline at end of file
+        return f"Análise #{self.id} de {self.user.username} ({self.status})"
@@ -0,0 +1,223 @@
+from collections import defaultdict, deque
+from decimal import Decimal
+from django.db import transaction
+
+# O gráfico não precisa de mais pontos do que a largura da tela; contas grandes são amostradas.
+MAX_CHART_POINTS = 500
+RECENT_TRADES_IN_TABLE = 200
+LABEL_FORMAT = '%Y-%m-%d %H:%M'
+# O id identifica cada ponto do gráfico; só as datas dos pontos exibidos são lidas (converter 100k datas custa mais que o FIFO).
+TRADE_FIELDS = ('id', 'ticker', 'side', 'quantity', 'price')
+
+def load_trades(portfolio):
+    """Todas as operações do portfólio em ordem cronológica, numa única consulta e sem instanciar modelos."""
+    return portfolio.trade_history.order_by('timestamp', 'id').values_list(*TRADE_FIELDS).iterator(chunk_size=5000)
+
+def format_labels(portfolio, points: list) -> list:
+    timestamps = dict(portfolio.trade_history.filter(id__in={key for key, _ in points}).values_list('id', 'timestamp'))
+    return [timestamps[key].strftime(LABEL_FORMAT) for key, _ in points]
+
+def _sample(points: list, max_points: int) -> list:
+    if len(points) <= max_points:
+        return points
+    step = (len(points) - 1) / (max_points - 1)
+    return [points[round(i * step)] for i in range(max_points)]
+
+class PerformanceLedger:
+    """
+    Estado acumulado do desempenho: lotes de compra abertos por ticker (FIFO), lucro realizado, acertos e erros
+    e a evolução do fluxo de caixa das operações. `apply` processa uma operação por vez, em ordem cronológica,
+    tanto na passada completa pelo histórico quanto na atualização incremental do snapshot.
+    Os pontos do gráfico guardam (chave, fluxo acumulado) e ficam limitados a 2 x `max_points`: ao passar disso,
+    metade é descartada (sempre mantendo o primeiro e o último).
+    """
+    def __init__(self, realized_pnl: Decimal = Decimal(0), wins: int = 0, losses: int = 0, trade_count: int = 0,
+                 cash_flow: Decimal = Decimal(0), open_lots: dict | None = None, points: list | None = None,
+                 max_points: int = MAX_CHART_POINTS):
+        self.realized_pnl = realized_pnl
+        self.wins = wins
+        self.losses = losses
+        self.trade_count = trade_count
+        self.cash_flow = cash_flow
+        self.open_lots = defaultdict(deque, {ticker: deque(lots) for ticker, lots in (open_lots or {}).items()})
+        self.points = list(points or [])
+        self.max_points = max_points
+
+    @property
+    def total_trades(self) -> int:
+        return self.wins + self.losses
+
+    @property
+    def win_rate(self) -> float:
+        return (self.wins / self.total_trades * 100) if self.total_trades > 0 else 0
+
+    def apply(self, key, ticker: str, side: str, quantity: int, price: Decimal) -> Decimal | None:
+        """Registra a operação e devolve o lucro realizado por ela (None se não fechou nenhum lote)."""
+        if not self.points:
+            self.points.append((key, Decimal(0)))
+        value = price * quantity
+        realized = None
+        if side == 'BUY':
+            self.open_lots[ticker].append([quantity, price])
+            self.cash_flow -= value
+        else:
+            self.cash_flow += value
+            lots, remaining, matched, cost = self.open_lots[ticker], quantity, 0, Decimal(0)
+            while remaining and lots:
+                lot = lots[0]
+                used = min(remaining, lot[0])
+                cost += used * lot[1]
+                matched += used
+                remaining -= used
+                lot[0] -= used
+                if not lot[0]:
+                    lots.popleft()
+            if not lots:
+                del self.open_lots[ticker]
+            if matched:
+                realized = price * matched - cost
+                self.realized_pnl += realized
+                if realized > 0:
+                    self.wins += 1
+                else:
+                    self.losses += 1
+        self.trade_count += 1
+        self.points.append((key, self.cash_flow))
+        if len(self.points) > 2 * self.max_points:
+            self.points = self.points[:-1][::2] + self.points[-1:]
+        return realized
+
+    def balance_points(self, current_balance: Decimal, max_points: int | None = None) -> list:
+        """Saldo após cada ponto, reconstruído a partir do saldo atual (ajustes manuais de saldo deslocam a curva toda)."""
+        initial_balance = current_balance - self.cash_flow
+        points = [(key, initial_balance + flow) for key, flow in self.points]
+        return _sample(points, max_points or self.max_points)
+
+    def report(self, current_balance: Decimal, max_points: int | None = None) -> dict:
+        return {
+            'total_pl': self.realized_pnl,
+            'win_rate': self.win_rate,
+            'total_trades': self.total_trades,
+            'trade_count': self.trade_count,
+            'open_lots': {ticker: sum(q for q, _ in lots) for ticker, lots in self.open_lots.items()},
+            'balance_points': self.balance_points(current_balance, max_points),
+        }
+
+def build_report(trades, current_balance: Decimal, max_points: int = MAX_CHART_POINTS) -> dict:
+    """
+    Lucro realizado, taxa de acerto e evolução do saldo em uma única passada pelas operações
+    (tuplas (chave, ticker, lado, quantidade, preço) em ordem cronológica).
+    Cada venda consome os lotes de compra do ticker em ordem FIFO, inclusive parcialmente; a parte de uma venda
+    sem compra anterior é ignorada, como antes. O saldo é devolvido em `balance_points` como (chave da operação, saldo).
+    """
+    ledger = PerformanceLedger(max_points=max_points)
+    for trade in trades:
+        ledger.apply(*trade)
+    return ledger.report(current_balance, max_points)
+
+def portfolio_report(portfolio, max_points: int = MAX_CHART_POINTS) -> dict:
+    """Relatório recalculado do histórico completo, em duas consultas: as operações e as datas dos pontos do gráfico."""
+    report = build_report(load_trades(portfolio), portfolio.balance, max_points)
+    points = report['balance_points']
+    report['balance_over_time'] = {
+        'labels': format_labels(portfolio, points) if points else [],
+        'data': [float(balance) for _, balance in points],
+    }
+    return report
+
+def ledger_from_snapshot(snapshot) -> PerformanceLedger:
+    return PerformanceLedger(
+        realized_pnl=snapshot.realized_pnl, wins=snapshot.wins, losses=snapshot.losses, trade_count=snapshot.trade_count,
+        cash_flow=snapshot.cash_flow,
+        open_lots={ticker: [[quantity, Decimal(price)] for quantity, price in lots] for ticker, lots in snapshot.open_lots.items()},
+        points=[(label, Decimal(flow)) for label, flow in snapshot.equity_points],
+    )
+
+def store_ledger(snapshot, ledger: PerformanceLedger, last_trade_id: int | None):
+    snapshot.realized_pnl = ledger.realized_pnl
+    snapshot.wins = ledger.wins
+    snapshot.losses = ledger.losses
+    snapshot.trade_count = ledger.trade_count
+    snapshot.cash_flow = ledger.cash_flow
+    snapshot.open_lots = {ticker: [[quantity, str(price)] for quantity, price in lots] for ticker, lots in ledger.open_lots.items()}
+    snapshot.equity_points = [[label, str(flow)] for label, flow in ledger.points]
+    snapshot.last_trade_id = last_trade_id
+    snapshot.save()
+
+def rebuild_snapshot(portfolio):
+    """Refaz o snapshot do portfólio a partir do histórico completo de operações."""
+    from .models import PerformanceSnapshot
+    ledger = PerformanceLedger()
+    last_trade_id = None
+    trades = portfolio.trade_history.order_by('timestamp', 'id').values_list('id', 'timestamp', 'ticker', 'side', 'quantity', 'price')
+    for trade_id, timestamp, ticker, side, quantity, price in trades.iterator(chunk_size=5000):
+        ledger.apply(timestamp.strftime(LABEL_FORMAT), ticker, side, quantity, price)
+        last_trade_id = trade_id
+    snapshot, _ = PerformanceSnapshot.objects.get_or_create(portfolio=portfolio)
+    store_ledger(snapshot, ledger, last_trade_id)
+    return snapshot
+
+def record_trade(trade):
+    """
+    Aplica uma operação recém-criada ao snapshot do portfólio. Deve rodar na mesma transação que grava a operação,
+    para que snapshot e histórico nunca divirjam; a linha do snapshot fica travada até o fim da transação.
+    """
+    from .models import PerformanceSnapshot
+    snapshot = PerformanceSnapshot.objects.select_for_update().filter(portfolio_id=trade.portfolio_id).first()
+    if snapshot is None:
+        # Portfólio com histórico anterior aos snapshots: a operação nova já está no histórico e entra na reconstrução.
+        return rebuild_snapshot(trade.portfolio)
+    ledger = ledger_from_snapshot(snapshot)
+    ledger.apply(trade.timestamp.strftime(LABEL_FORMAT), trade.ticker, trade.side, trade.quantity, Decimal(trade.price))
+    store_ledger(snapshot, ledger, trade.id)
+    return snapshot
+
+def get_snapshot(portfolio):
+    """Snapshot do portfólio, criado a partir do histórico na primeira leitura."""
+    from .models import PerformanceSnapshot
+    try:
+        return portfolio.performance
+    except PerformanceSnapshot.DoesNotExist:
+        with transaction.atomic():
+            return rebuild_snapshot(portfolio)
+
+def snapshot_report(portfolio, max_points: int = MAX_CHART_POINTS) -> dict:
+    """Relatório lido do snapshot: custo constante, qualquer que seja o tamanho do histórico."""
+    report = ledger_from_snapshot(get_snapshot(portfolio)).report(portfolio.balance, max_points)
+    points = report['balance_points']
+    report['balance_over_time'] = {'labels': [label for label, _ in points], 'data': [float(balance) for _, balance in points]}
+    return report
+
+def held_tickers() -> list:
+    """Todos os tickers em carteira, em qualquer portfólio: o lote de cotações que atende todos os usuários."""
+    from .models import Position
+    return list(Position.objects.order_by().values_list('ticker', flat=True).distinct())
+
+def value_positions(positions, quotes: dict, balance: Decimal) -> dict:
+    """
+    Marcação a mercado das posições com as cotações `quotes` ({ticker: {"price", "as_of"}}).
+    Posições sem cotação entram pelo preço de compra e com `price` None; o patrimônio soma o saldo em conta.
+    """
+    rows = []
+    cost = market_value = Decimal(0)
+    for position in positions:
+        quote = quotes.get(position.ticker)
+        position_cost = position.buy_price * position.quantity
+        price = Decimal(str(round(quote["price"], 2))) if quote else None
+        value = price * position.quantity if price is not None else position_cost
+        cost += position_cost
+        market_value += value
+        rows.append({
+            'id': position.id, 'ticker': position.ticker, 'quantity': position.quantity, 'buy_price': float(position.buy_price),
+            'price': float(price) if price is not None else None, 'as_of': quote["as_of"] if quote else None,
+            'market_value': float(value),
+            'unrealized_pnl': float(value - position_cost) if price is not None else None,
+            'unrealized_pct': float((price / position.buy_price - 1) * 100) if price is not None and position.buy_price else None,
+        })
+    return {
+        'positions': rows,
+        'totals': {
+            'cost': float(cost), 'market_value': float(market_value), 'unrealized_pnl': float(market_value - cost),
+            'equity': float(balance + market_value), 'quoted': sum(row['price'] is not None for row in rows), 'positions': len(rows),
+        },
+    }
@@ -1,52 +1,67 @@
 
 import math
 from decimal import Decimal
-from .models import Portfolio, UserProfile
-from core_logic.synthesis_engine import SynthesisEngine
-from core_logic.data_provider import DataProvider
+from .models import Portfolio
+from core_logic.decision_backends import GEMINI, get_decision_backend
+from core_logic.client_pool import get_engine_pool
+from core_logic.data_provider import get_shared_data_provider
+from core_logic.fetch_engine import ConcurrentFetcher
+from core_logic.market_context import get_market_context_service
+from core_logic.prescreen import PreScreener
 from core_logic.config import TICKERS_TO_MONITOR, RISK_PERCENTAGE_PER_TRADE
-import yfinance as yf
 import logging
 
-def perform_full_analysis(user_id):
+def perform_full_analysis(user_id, on_progress=None):
     """
-    Tarefa pesada que roda em segundo plano para analisar o portfólio.
+    Tarefa pesada que roda em segundo plano (ver trading_app/jobs.py) para analisar o portfólio.
+    `on_progress` recebe uma mensagem curta a cada etapa, exibida no dashboard enquanto o job roda.
     """
     logging.info(f"Iniciando análise para o usuário {user_id}...")
+    report = on_progress if on_progress else (lambda message: None)
     try:
-        user_profile = UserProfile.objects.get(user_id=user_id)
-        portfolio = Portfolio.objects.get(user_id=user_id)
+        portfolio = Portfolio.objects.select_related('user__userprofile').prefetch_related('positions').get(user_id=user_id)
+        user_profile = portfolio.user.userprofile
         api_key = user_profile.gemini_api_key
 
-        if not api_key:
+        if user_profile.decision_backend == GEMINI and not api_key:
             raise ValueError("A chave de API do Gemini não foi encontrada para este usuário.")
 
-        synthesis_engine = SynthesisEngine(api_key=api_key)
-        data_provider = DataProvider()
-        ibov_hist = yf.Ticker("^BVSP").history(period="7d")
-        if ibov_hist.empty:
-            market_context = {"ibov_change": "N/A"}
-        else:
-            change = (ibov_hist['Close'].iloc[-1] / ibov_hist['Close'].iloc[0]) - 1
-            market_context = {"ibov_change": f"{change:.2%}"}
+        decider = get_decision_backend(user_profile.decision_backend, api_key=api_key)
+        data_provider = get_shared_data_provider()
+        # Calculado uma vez por sessão a partir do HistoryStore e compartilhado por todas as análises.
+        market_context = get_market_context_service().current()
         trade_history_qs = portfolio.trade_history.order_by('-timestamp')[:5]
         trade_history = list(trade_history_qs.values('timestamp', 'ticker', 'side', 'quantity', 'price'))
-        for pos in portfolio.positions.all():
-            market_data = data_provider.get_market_data(pos.ticker)
-            if market_data:
-                current_pos_dict = {'ticker': pos.ticker, 'quantity': pos.quantity, 'buy_price': float(pos.buy_price)}
-                sell_decision = synthesis_engine.should_sell_position(market_data, current_pos_dict, trade_history, market_context)
-                if sell_decision.get("decision") == "SELL":
-                    logging.info(f"Recomendação de VENDA para {pos.ticker} para o usuário {user_id}.")
-                    return {
-                        'action': 'SELL', 'ticker': pos.ticker, 'rationale': sell_decision.get('rationale'),
-                        'quantity': pos.quantity, 'current_price': market_data['fundamental_data'].get('Preço Atual', 0)
-                    }
-        tickers_in_portfolio = {p.ticker for p in portfolio.positions.all()}
+        report("Avaliando as posições em carteira...")
+        positions = list(portfolio.positions.all())
+        fetcher = ConcurrentFetcher(data_provider)
+        # Todas as posições são buscadas em paralelo e reavaliadas em uma única chamada ao LLM.
+        position_data = {data['ticker']: data for data in fetcher.fetch_all(pos.ticker for pos in positions)}
+        reviews = [
+            (position_data[pos.ticker], {'ticker': pos.ticker, 'quantity': pos.quantity, 'buy_price': float(pos.buy_price)})
+            for pos in positions if pos.ticker in position_data
+        ]
+        sell_decisions = decider.should_sell_positions(reviews, trade_history, market_context)
+        for market_data, current_pos_dict in reviews:
+            sell_decision = sell_decisions.get(current_pos_dict['ticker'], {})
+            if sell_decision.get("decision") == "SELL":
+                logging.info(f"Recomendação de VENDA para {current_pos_dict['ticker']} para o usuário {user_id}.")
+                return {
+                    'action': 'SELL', 'ticker': current_pos_dict['ticker'], 'rationale': sell_decision.get('rationale'),
+                    'quantity': current_pos_dict['quantity'], 'current_price': market_data['fundamental_data'].get('Preço Atual', 0)
+                }
+        tickers_in_portfolio = {pos.ticker for pos in positions}
         print("--- INICIANDO A BUSCA POR CANDIDATOS DE COMPRA ---")
-        candidates = [data for ticker in TICKERS_TO_MONITOR if ticker not in tickers_in_portfolio and (data := data_provider.get_market_data(ticker))]
+        report("Buscando dados dos candidatos de compra...")
+        candidate_tickers = [ticker for ticker in TICKERS_TO_MONITOR if ticker not in tickers_in_portfolio]
+        data_provider.prefetch_history(candidate_tickers)
+        candidates = fetcher.fetch_all(candidate_tickers)
+        logging.info(f"[CACHE] Estatísticas do cache de mercado: {data_provider.cache.stats()}")
+        logging.info(f"[POOL] Motores do Gemini: {get_engine_pool().stats()}")
+        candidates = PreScreener().select(candidates)
         if candidates:
-            buy_decision = synthesis_engine.decide_best_investment(candidates, trade_history, market_context)
+            report("Consultando a IA sobre os candidatos...")
+            buy_decision = decider.decide_best_investment(candidates, trade_history, market_context)
             if buy_decision.get("decision") == "BUY":
                 ticker = buy_decision.get('ticker')
                 asset_data = next((c for c in candidates if c['ticker'] == ticker), None)
@@ -1 +1,1372 @@
-from django.test import TestCase
+import json
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from google.ai import generativelanguage as glm
+
+from core_logic.backtester import Backtester, compute_summary_stats
+from core_logic.bulk_download import BulkDownloader, per_ticker, split_multi_ticker_frame
+from core_logic.client_pool import KeyedClientPool
+from core_logic.data_provider import BacktestDataProvider, DataProvider
+from core_logic.decision_backends import RuleBasedDecider, get_decision_backend
+from core_logic.fetch_engine import ConcurrentFetcher
+from core_logic.history_store import HistoryStore
+from core_logic.indicators import apply_indicators, compute_indicators
+from core_logic.llm_cache import LLMResponseCache
+from core_logic.market_cache import MarketDataCache, SQLiteCacheBackend
+from core_logic.market_context import IBOV, MarketContextService, compute_context_table
+from core_logic.market_panel import MarketPanel
+from core_logic import llm_client
+from core_logic.llm_client import LLMClient, LLMError, LLMTimeoutError, TokenBucket
+from core_logic.prescreen import PreScreener
+from core_logic.prompt_builder import PromptBuilder, estimate_tokens
+from core_logic.risk_manager import is_trade_allowed
+from core_logic.quote_service import QuoteService
+from core_logic.response_decoder import extract_json
+from core_logic.streaming_indicators import StreamingIndicatorBook, StreamingIndicators
+from core_logic.synthesis_engine import GeminiModel, SynthesisEngine
+from core_logic.sweep import PanelDataProvider, SweepRunner, parameter_grid, walk_forward_windows
+from core_logic.trading_calendar import TradingCalendar
+from trading_app import jobs
+from trading_app import tasks
+from trading_app.models import AnalysisJob, PerformanceSnapshot, Portfolio, Position, TradeHistory, UserProfile
+from trading_app.reporting import build_report, get_snapshot, held_tickers, portfolio_report, rebuild_snapshot, snapshot_report
+
+try:
+    import pandas_ta  # noqa: F401 (registra o accessor df.ta)
+except ImportError:
+    pandas_ta = None
+
+INDICATOR_COLUMNS = [
+    'SMA_21', 'SMA_50', 'RSI_14', 'BBL_20_2.0', 'BBM_20_2.0', 'BBU_20_2.0', 'BBB_20_2.0', 'BBP_20_2.0',
+    'MACD_12_26_9', 'MACDh_12_26_9', 'MACDs_12_26_9',
+]
+
+def reference_indicators(close: pd.Series) -> pd.DataFrame:
+    """Definições do pandas_ta escritas direto em pandas (rolling/ewm), para conferir o motor vetorizado sem o pacote."""
+    def rma(series, length):
+        return series.ewm(alpha=1 / length, min_periods=length).mean()
+
+    def ema(series, length):
+        # O pandas_ta semeia a EMA com a média simples das `length` primeiras barras.
+        seeded = series.copy()
+        seeded.iloc[:length - 1] = np.nan
+        seeded.iloc[length - 1] = series.iloc[:length].mean()
+        return seeded.ewm(span=length, adjust=False).mean()
+
+    diff = close.diff()
+    positive, negative = rma(diff.clip(lower=0), 14), rma(diff.clip(upper=0), 14)
+    mid, deviation = close.rolling(20).mean(), 2 * close.rolling(20).std(ddof=0)
+    lower, upper = mid - deviation, mid + deviation
+    macd = ema(close, 12) - ema(close, 26)
+    signal = ema(macd.loc[macd.first_valid_index():], 9).reindex(close.index)
+    return pd.DataFrame({
+        'SMA_21': close.rolling(21).mean(), 'SMA_50': close.rolling(50).mean(),
+        'RSI_14': 100 * positive / (positive + negative.abs()),
+        'BBL_20_2.0': lower, 'BBM_20_2.0': mid, 'BBU_20_2.0': upper,
+        'BBB_20_2.0': 100 * (upper - lower) / mid, 'BBP_20_2.0': (close - lower) / (upper - lower),
+        'MACD_12_26_9': macd, 'MACDh_12_26_9': macd - signal, 'MACDs_12_26_9': signal,
+    })
+
+def make_ohlc_frames(n_tickers=12, min_bars=60, max_bars=400, seed=7):
+    rng = np.random.default_rng(seed)
+    frames = {}
+    for i in range(n_tickers):
+        n_bars = int(rng.integers(min_bars, max_bars))
+        close = 30 * np.exp(np.cumsum(rng.normal(0, 0.02, n_bars)))
+        index = pd.bdate_range("2022-01-03", periods=n_bars, name="Date")
+        frames[f"T{i:02d}"] = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1e5}, index=index)
+    return frames
+
+def make_history_store(frames):
+    """HistoryStore em diretório temporário cujo 'download' devolve os DataFrames sintéticos."""
+    def download(ticker, start, end):
+        df = frames.get(ticker)
+        if df is None:
+            return pd.DataFrame()
+        return df.loc[(df.index >= start) & (df.index < end)]
+    return HistoryStore(tempfile.mkdtemp(), download)
+
+
+class IndicatorEngineTests(SimpleTestCase):
+    def test_appends_pandas_ta_column_names(self):
+        result = apply_indicators(make_ohlc_frames(n_tickers=2))
+        for df in result.values():
+            self.assertEqual(list(df.columns), ["Open", "High", "Low", "Close", "Volume"] + INDICATOR_COLUMNS)
+
+    def test_short_series_omit_indicators_that_need_more_bars(self):
+        frames = make_ohlc_frames(n_tickers=1, min_bars=24, max_bars=25)
+        df = apply_indicators(frames)["T00"]
+        self.assertIn('SMA_21', df.columns)
+        self.assertNotIn('SMA_50', df.columns)
+        self.assertNotIn('MACD_12_26_9', df.columns)
+
+    def test_each_ticker_matches_its_standalone_result(self):
+        frames = make_ohlc_frames()
+        together = apply_indicators(frames)
+        for ticker, df in frames.items():
+            alone = apply_indicators({ticker: df})[ticker]
+            pd.testing.assert_frame_equal(together[ticker], alone)
+
+    def test_leading_nan_columns_start_at_first_valid_bar(self):
+        close = make_ohlc_frames(n_tickers=1, min_bars=200, max_bars=201)["T00"]["Close"].to_numpy()
+        panel = np.full((250, 2), np.nan)
+        panel[:200, 0] = close
+        panel[50:, 1] = close
+        indicators = compute_indicators(panel)
+        for column, values in indicators.items():
+            np.testing.assert_allclose(values[50:, 1], values[:200, 0], rtol=1e-12, equal_nan=True, err_msg=column)
+
+    def test_matches_pure_pandas_reference(self):
+        frames = make_ohlc_frames()
+        result = apply_indicators(frames)
+        for ticker, df in frames.items():
+            expected = reference_indicators(df["Close"])
+            for column in INDICATOR_COLUMNS:
+                np.testing.assert_allclose(
+                    result[ticker][column].to_numpy(), expected[column].to_numpy(),
+                    rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=f"{ticker} {column}"
+                )
+
+    def test_pinned_values_on_a_short_series(self):
+        close = pd.Series([10.0, 11.0, 10.5, 11.5, 12.0, 11.0, 12.5, 13.0])
+        indicators = compute_indicators(close.to_numpy(), sma_lengths=(3,), rsi_length=3, bb_length=4, macd_fast=2, macd_slow=3, macd_signal=2)
+        np.testing.assert_allclose(indicators["SMA_3"][2:, 0], [31.5 / 3, 11.0, 34.0 / 3, 34.5 / 3, 35.5 / 3, 36.5 / 3])
+        # Bandas de 4 barras sobre 10, 11, 10.5, 11.5: média 10.75, desvio populacional sqrt(0.3125).
+        self.assertAlmostEqual(indicators["BBL_4_2.0"][3, 0], 10.75 - 2 * 0.3125 ** 0.5)
+        self.assertAlmostEqual(indicators["BBU_4_2.0"][3, 0], 10.75 + 2 * 0.3125 ** 0.5)
+        # RSI de Wilder (RMA com adjust=True) após as variações +1, -0.5, +1: ganhos 1, 0, 1 e perdas 0, 0.5, 0.
+        weights = np.array([(2 / 3) ** 2, 2 / 3, 1.0])
+        gain, loss = weights @ [1.0, 0.0, 1.0] / weights.sum(), weights @ [0.0, 0.5, 0.0] / weights.sum()
+        self.assertAlmostEqual(indicators["RSI_3"][3, 0], 100 * gain / (gain + loss))
+        # EMAs semeadas com a média simples (rápida: 10.5 na barra 1; lenta: 10.5 na barra 2), depois alpha = 2/3 e 1/2.
+        fast = 10.5 + 2 / 3 * (10.5 - 10.5)
+        fast += 2 / 3 * (11.5 - fast)
+        slow = 10.5 + 1 / 2 * (11.5 - 10.5)
+        self.assertTrue(np.isnan(indicators["MACD_2_3_2"][1, 0]))
+        self.assertAlmostEqual(indicators["MACD_2_3_2"][3, 0], fast - slow)
+
+    @unittest.skipUnless(pandas_ta, "pandas_ta não está instalado")
+    def test_parity_with_pandas_ta(self):
+        frames = make_ohlc_frames()
+        result = apply_indicators(frames)
+        for ticker, df in frames.items():
+            expected = df.copy()
+            expected.ta.sma(length=21, append=True)
+            expected.ta.sma(length=50, append=True)
+            expected.ta.rsi(length=14, append=True)
+            expected.ta.bbands(length=20, append=True)
+            expected.ta.macd(fast=12, slow=26, signal=9, append=True)
+            for column in INDICATOR_COLUMNS:
+                np.testing.assert_allclose(
+                    result[ticker][column].to_numpy(), expected[column].to_numpy(),
+                    rtol=1e-7, atol=1e-9, equal_nan=True, err_msg=f"{ticker} {column}"
+                )
+
+
+class StreamingIndicatorTests(SimpleTestCase):
+    def test_incremental_updates_match_full_recompute(self):
+        df = make_ohlc_frames(n_tickers=1, min_bars=300, max_bars=301)["T00"]
+        book = StreamingIndicatorBook.from_historical_data({"T00": df.iloc[:150]})
+        for close in df["Close"].iloc[150:]:
+            book.update("T00", close)
+        expected = compute_indicators(df["Close"].to_numpy())
+        for column, value in book.technical_indicators("T00").items():
+            self.assertAlmostEqual(value, expected[column][-1, 0], places=9, msg=column)
+
+    def test_values_are_none_until_enough_bars(self):
+        df = make_ohlc_frames(n_tickers=1, min_bars=30, max_bars=31)["T00"]
+        indicators = StreamingIndicatorBook.from_historical_data({"T00": df}).technical_indicators("T00")
+        self.assertIsNotNone(indicators["SMA_21"])
+        self.assertIsNone(indicators["SMA_50"])
+        self.assertIsNone(indicators["MACDs_12_26_9"])
+
+    def test_revising_the_open_bar_matches_full_recompute(self):
+        df = make_ohlc_frames(n_tickers=1, min_bars=120, max_bars=121)["T00"]
+        book = StreamingIndicatorBook.from_historical_data({"T00": df.iloc[:100]})
+        for date, close in df["Close"].iloc[100:].items():
+            # O candle do dia é atualizado várias vezes antes de fechar.
+            for intraday in (close * 1.05, close * 0.9, close):
+                book.update("T00", intraday, date)
+        expected = compute_indicators(df["Close"].to_numpy())
+        for column, value in book.technical_indicators("T00").items():
+            self.assertAlmostEqual(value, expected[column][-1, 0], places=9, msg=column)
+
+    def test_live_provider_applies_only_new_bars_and_revises_today(self):
+        df = make_ohlc_frames(n_tickers=1, min_bars=140, max_bars=141)["T00"]
+        calendar = TradingCalendar.b3("2022-01-01", "2023-01-01")
+        df = calendar.align(df)
+        cache = MarketDataCache()
+        provider = DataProvider(cache=cache, history_store=mock.Mock(spec=HistoryStore), calendar=calendar)
+        cache.set("info", "T00", {"currentPrice": 30.0})
+        cache.set("news", "T00", [])
+        opening = df.iloc[:120].copy()
+        opening.iloc[-1, opening.columns.get_loc("Close")] *= 1.1
+        cache.set("history", "T00", opening)
+        provider.get_market_data("T00")
+        state = provider.indicators.states["T00"]
+
+        # Nova leitura do histórico: o candle em formação fechou com outro preço e dois pregões foram acrescentados.
+        cache.set("history", "T00", df.iloc[:122])
+        with mock.patch.object(StreamingIndicators, "from_history", side_effect=AssertionError):
+            data = provider.get_market_data("T00")
+        self.assertIs(provider.indicators.states["T00"], state)
+        expected = compute_indicators(df["Close"].iloc[:122].to_numpy())
+        for column, value in data["technical_indicators"].items():
+            self.assertAlmostEqual(value, expected[column][-1, 0], places=9, msg=column)
+        provider.history_store.get_recent.assert_not_called()
+
+
+class RecordingDownload:
+    """'download' do HistoryStore que serve os DataFrames sintéticos, registra cada trecho pedido e pode falhar nas primeiras chamadas."""
+    def __init__(self, frames, failures=0):
+        self.frames = frames
+        self.failures = failures
+        self.requests = []
+
+    def __call__(self, ticker, start, end):
+        self.requests.append((ticker, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
+        if self.failures:
+            self.failures -= 1
+            return pd.DataFrame()
+        df = self.frames.get(ticker)
+        if df is None:
+            return pd.DataFrame()
+        return df.loc[(df.index >= start) & (df.index < end)]
+
+
+class HistoryStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.frames = make_ohlc_frames(n_tickers=1, min_bars=300, max_bars=301)
+        self.calendar = TradingCalendar.b3("2021-01-01", "2024-01-01")
+
+    def make_store(self, download):
+        return HistoryStore(tempfile.mkdtemp(), download, calendar=self.calendar, bulk_download=BulkDownloader(per_ticker(download), max_attempts=1))
+
+    def test_downloads_only_the_missing_ranges(self):
+        download = RecordingDownload(self.frames)
+        store = self.make_store(download)
+        self.assertEqual(len(store.get_range("T00", "2022-02-01", "2022-06-01")), len(self.frames["T00"].loc["2022-02-01":"2022-05-31"]))
+        store.get_range("T00", "2022-03-01", "2022-05-01")
+        store.get_range("T00", "2022-01-03", "2022-08-01")
+        self.assertEqual(download.requests, [
+            ("T00", "2022-02-01", "2022-06-01"), ("T00", "2022-01-03", "2022-02-01"), ("T00", "2022-06-01", "2022-08-01"),
+        ])
+        pd.testing.assert_series_equal(
+            store.load("T00")["Close"], self.frames["T00"]["Close"].loc[:"2022-07-31"], check_freq=False, check_names=False,
+        )
+
+    def test_ranges_without_sessions_are_not_downloaded(self):
+        download = RecordingDownload(self.frames)
+        store = self.make_store(download)
+        store.get_range("T00", "2022-01-03", "2022-06-04")
+        # 04 e 05/06/2022 são sábado e domingo; 15/11/2022 é feriado na B3.
+        store.get_range("T00", "2022-01-03", "2022-06-06")
+        store.get_range("T00", "2022-01-03", "2022-11-15")
+        store.get_range("T00", "2022-01-03", "2022-11-16")
+        self.assertEqual(download.requests, [("T00", "2022-01-03", "2022-06-04"), ("T00", "2022-06-04", "2022-11-15")])
+
+    def test_failed_download_does_not_advance_coverage(self):
+        download = RecordingDownload(self.frames, failures=1)
+        store = self.make_store(download)
+        self.assertTrue(store.get_range("T00", "2022-01-03", "2022-06-01").empty)
+        self.assertNotIn("T00", store._manifest)
+        self.assertEqual(len(store.get_range("T00", "2022-01-03", "2022-06-01")), len(self.frames["T00"].loc[:"2022-05-31"]))
+        self.assertEqual(download.requests, [("T00", "2022-01-03", "2022-06-01")] * 2)
+
+    def test_recent_range_is_covered_only_up_to_the_last_bar(self):
+        today = pd.Timestamp.today().normalize()
+        calendar = TradingCalendar.b3(today - pd.Timedelta(days=90), today + pd.Timedelta(days=30))
+        sessions = calendar.between(today - pd.Timedelta(days=90), today)
+        close = np.linspace(10, 20, len(sessions))
+        full = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1e5}, index=sessions.rename("Date"))
+        # O Yahoo ainda não publicou os dois últimos pregões.
+        frames = {"T00": full.iloc[:-2]}
+        download = RecordingDownload(frames)
+        store = HistoryStore(tempfile.mkdtemp(), download, calendar=calendar)
+        start, end = today - pd.Timedelta(days=60), today + pd.Timedelta(days=1)
+        store.get_range("T00", start, end)
+        self.assertEqual(store._manifest["T00"]["end"], (sessions[-3] + pd.Timedelta(days=1)).strftime('%Y-%m-%d'))
+        frames["T00"] = full
+        self.assertEqual(store.get_range("T00", start, end).index[-1], sessions[-1])
+        self.assertEqual(download.requests[-1][1], (sessions[-3] + pd.Timedelta(days=1)).strftime('%Y-%m-%d'))
+
+    def test_prefetch_failures_keep_coverage_of_the_rest(self):
+        frames = make_ohlc_frames(n_tickers=3, min_bars=150, max_bars=151)
+        download = RecordingDownload({t: df for t, df in frames.items() if t != "T02"})
+        store = self.make_store(download)
+        loaded = store.prefetch(sorted(frames), "2022-01-03", "2022-06-01")
+        self.assertTrue(loaded["T02"].empty)
+        self.assertEqual(set(store._manifest), {"T00", "T01"})
+        store.prefetch(sorted(frames), "2022-01-03", "2022-06-01")
+        self.assertEqual([r for r in download.requests if r[0] != "T02"], [("T00", "2022-01-03", "2022-06-01"), ("T01", "2022-01-03", "2022-06-01")])
+        self.assertEqual(len([r for r in download.requests if r[0] == "T02"]), 4)
+
+
+class BacktestDataProviderTests(SimpleTestCase):
+    def setUp(self):
+        self.frames = make_ohlc_frames(n_tickers=5, min_bars=120, max_bars=200)
+        self.provider = BacktestDataProvider(list(self.frames), "2022-01-01", "2023-12-31", history_store=make_history_store(self.frames))
+
+    def test_dict_view_matches_preloaded_frames(self):
+        day = self.provider.get_trading_days()[100]
+        self.provider.set_current_date(day)
+        for ticker, df in self.provider.historical_data.items():
+            data = self.provider.get_market_data(ticker)
+            if day not in df.index:
+                self.assertIsNone(data)
+                continue
+            row = df.loc[day]
+            self.assertEqual(data["fundamental_data"]["Preço Atual"], row["Close"])
+            for name, value in data["technical_indicators"].items():
+                np.testing.assert_equal(value, row[name])
+
+    def test_snapshot_returns_every_ticker_for_the_day(self):
+        index = len(self.provider.get_trading_days()) - 1
+        snapshot = self.provider.get_snapshot(index)
+        self.assertEqual(snapshot.tickers, list(self.provider.historical_data))
+        for ticker, close in zip(snapshot.tickers, snapshot.close):
+            df = self.provider.historical_data[ticker]
+            expected = df["Close"].get(snapshot.date, np.nan)
+            np.testing.assert_equal(close, expected)
+
+
+class ScheduledDecider:
+    """Decisor de backtest com compras e vendas fixadas por data ({data: ticker} e {data: {tickers}})."""
+    def __init__(self, provider, buys, sells=None):
+        self.provider = provider
+        self.buys = {pd.Timestamp(day): ticker for day, ticker in buys.items()}
+        self.sells = {pd.Timestamp(day): set(tickers) for day, tickers in (sells or {}).items()}
+
+    def should_sell_position(self, data, current_pos, trade_history, market_context):
+        sell = current_pos['ticker'] in self.sells.get(self.provider.current_date, ())
+        return {"decision": "SELL" if sell else "HOLD"}
+
+    def decide_best_investment_backtest(self, candidates, market_context):
+        ticker = self.buys.get(self.provider.current_date)
+        return {"decision": "BUY", "ticker": ticker} if ticker else {"decision": "HOLD", "ticker": None}
+
+
+class BacktesterTests(SimpleTestCase):
+    DAYS = pd.DatetimeIndex(["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05", "2024-01-08"], name="Date")
+
+    def setUp(self):
+        frames = {
+            "AAA": pd.DataFrame({"Close": [10.0, 11.0, 12.0, 9.0, 9.0], "Volume": 1e5}, index=self.DAYS),
+            "BBB": pd.DataFrame({"Close": [20.0, 20.0, 25.0, 25.0, 30.0], "Volume": 1e5}, index=self.DAYS),
+        }
+        self.provider = PanelDataProvider(MarketPanel.from_frames(frames, fields=("Close", "Volume")))
+
+    def run_backtest(self, buys, sells=None, risk_percentage=0.5, slippage=0.0):
+        decider = ScheduledDecider(self.provider, buys, sells)
+        return Backtester(self.provider, decider, 1000.0, risk_percentage, slippage).run()
+
+    def test_fills_ledger_and_equity_curve(self):
+        result = self.run_backtest(
+            buys={"2024-01-02": "AAA", "2024-01-03": "BBB", "2024-01-08": "AAA"},
+            sells={"2024-01-05": {"AAA"}, "2024-01-08": {"BBB"}},
+        )
+        # 02/01: 50 AAA a 10 (metade do caixa). 03/01: 12 BBB a 20 (R$ 250 de limite). 05/01: vende AAA a 9 (-50).
+        # 08/01: vende BBB a 30 (+120) antes da compra do dia, que usa o caixa de R$ 1070: 59 AAA a 9.
+        trades = result.trades[["ticker", "side", "quantity", "price", "value"]]
+        self.assertEqual(trades.to_dict("records"), [
+            {"ticker": "AAA", "side": "BUY", "quantity": 50, "price": 10.0, "value": 500.0},
+            {"ticker": "BBB", "side": "BUY", "quantity": 12, "price": 20.0, "value": 240.0},
+            {"ticker": "AAA", "side": "SELL", "quantity": 50, "price": 9.0, "value": 450.0},
+            {"ticker": "BBB", "side": "SELL", "quantity": 12, "price": 30.0, "value": 360.0},
+            {"ticker": "AAA", "side": "BUY", "quantity": 59, "price": 9.0, "value": 531.0},
+        ])
+        self.assertEqual(result.trades["pnl"].tolist()[2:4], [-50.0, 120.0])
+        self.assertTrue(result.trades.loc[result.trades["side"] == "BUY", "pnl"].isna().all())
+        self.assertEqual(list(result.equity_curve), [1000.0, 1050.0, 1160.0, 1010.0, 1070.0])
+        self.assertEqual(list(result.equity_curve.index), list(self.DAYS))
+
+    def test_summary_stats(self):
+        result = self.run_backtest(
+            buys={"2024-01-02": "AAA", "2024-01-03": "BBB", "2024-01-08": "AAA"},
+            sells={"2024-01-05": {"AAA"}, "2024-01-08": {"BBB"}},
+        )
+        returns = np.array([1050 / 1000, 1160 / 1050, 1010 / 1160, 1070 / 1010]) - 1
+        stats = result.stats
+        self.assertAlmostEqual(stats["final_equity"], 1070.0)
+        self.assertAlmostEqual(stats["total_return"], 0.07)
+        self.assertAlmostEqual(stats["cagr"], 1.07 ** (252 / 5) - 1)
+        self.assertAlmostEqual(stats["sharpe"], returns.mean() / returns.std(ddof=1) * np.sqrt(252))
+        self.assertAlmostEqual(stats["max_drawdown"], 1010 / 1160 - 1)
+        self.assertEqual(stats["trades"], 5)
+        self.assertEqual(stats["win_rate"], 0.5)
+
+    def test_empty_curve_keeps_the_initial_balance(self):
+        stats = compute_summary_stats(pd.Series(dtype="f8"), pd.DataFrame(columns=["side", "pnl"]), 1000.0)
+        self.assertEqual((stats["final_equity"], stats["total_return"], stats["sharpe"], stats["max_drawdown"]), (1000.0, 0.0, 0.0, 0.0))
+
+    def test_slippage_and_risk_limit_size_the_fill(self):
+        result = self.run_backtest(buys={"2024-01-02": "AAA"}, sells={"2024-01-04": {"AAA"}}, risk_percentage=0.3, slippage=0.01)
+        buy, sell = result.trades.to_dict("records")
+        # Limite de R$ 300 a 10,10 por ação: 29 ações; uma a mais passaria do limite e o risk_manager recusaria.
+        self.assertEqual((buy["quantity"], buy["price"]), (29, 10.1))
+        self.assertTrue(is_trade_allowed(1000.0, [], "AAA", buy["value"], 'BUY', 0.3))
+        self.assertFalse(is_trade_allowed(1000.0, [], "AAA", buy["price"] * 30, 'BUY', 0.3))
+        self.assertAlmostEqual(sell["price"], 12 * 0.99)
+        self.assertAlmostEqual(sell["pnl"], (12 * 0.99 - 10.1) * 29)
+        self.assertAlmostEqual(result.equity_curve.iloc[-1], 1000 + sell["pnl"])
+
+    def test_rejected_trades_leave_cash_untouched(self):
+        # Com 0,5% de risco o limite é R$ 5: nem uma ação de AAA (R$ 10) cabe, então nada é executado.
+        result = self.run_backtest(buys={"2024-01-02": "AAA"}, risk_percentage=0.005)
+        self.assertTrue(result.trades.empty)
+        self.assertEqual(list(result.equity_curve), [1000.0] * 5)
+
+    def test_risk_gate_blocks_the_buy(self):
+        # O limite do risk_manager (10%) é mais apertado que o dimensionamento do Backtester (50%).
+        strict = lambda balance, positions, ticker, value, side, risk=None: is_trade_allowed(balance, positions, ticker, value, side, 0.1)
+        with mock.patch("core_logic.backtester.is_trade_allowed", side_effect=strict) as gate:
+            result = self.run_backtest(buys={"2024-01-02": "AAA", "2024-01-03": "BBB"})
+        self.assertTrue(result.trades.empty)
+        self.assertEqual(gate.call_count, 2)
+        self.assertEqual(list(result.equity_curve), [1000.0] * 5)
+
+
+class TradingCalendarTests(SimpleTestCase):
+    def setUp(self):
+        self.calendar = TradingCalendar.b3("2024-01-01", "2025-01-01")
+
+    def test_b3_holidays_are_not_sessions(self):
+        for holiday in ["2024-02-12", "2024-02-13", "2024-03-29", "2024-05-30", "2024-11-20", "2024-12-24", "2024-12-31"]:
+            self.assertFalse(self.calendar.is_session(holiday), holiday)
+        self.assertTrue(self.calendar.is_session("2024-02-14"))
+        self.assertEqual(self.calendar.locate("2024-02-13"), self.calendar.index_of("2024-02-09"))
+
+    def test_align_forward_fills_missing_sessions(self):
+        index = pd.DatetimeIndex(["2024-03-04", "2024-03-05", "2024-03-07"], name="Date")
+        df = pd.DataFrame({"Close": [10.0, 11.0, 12.0], "Volume": [100.0, 200.0, 300.0]}, index=index)
+        aligned = self.calendar.align(df)
+        self.assertEqual(list(aligned.index), list(pd.DatetimeIndex(["2024-03-04", "2024-03-05", "2024-03-06", "2024-03-07"])))
+        self.assertEqual(aligned.loc["2024-03-06", "Close"], 11.0)
+        self.assertEqual(aligned.loc["2024-03-06", "Volume"], 0.0)
+
+    def test_backtest_skips_sessions_a_ticker_did_not_trade(self):
+        frames = make_ohlc_frames(n_tickers=2, min_bars=120, max_bars=121)
+        gap = frames["T01"].index[60]
+        frames["T01"] = frames["T01"].drop(gap)
+        provider = BacktestDataProvider(list(frames), "2022-01-01", "2023-01-01", history_store=make_history_store(frames))
+        self.assertTrue(provider.calendar.is_session(gap))
+        self.assertFalse(provider.get_trading_days().isin(pd.DatetimeIndex(["2022-02-28", "2022-03-01", "2022-04-15"])).any())
+        provider.set_current_date(gap)
+        self.assertIsNone(provider.get_market_data("T01"))
+        self.assertIsNotNone(provider.get_market_data("T00"))
+        self.assertIn(gap, provider.historical_data["T01"].index)
+
+
+class SweepTests(SimpleTestCase):
+    def setUp(self):
+        frames = make_ohlc_frames(n_tickers=6, min_bars=250, max_bars=400)
+        self.provider = BacktestDataProvider(list(frames), "2022-01-01", "2024-01-01", history_store=make_history_store(frames))
+
+    def test_recomputed_indicators_match_preloaded_panel(self):
+        panel = self.provider.panel
+        recomputed = panel.with_indicators()
+        for name in ("SMA_21", "SMA_50", "RSI_14", "MACDh_12_26_9"):
+            np.testing.assert_allclose(recomputed.field(name)[panel.observed], panel.field(name)[panel.observed], rtol=1e-12, equal_nan=True, err_msg=name)
+
+    def test_process_pool_matches_serial_run(self):
+        windows = walk_forward_windows(self.provider.get_trading_days(), 120)
+        scenarios = parameter_grid(windows, risk_percentage=[0.1, 0.25], sma_fast=[10, 21])
+        serial = SweepRunner(self.provider.panel, max_workers=1).run(scenarios)
+        parallel = SweepRunner(self.provider.panel, max_workers=2).run(scenarios)
+        self.assertEqual(len(serial), len(scenarios))
+        pd.testing.assert_frame_equal(serial.drop(columns="seconds"), parallel.drop(columns="seconds"))
+
+
+class FakeFetchProvider:
+    """
+    DataProvider de teste para o ConcurrentFetcher: tickers podem esperar a conclusão de outros (`after`) ou um
+    evento liberado pelo teste (`gates`), travar até o fim do teste (`hang`), levantar exceção (`errors`) ou devolver None (`empty`).
+    """
+    def __init__(self, after=None, gates=None, hang=(), errors=(), empty=()):
+        self.after = after or {}
+        self.gates = gates or {}
+        self.hang, self.errors, self.empty = set(hang), set(errors), set(empty)
+        self.finished = {}
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def _event(self, ticker):
+        with self._lock:
+            return self.finished.setdefault(ticker, threading.Event())
+
+    def get_market_data(self, ticker):
+        try:
+            if ticker in self.after:
+                self._event(self.after[ticker]).wait(5)
+            if ticker in self.gates:
+                self.gates[ticker].wait(5)
+            if ticker in self.hang:
+                self.release.wait(5)
+            if ticker in self.errors:
+                raise ConnectionError(f"{ticker} indisponível")
+            if ticker in self.empty:
+                return None
+            return {"ticker": ticker}
+        finally:
+            self._event(ticker).set()
+
+
+class ConcurrentFetcherTests(SimpleTestCase):
+    def make_fetcher(self, provider, timeout=5):
+        self.addCleanup(provider.release.set)
+        return ConcurrentFetcher(provider, max_workers=5, timeout=timeout)
+
+    def test_yields_in_completion_order(self):
+        gates = {ticker: threading.Event() for ticker in "ABC"}
+        provider = FakeFetchProvider(gates=gates)
+        self.addCleanup(lambda: [gate.set() for gate in gates.values()])
+        results = self.make_fetcher(provider).iter_market_data(["A", "B", "C"])
+        # Cada ticker só termina depois que o anterior já foi entregue pelo gerador.
+        for ticker in "CBA":
+            gates[ticker].set()
+            self.assertEqual(next(results)["ticker"], ticker)
+        self.assertIsNone(next(results, None))
+
+    def test_fetch_all_keeps_input_order(self):
+        provider = FakeFetchProvider(after={"A": "C", "B": "C"})
+        self.assertEqual([data["ticker"] for data in self.make_fetcher(provider).fetch_all(["A", "B", "C"])], ["A", "B", "C"])
+
+    def test_failures_are_isolated_per_ticker(self):
+        provider = FakeFetchProvider(after={"A": "B"}, hang={"HANG"}, errors={"BOOM"}, empty={"NONE"})
+        fetcher = self.make_fetcher(provider, timeout=0.2)
+        started = time.monotonic()
+        with self.assertLogs(level="WARNING") as logs:
+            results = fetcher.fetch_all(["A", "HANG", "BOOM", "NONE", "B"])
+        self.assertEqual([data["ticker"] for data in results], ["A", "B"])
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertTrue(any("Timeout ao buscar HANG" in line for line in logs.output))
+        self.assertTrue(any("Falha ao buscar BOOM" in line for line in logs.output))
+
+    def test_overall_deadline_when_every_worker_hangs(self):
+        # Com os dois workers presos, os outros tickers nunca começam e não teriam um timeout próprio.
+        tickers = ["A", "B", "C", "D", "E"]
+        provider = FakeFetchProvider(hang=tickers)
+        fetcher = ConcurrentFetcher(provider, max_workers=2, timeout=0.1)
+        self.addCleanup(provider.release.set)
+        started = time.monotonic()
+        with self.assertLogs(level="WARNING") as logs:
+            self.assertEqual(fetcher.fetch_all(tickers), [])
+        self.assertLess(time.monotonic() - started, 3)
+        self.assertTrue(any("Prazo total esgotado; 3 ticker(s)" in line for line in logs.output))
+
+
+class AnalysisJobTests(TestCase):
+    def setUp(self):
+        # run_job libera a conexão do worker ao terminar; aqui ele roda na thread do teste, dentro da transação do TestCase.
+        patcher = mock.patch.object(jobs, "close_old_connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user("investidor", password="senha-segura-123")
+        self.client.force_login(self.user)
+
+    def test_start_analysis_returns_202_and_deduplicates(self):
+        first = self.client.post(reverse('trading_app:start_analysis'))
+        second = self.client.post(reverse('trading_app:start_analysis'))
+        self.assertEqual(first.status_code, 202)
+        self.assertTrue(first.json()['created'])
+        self.assertFalse(second.json()['created'])
+        self.assertEqual(first.json()['job_id'], second.json()['job_id'])
+        self.assertEqual(AnalysisJob.objects.filter(user=self.user).count(), 1)
+
+    def test_run_job_stores_result_for_status_endpoint(self):
+        job, _ = jobs.submit_analysis(self.user.id)
+        recommendation = {'action': 'HOLD', 'ticker': 'ALL', 'rationale': 'Sem oportunidades.'}
+        with mock.patch.object(jobs.tasks, 'perform_full_analysis', return_value=recommendation):
+            jobs.run_job(job.id)
+        payload = self.client.get(reverse('trading_app:analysis_job_status', args=[job.id])).json()
+        self.assertEqual(payload['status'], AnalysisJob.SUCCEEDED)
+        self.assertEqual(payload['result'], recommendation)
+        self.assertTrue(jobs.submit_analysis(self.user.id)[1])
+
+    def test_failed_analysis_marks_job_failed(self):
+        job, _ = jobs.submit_analysis(self.user.id)
+        with mock.patch.object(jobs.tasks, 'perform_full_analysis', return_value={"error": True, "message": "sem chave"}):
+            jobs.run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.FAILED)
+        self.assertEqual(job.error, "sem chave")
+
+    def test_other_users_cannot_read_the_job(self):
+        job, _ = jobs.submit_analysis(self.user.id)
+        self.client.force_login(User.objects.create_user("outro", password="senha-segura-123"))
+        response = self.client.get(reverse('trading_app:analysis_job_status', args=[job.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+def make_candidate(ticker, price, sma_21, sma_50, rsi, macd_hist, volume=1e6):
+    history = pd.DataFrame({"Close": [price] * 20, "Volume": [volume] * 20})
+    return {
+        "ticker": ticker, "historical_data": history, "fundamental_data": {"Preço Atual": price},
+        "technical_indicators": {
+            "SMA_21": sma_21, "SMA_50": sma_50, "RSI_14": rsi, "MACDh_12_26_9": macd_hist,
+            "BBL_20_2.0": price * 0.9, "BBU_20_2.0": price * 1.05,
+        },
+        "recent_news": [],
+    }
+
+
+class PreScreenerTests(SimpleTestCase):
+    def test_keeps_top_k_in_score_order(self):
+        candidates = [
+            make_candidate("BAIXA", 10.0, 11.0, 12.0, 35.0, -0.2),
+            make_candidate("ALTA", 10.0, 9.5, 9.0, 55.0, 0.15),
+            make_candidate("MEDIA", 10.0, 9.8, 10.2, 62.0, 0.01),
+        ]
+        selected = PreScreener(top_k=2, min_traded_value=0).select(candidates)
+        self.assertEqual([c["ticker"] for c in selected], ["ALTA", "MEDIA"])
+
+    def test_drops_illiquid_and_incomplete_candidates(self):
+        incomplete = make_candidate("SEMDADOS", 10.0, 9.5, 9.0, 55.0, 0.1)
+        incomplete["technical_indicators"] = {}
+        candidates = [
+            make_candidate("LIQUIDA", 10.0, 9.5, 9.0, 55.0, 0.1, volume=1e6),
+            make_candidate("ILIQUIDA", 10.0, 9.5, 9.0, 55.0, 0.1, volume=100),
+            incomplete,
+        ]
+        selected = PreScreener(top_k=5, min_traded_value=1_000_000).select(candidates)
+        self.assertEqual([c["ticker"] for c in selected], ["LIQUIDA"])
+
+
+class PromptBuilderTests(SimpleTestCase):
+    def setUp(self):
+        self.candidates = []
+        for i in range(40):
+            candidate = make_candidate(f"T{i:02d}", 10.0 + i, 9.5, 9.0, 55.0, 0.1)
+            candidate["recent_news"] = [f"Manchete {j} sobre a empresa T{i:02d} e o seu último resultado trimestral" for j in range(5)]
+            self.candidates.append(candidate)
+
+    def test_prompt_fits_budget_dropping_news_before_candidates(self):
+        builder = PromptBuilder(token_budget=900, max_news=3)
+        prompt = builder.build_buy_prompt(self.candidates, [], {"ibov_change": "1.00%"})
+        self.assertLessEqual(estimate_tokens(prompt), 900)
+        self.assertEqual(builder.last_report["news_per_candidate"], 0)
+        self.assertEqual(builder.last_report["candidates"], 40)
+
+    def test_lowest_ranked_candidates_are_dropped_last_in_list(self):
+        builder = PromptBuilder(token_budget=500, max_news=3)
+        prompt = builder.build_buy_prompt(self.candidates, [], {})
+        kept = builder.last_report["candidates"]
+        self.assertLess(kept, 40)
+        self.assertLessEqual(builder.last_report["tokens"], 500)
+        self.assertIn("\nT00|", prompt)
+        self.assertNotIn(f"\nT{kept:02d}|", prompt)
+
+    def test_unlimited_budget_keeps_headlines(self):
+        builder = PromptBuilder(token_budget=10 ** 6, max_news=2, news_max_chars=30)
+        prompt = builder.build_buy_prompt(self.candidates[:2], [], {})
+        self.assertIn("Manchetes recentes", prompt)
+        self.assertNotIn("Manchete 2", prompt)
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt, request_options=None):
+        self.calls += 1
+        return mock.Mock(text='{"decision": "HOLD", "ticker": null, "rationale": "teste"}')
+
+
+class LLMResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.path = f"{tempfile.mkdtemp()}/llm_cache.sqlite3"
+
+    def test_identical_prompts_hit_the_cache(self):
+        engine = SynthesisEngine(api_key="chave-de-teste", cache=LLMResponseCache(self.path, ttl=0, max_entries=100))
+        engine.model = CountingModel()
+        candidates = [make_candidate("ALTA", 10.0, 9.5, 9.0, 55.0, 0.15)]
+        first = engine.decide_best_investment_backtest(candidates, {"ibov_change": "N/A"})
+        second = engine.decide_best_investment_backtest(candidates, {"ibov_change": "N/A"})
+        self.assertEqual(first, second)
+        self.assertEqual(engine.model.calls, 1)
+        self.assertEqual(engine.cache.stats()["hits"], 1)
+
+    def test_empty_responses_are_not_cached_and_ttl_expires(self):
+        cache = LLMResponseCache(self.path, ttl=60, max_entries=100)
+        cache.set("modelo", "prompt", "")
+        self.assertIsNone(cache.get("modelo", "prompt"))
+        cache.set("modelo", "prompt", "resposta")
+        self.assertEqual(cache.get("modelo", "prompt"), "resposta")
+        self.assertIsNone(cache.get("outro-modelo", "prompt"))
+        with mock.patch("core_logic.llm_cache.time.time", return_value=10 ** 12):
+            self.assertIsNone(cache.get("modelo", "prompt"))
+
+    def test_size_eviction_keeps_most_recently_used(self):
+        cache = LLMResponseCache(self.path, ttl=0, max_entries=2)
+        for prompt in ("a", "b", "c"):
+            cache.set("modelo", prompt, f"resposta {prompt}")
+        cache.get("modelo", "a")
+        cache.evict()
+        self.assertEqual(cache.get("modelo", "a"), "resposta a")
+        self.assertIsNone(cache.get("modelo", "b"))
+
+
+class ScriptedModel:
+    """Devolve as respostas na ordem; esgotadas, responde pelo ticker citado no prompt (`by_ticker`)."""
+    def __init__(self, *responses, by_ticker=None):
+        self.responses = list(responses)
+        self.by_ticker = by_ticker or {}
+        self.prompts = []
+
+    def generate_content(self, prompt, request_options=None):
+        self.prompts.append(prompt)
+        if self.responses:
+            return mock.Mock(text=self.responses.pop(0))
+        matches = [ticker for ticker in self.by_ticker if ticker in prompt]
+        if len(matches) != 1:
+            raise AssertionError(f"prompt sem um ticker roteirizado: {matches}")
+        return mock.Mock(text=self.by_ticker[matches[0]])
+
+
+class BatchedSellReviewTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = SynthesisEngine(
+            api_key="chave-de-teste", cache=LLMResponseCache(f"{tempfile.mkdtemp()}/llm.sqlite3", ttl=0),
+            client=LLMClient(rate_per_minute=0),
+        )
+        self.positions = [
+            (make_candidate(ticker, 10.0, 9.5, 9.0, 55.0, 0.1), {"ticker": ticker, "quantity": 100, "buy_price": 9.0})
+            for ticker in ("PETR4", "VALE3", "ITUB4")
+        ]
+
+    def test_all_positions_are_reviewed_in_one_call(self):
+        self.engine.model = ScriptedModel(
+            '{"decisions": [{"ticker": "PETR4", "decision": "HOLD", "rationale": "ok"}, '
+            '{"ticker": "vale3", "decision": "SELL", "rationale": "alvo"}, {"ticker": "ITUB4", "decision": "HOLD", "rationale": "ok"}]}'
+        )
+        decisions = self.engine.should_sell_positions(self.positions, [], {})
+        self.assertEqual(len(self.engine.model.prompts), 1)
+        self.assertEqual({t: d["decision"] for t, d in decisions.items()}, {"PETR4": "HOLD", "VALE3": "SELL", "ITUB4": "HOLD"})
+
+    def test_positions_missing_from_the_batch_fall_back_to_single_review(self):
+        self.engine.model = ScriptedModel(
+            '{"decisions": [{"ticker": "PETR4", "decision": "HOLD", "rationale": "ok"}]}',
+            by_ticker={
+                "VALE3": '{"decision": "SELL", "rationale": "alvo de VALE3"}',
+                "ITUB4": '{"decision": "HOLD", "rationale": "tendência de ITUB4"}',
+            },
+        )
+        decisions = self.engine.should_sell_positions(self.positions, [], {})
+        self.assertEqual(len(self.engine.model.prompts), 3)
+        self.assertEqual(decisions["PETR4"]["decision"], "HOLD")
+        self.assertEqual(decisions["VALE3"], {"decision": "SELL", "rationale": "alvo de VALE3"})
+        self.assertEqual(decisions["ITUB4"], {"decision": "HOLD", "rationale": "tendência de ITUB4"})
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FlakyModel:
+    """Falha com os erros informados antes de responder; `delay` simula a latência da API."""
+    def __init__(self, *errors, delay=0.0):
+        self.errors = list(errors)
+        self.delay = delay
+        self.calls = 0
+        self.timeouts = []
+
+    def generate_content(self, prompt, request_options=None):
+        self.calls += 1
+        self.timeouts.append((request_options or {}).get("timeout"))
+        time.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        return mock.Mock(text=f"resposta para {prompt}")
+
+
+class LLMClientTests(SimpleTestCase):
+    def make_client(self, **kwargs):
+        return LLMClient(**{"rate_per_minute": 0, "max_retries": 3, "backoff_base": 0.001, "backoff_max": 0.01, "timeout": 5, **kwargs})
+
+    def test_transient_errors_are_retried_with_backoff(self):
+        client = self.make_client()
+        model = FlakyModel(FakeAPIError(503), FakeAPIError(429))
+        self.assertEqual(client.generate(model, "p"), "resposta para p")
+        metrics = client.metrics.snapshot()
+        self.assertEqual((model.calls, metrics["retries"], metrics["succeeded"]), (3, 2, 1))
+        self.assertEqual(metrics["errors"], {"server": 1, "rate_limited": 1})
+        self.assertEqual(metrics["latency"]["count"], 1)
+
+    def test_client_errors_fail_without_retry(self):
+        client = self.make_client()
+        model = FlakyModel(FakeAPIError(400))
+        with self.assertRaises(LLMError) as ctx:
+            client.generate(model, "p")
+        self.assertEqual((ctx.exception.kind, ctx.exception.attempts, model.calls), ("client", 1, 1))
+
+    def test_deadline_is_enforced_on_slow_calls(self):
+        client = self.make_client(timeout=0.05, max_retries=0)
+        started_at = time.monotonic()
+        with self.assertRaises(LLMTimeoutError):
+            client.generate(FlakyModel(delay=1.0), "p")
+        self.assertLess(time.monotonic() - started_at, 0.5)
+        self.assertEqual(client.metrics.snapshot()["errors"], {"timeout": 1})
+
+    def test_remaining_deadline_is_passed_to_the_sdk(self):
+        client = self.make_client(timeout=2, backoff_base=0.05, backoff_max=0.05)
+        model = FlakyModel(FakeAPIError(503), delay=0.05)
+        client.generate(model, "p")
+        # O SDK recebe o que sobra do prazo total, então uma chamada travada libera a thread do pool quando ele vence.
+        first, second = model.timeouts
+        self.assertLessEqual(first, 2)
+        self.assertGreater(first, 1.9)
+        self.assertLess(second, first - 0.04)
+
+    def test_generate_many_runs_calls_concurrently(self):
+        client = self.make_client(max_concurrency=4)
+        started_at = time.monotonic()
+        results = client.generate_many(FlakyModel(delay=0.2), ["a", "b", "c", "d"])
+        self.assertLess(time.monotonic() - started_at, 0.6)
+        self.assertEqual(results, [f"resposta para {p}" for p in "abcd"])
+
+    def test_token_bucket_limits_the_rate(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        started_at = time.monotonic()
+        for _ in range(3):
+            self.assertTrue(bucket.acquire())
+        self.assertGreaterEqual(time.monotonic() - started_at, 0.09)
+        self.assertFalse(bucket.acquire(timeout=0))
+
+
+class StaticDataProvider:
+    def __init__(self, candidates):
+        self.candidates = {c["ticker"]: c for c in candidates}
+        self.cache = mock.Mock(stats=mock.Mock(return_value={}))
+
+    def prefetch_history(self, tickers):
+        return 0
+
+    def get_market_data(self, ticker):
+        return self.candidates.get(ticker)
+
+
+class DecisionBackendTests(TestCase):
+    def test_backend_is_chosen_by_name(self):
+        self.assertIsInstance(get_decision_backend("rules"), RuleBasedDecider)
+        with self.assertRaises(ValueError):
+            get_decision_backend("oraculo")
+        with mock.patch("core_logic.config.GEMINI_API_KEY", None), self.assertRaises(ValueError):
+            get_decision_backend("gemini")
+
+    def test_rules_backend_does_not_rebuy_recently_sold_assets(self):
+        candidates = [make_candidate("ALTA", 10.0, 9.5, 9.0, 55.0, 0.15), make_candidate("MEDIA", 10.0, 9.8, 9.5, 60.0, 0.05)]
+        decider = RuleBasedDecider()
+        self.assertEqual(decider.decide_best_investment(candidates, [], {})["ticker"], "ALTA")
+        self.assertEqual(decider.decide_best_investment(candidates, [{"ticker": "ALTA", "side": "SELL"}], {})["ticker"], "MEDIA")
+
+    def test_rules_backend_holds_without_a_quote_or_buy_price(self):
+        decider = RuleBasedDecider()
+        data = make_candidate("ALTA", 10.0, 9.5, 9.0, 55.0, 0.15)
+        no_quote = {**data, "fundamental_data": {**data["fundamental_data"], "Preço Atual": None}}
+        nan_quote = {**data, "fundamental_data": {**data["fundamental_data"], "Preço Atual": float("nan")}}
+        for position_data, buy_price in ((no_quote, 9.0), (nan_quote, 9.0), (data, 0), (data, None)):
+            decision = decider.should_sell_position(position_data, {"ticker": "ALTA", "quantity": 1, "buy_price": buy_price}, [], {})
+            self.assertEqual(decision["decision"], "HOLD")
+
+    def test_run_backtest_defaults_to_the_configured_backend(self):
+        from core_logic.management.commands.run_backtest import Command
+        with mock.patch("core_logic.config.DECISION_BACKEND", "gemini"):
+            parser = Command().create_parser("manage.py", "run_backtest")
+        self.assertEqual(parser.parse_args(["--start", "2024-01-01", "--end", "2024-02-01"]).decider, "gemini")
+
+    def test_full_analysis_runs_offline_with_the_rules_backend(self):
+        user = User.objects.create_user("offline", password="senha-segura-123")
+        UserProfile.objects.create(user=user, decision_backend="rules")
+        portfolio = Portfolio.objects.create(user=user, balance=10000)
+        Position.objects.create(portfolio=portfolio, ticker="QUEDA", quantity=10, buy_price=20)
+        provider = StaticDataProvider([
+            make_candidate("QUEDA", 15.0, 16.0, 17.0, 30.0, -0.3), make_candidate("ALTA", 10.0, 9.5, 9.0, 55.0, 0.15),
+        ])
+        context_service = mock.Mock(current=mock.Mock(return_value={"ibov_change": "N/A"}))
+        with mock.patch.object(tasks, "get_shared_data_provider", return_value=provider), \
+                mock.patch.object(tasks, "get_market_context_service", return_value=context_service), \
+                mock.patch.object(tasks, "TICKERS_TO_MONITOR", ["QUEDA", "ALTA"]):
+            result = tasks.perform_full_analysis(user.id)
+        self.assertEqual((result["action"], result["ticker"]), ("SELL", "QUEDA"))
+
+
+class ClientPoolTests(SimpleTestCase):
+    def test_clients_are_reused_per_key(self):
+        pool = KeyedClientPool(lambda key: object(), idle_ttl=0, max_size=10)
+        first, again, other = pool.get("chave-a"), pool.get("chave-a"), pool.get("chave-b")
+        self.assertIs(first, again)
+        self.assertIsNot(first, other)
+        self.assertEqual(pool.stats(), {"hits": 1, "misses": 2, "evictions": 0, "size": 2})
+
+    def test_idle_and_excess_clients_are_evicted(self):
+        pool = KeyedClientPool(lambda key: object(), idle_ttl=60, max_size=2)
+        first = pool.get("a")
+        pool.get("b")
+        pool.get("a")
+        pool.get("c")
+        self.assertEqual(pool.stats()["size"], 2)
+        self.assertIs(pool.get("a"), first)
+        with mock.patch("core_logic.client_pool.time.monotonic", return_value=time.monotonic() + 120):
+            self.assertIsNot(pool.get("a"), first)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_gemini_backend_reuses_the_engine_of_the_same_key(self):
+        first = get_decision_backend("gemini", api_key="chave-do-pool")
+        self.assertIs(get_decision_backend("gemini", api_key="chave-do-pool"), first)
+        self.assertIsNot(get_decision_backend("gemini", api_key="outra-chave-do-pool"), first)
+
+    def test_llm_clients_per_key_are_capped(self):
+        pool = KeyedClientPool(lambda key: LLMClient(), idle_ttl=0, max_size=2)
+        with mock.patch.object(llm_client, "_clients", pool):
+            first = llm_client.get_llm_client("chave-1")
+            self.assertIs(llm_client.get_llm_client("chave-1"), first)
+            llm_client.get_llm_client("chave-2")
+            llm_client.get_llm_client("chave-3")
+            self.assertEqual(pool.stats()["size"], 2)
+            self.assertIsNot(llm_client.get_llm_client("chave-1"), first)
+
+    def test_gemini_models_keep_their_own_key(self):
+        first, other = GeminiModel("chave-a", "modelo", {}), GeminiModel("chave-b", "modelo", {})
+        self.assertIsNot(first._service, other._service)
+        reply = glm.GenerateContentResponse(candidates=[glm.Candidate(content=glm.Content(role="model", parts=[glm.Part(text="ok")]), finish_reason=1)])
+        with mock.patch.object(first._service, "generate_content", return_value=reply) as call:
+            self.assertEqual(first.generate_content("prompt", request_options={"timeout": 5}).text, "ok")
+        request = call.call_args.args[0]
+        self.assertEqual((request.model, request.contents[0].parts[0].text), ("models/modelo", "prompt"))
+        self.assertEqual(call.call_args.kwargs, {"timeout": 5})
+
+
+class ResponseDecoderTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = SynthesisEngine(
+            api_key="chave-de-teste", cache=LLMResponseCache(f"{tempfile.mkdtemp()}/llm.sqlite3", ttl=0),
+            client=LLMClient(rate_per_minute=0),
+        )
+        self.candidates = [make_candidate("ALTA", 10.0, 9.5, 9.0, 55.0, 0.15), make_candidate("MEDIA", 10.0, 9.8, 9.5, 60.0, 0.05)]
+
+    def test_extracts_the_first_balanced_object_around_prose(self):
+        text = 'Claro! Segue a análise:\n```json\n{"decision": "BUY", "ticker": "alta", "rationale": "preço {acima} das médias"}\n```\nAbraço.'
+        self.assertEqual(extract_json(text)["rationale"], "preço {acima} das médias")
+        self.assertIsNone(extract_json("Sem JSON {aqui"))
+        self.engine.model = ScriptedModel(text)
+        decision = self.engine.decide_best_investment_backtest(self.candidates, {})
+        self.assertEqual((decision["decision"], decision["ticker"]), ("BUY", "ALTA"))
+        self.assertEqual(len(self.engine.model.prompts), 1)
+
+    def test_skips_json_that_is_not_a_decision(self):
+        text = 'Nota [1]: {"peso": 2} e {"decision": "HOLD", "ticker": null, "rationale": "sem sinal"} [fim]'
+        self.assertEqual(extract_json(text), {"decision": "HOLD", "ticker": None, "rationale": "sem sinal"})
+        self.assertEqual(extract_json('Ver [1] e [2].'), [1])
+        self.engine.model = ScriptedModel('Nota [1]: {"decision": "SELL", "rationale": "stop [2%] atingido"}')
+        decision = self.engine.should_sell_position(self.candidates[0], {"ticker": "ALTA", "quantity": 1, "buy_price": 9.0}, [], {})
+        self.assertEqual(decision, {"decision": "SELL", "rationale": "stop [2%] atingido"})
+        self.assertEqual(len(self.engine.model.prompts), 1)
+        self.assertEqual(self.engine.decoder.stats()["repaired"], 0)
+
+    def test_invalid_decision_gets_one_cheap_repair_call(self):
+        self.engine.model = ScriptedModel(
+            'Compraria {"decision": "BUY", "ticker": "XPTO3", "rationale": "?"}',
+            '{"decision": "BUY", "ticker": "MEDIA", "rationale": "corrigido"}',
+        )
+        decision = self.engine.decide_best_investment_backtest(self.candidates, {})
+        self.assertEqual((decision["decision"], decision["ticker"]), ("BUY", "MEDIA"))
+        repair_prompt = self.engine.model.prompts[1]
+        self.assertIn("XPTO3", repair_prompt)
+        self.assertNotIn("Legenda", repair_prompt)
+        self.assertEqual(self.engine.decoder.stats()["repaired"], 1)
+
+    def test_unrepairable_responses_are_errors_and_counted(self):
+        self.engine.model = ScriptedModel("Prefiro não opinar.", "Continuo sem opinar.")
+        decision = self.engine.should_sell_position(self.candidates[0], {"ticker": "ALTA", "quantity": 1, "buy_price": 9.0}, [], {})
+        self.assertEqual(decision["decision"], "ERROR")
+        self.assertEqual(self.engine.decoder.stats()["failure_rate"], 1.0)
+
+
+class FakeYahooDownload:
+    """Substituto local do yf.download com vários tickers: devolve o frame MultiIndex (ticker, campo) e conta as requisições."""
+    def __init__(self, frames, missing=()):
+        self.frames = frames
+        self.missing = set(missing)
+        self.requests = []
+
+    def __call__(self, tickers, start, end):
+        self.requests.append(list(tickers))
+        parts = {}
+        for ticker in tickers:
+            df = self.frames.get(ticker)
+            if df is None or ticker in self.missing:
+                continue
+            parts[f"{ticker}.SA"] = df.loc[(df.index >= start) & (df.index < end)]
+        self.missing.clear()
+        if not parts:
+            return {}
+        return split_multi_ticker_frame(pd.concat(parts, axis=1), list(tickers))
+
+
+class BulkDownloadTests(SimpleTestCase):
+    def setUp(self):
+        self.frames = make_ohlc_frames(n_tickers=12, min_bars=30, max_bars=60)
+
+    def test_splits_both_multiindex_layouts(self):
+        by_ticker = pd.concat({f"{t}.SA": self.frames[t] for t in ("T00", "T01")}, axis=1)
+        by_field = by_ticker.swaplevel(axis=1).sort_index(axis=1)
+        for df in (by_ticker, by_field):
+            split = split_multi_ticker_frame(df, ["T00", "T01", "T02"])
+            self.assertEqual(set(split), {"T00", "T01"})
+            pd.testing.assert_frame_equal(split["T01"][list(self.frames["T01"].columns)], self.frames["T01"], check_freq=False)
+
+    def test_chunks_the_universe_and_retries_only_failed_tickers(self):
+        fake = FakeYahooDownload(self.frames, missing={"T03"})
+        downloader = BulkDownloader(fake, chunk_size=5, max_attempts=2, retry_pause=0)
+        result = downloader.fetch(sorted(self.frames), pd.Timestamp("2022-01-01"), pd.Timestamp("2023-01-01"))
+        self.assertEqual(set(result), set(self.frames))
+        self.assertEqual([len(r) for r in fake.requests], [5, 5, 2, 1])
+        self.assertEqual(fake.requests[-1], ["T03"])
+
+    def test_history_store_prefetch_uses_one_request_for_the_universe(self):
+        fake = FakeYahooDownload(self.frames)
+        store = HistoryStore(tempfile.mkdtemp(), download=mock.Mock(side_effect=AssertionError), bulk_download=BulkDownloader(fake))
+        loaded = store.prefetch(sorted(self.frames), "2022-01-01", "2022-06-01")
+        self.assertEqual(len(fake.requests), 1)
+        self.assertEqual(len(loaded["T05"]), len(self.frames["T05"]))
+        store.prefetch(sorted(self.frames), "2022-01-01", "2022-06-01")
+        self.assertEqual(len(fake.requests), 1)
+        self.assertEqual(len(store.get_range("T05", "2022-01-01", "2022-06-01")), len(self.frames["T05"]))
+
+    def test_live_prefetch_makes_a_single_attempt_without_pauses(self):
+        index = pd.bdate_range(end=pd.Timestamp.today().normalize() - pd.Timedelta(days=1), periods=60, name="Date")
+        frames = {f"T{i:02d}": pd.DataFrame({"Close": 10.0 + i, "Volume": 1e5}, index=index) for i in range(4)}
+        fake = FakeYahooDownload(frames, missing={"T03"})
+        download = mock.Mock(side_effect=AssertionError)
+        store = HistoryStore(tempfile.mkdtemp(), download=download, bulk_download=BulkDownloader(fake, max_attempts=3, retry_pause=30))
+        provider = DataProvider(cache=MarketDataCache(), history_store=store)
+        started_at = time.monotonic()
+        self.assertEqual(provider.prefetch_history(sorted(frames)), 3)
+        self.assertLess(time.monotonic() - started_at, 5)
+        self.assertEqual(fake.requests, [sorted(frames)])
+        download.assert_not_called()
+        self.assertEqual([provider.cache.has("history", t) for t in sorted(frames)], [True, True, True, False])
+
+
+class MarketContextTests(SimpleTestCase):
+    def setUp(self):
+        self.frames = make_ohlc_frames(n_tickers=4, min_bars=300, max_bars=301)
+        self.frames[IBOV] = make_ohlc_frames(n_tickers=1, min_bars=300, max_bars=301, seed=11)["T00"]
+
+    def test_context_is_point_in_time(self):
+        index_close = self.frames[IBOV]["Close"]
+        dates = index_close.index[100:200]
+        full = compute_context_table(index_close, dates)
+        day = dates[50]
+        truncated = compute_context_table(index_close.loc[:day], pd.DatetimeIndex([day]))
+        pd.testing.assert_series_equal(full.loc[day], truncated.loc[day])
+        expected = index_close.loc[day] / index_close.loc[:day].iloc[-6] - 1
+        self.assertAlmostEqual(full.loc[day, "ibov_change"], expected)
+
+    def test_backtest_provider_serves_context_for_the_current_session(self):
+        tickers = [t for t in self.frames if t != IBOV]
+        provider = BacktestDataProvider(tickers, "2022-01-01", "2023-06-01", history_store=make_history_store(self.frames))
+        day = provider.get_trading_days()[120]
+        provider.set_current_date(day)
+        context = provider.get_market_context()
+        close = self.frames[IBOV]["Close"].loc[:day]
+        self.assertEqual(context["ibov_change"], f"{close.iloc[-1] / close.iloc[-6] - 1:.2%}")
+        self.assertTrue(0 <= context["breadth"] <= 1)
+
+    def test_live_context_is_cached_for_the_session(self):
+        store = mock.Mock(wraps=make_history_store(self.frames))
+        service = MarketContextService(store, universe=[], ttl=60)
+        first = service.current()
+        self.assertIs(service.current(), first)
+        self.assertEqual(store.get_range.call_count, 1)
+
+
+class ReportingTests(TestCase):
+    def test_fifo_matches_partial_fills_across_lots(self):
+        trades = [
+            (1, "PETR4", "BUY", 10, Decimal("10")),
+            (2, "PETR4", "BUY", 10, Decimal("20")),
+            (3, "PETR4", "SELL", 15, Decimal("30")),
+            (4, "PETR4", "SELL", 3, Decimal("15")),
+            (5, "VALE3", "SELL", 4, Decimal("50")),
+        ]
+        report = build_report(trades, Decimal("1395"))
+        # 15 x 30 - (10 x 10 + 5 x 20) = 250; 3 x 15 - 3 x 20 = -15; a venda de VALE3 sem compra é ignorada.
+        self.assertEqual(report["total_pl"], Decimal("235"))
+        self.assertEqual((report["total_trades"], report["win_rate"]), (2, 50))
+        self.assertEqual(report["open_lots"], {"PETR4": 2})
+        self.assertEqual(report["balance_points"], [(1, 1000), (1, 900), (2, 700), (3, 1150), (4, 1195), (5, 1395)])
+
+    def test_chart_is_sampled_keeping_first_and_last_points(self):
+        trades = [(i, "PETR4", "BUY" if i % 2 else "SELL", 1, Decimal("10")) for i in range(1, 1001)]
+        points = build_report(trades, Decimal("0"), max_points=50)["balance_points"]
+        self.assertEqual(len(points), 50)
+        self.assertEqual((points[0][0], points[-1][0]), (1, 1000))
+
+    def test_report_view_uses_a_constant_number_of_queries(self):
+        user = User.objects.create_user("relatorio", password="senha-segura-123")
+        portfolio = Portfolio.objects.create(user=user, balance=Decimal("1000"))
+        for side, quantity, price in [("BUY", 10, "10"), ("BUY", 5, "12"), ("SELL", 12, "15"), ("SELL", 3, "9")]:
+            TradeHistory.objects.create(portfolio=portfolio, ticker="ITUB4", side=side, quantity=quantity, price=Decimal(price))
+        with self.assertNumQueries(2):
+            report = portfolio_report(portfolio)
+        self.assertEqual(report["total_pl"], Decimal("12") * 15 - (10 * 10 + 2 * 12) + 3 * 9 - 3 * 12)
+        self.assertEqual(len(report["balance_over_time"]["labels"]), 5)
+
+        self.client.force_login(user)
+        response = self.client.get(reverse('trading_app:report'))
+        self.assertEqual(response.context["total_trades"], 2)
+        self.assertEqual(response.context["total_pl"], report["total_pl"])
+
+    def test_trades_update_the_snapshot_incrementally(self):
+        user = User.objects.create_user("snapshot", password="senha-segura-123")
+        portfolio = Portfolio.objects.create(user=user, balance=Decimal("10000"))
+        self.client.force_login(user)
+        for action, quantity, price in [("BUY", 10, "10"), ("BUY", 10, "20"), ("SELL", 10, "25"), ("BUY", 5, "30"), ("SELL", 5, "12")]:
+            self.client.post(reverse('trading_app:execute_trade'), {"action": action, "ticker": "WEGE3", "quantity": quantity, "price": price})
+        snapshot = PerformanceSnapshot.objects.get(portfolio=portfolio)
+        self.assertEqual((snapshot.trade_count, snapshot.wins, snapshot.losses), (5, 1, 1))
+        self.assertEqual(snapshot.realized_pnl, Decimal("150") + Decimal("-40"))
+
+        incremental = snapshot_report(Portfolio.objects.get(id=portfolio.id))
+        PerformanceSnapshot.objects.all().delete()
+        call_command('rebuild_performance_snapshots', '--user', 'snapshot', stdout=StringIO())
+        rebuilt = snapshot_report(Portfolio.objects.get(id=portfolio.id))
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(rebuilt["total_pl"], portfolio_report(Portfolio.objects.get(id=portfolio.id))["total_pl"])
+
+    def test_report_reads_do_not_scan_the_history(self):
+        user = User.objects.create_user("leitura", password="senha-segura-123")
+        portfolio = Portfolio.objects.create(user=user, balance=Decimal("1000"))
+        TradeHistory.objects.bulk_create([TradeHistory(portfolio=portfolio, ticker="BBAS3", side="BUY", quantity=1, price=Decimal("1")) for _ in range(50)])
+        get_snapshot(portfolio)
+        portfolio = Portfolio.objects.select_related('performance').get(id=portfolio.id)
+        with self.assertNumQueries(0):
+            report = snapshot_report(portfolio)
+        self.assertEqual(report["trade_count"], 50)
+        self.assertEqual(report["balance_over_time"]["data"][-1], 1000.0)
+
+
+class MarketDataCacheTests(SimpleTestCase):
+    def make_cache(self, **kwargs):
+        return MarketDataCache(ttls={"info": 100, "history": 10, "quote": 1}, **kwargs)
+
+    def test_ttl_is_per_kind(self):
+        cache = self.make_cache()
+        with mock.patch("core_logic.market_cache.time") as clock:
+            clock.time.return_value = 1000.0
+            for kind in ("info", "history", "quote"):
+                cache.set(kind, "PETR4", kind)
+            clock.time.return_value = 1005.0
+            self.assertEqual([cache.has(kind, "PETR4") for kind in ("info", "history", "quote")], [True, True, False])
+            clock.time.return_value = 1050.0
+            self.assertEqual([cache.has(kind, "PETR4") for kind in ("info", "history", "quote")], [True, False, False])
+
+    def test_lru_eviction_keeps_recently_read_entries(self):
+        cache = self.make_cache(max_entries=2)
+        cache.set("info", "A", 1)
+        cache.set("info", "B", 2)
+        cache.get("info", "A")
+        cache.set("info", "C", 3)
+        self.assertEqual([cache.has("info", t) for t in "ABC"], [True, False, True])
+
+    def test_hit_and_miss_counters(self):
+        cache = self.make_cache()
+        fetch = mock.Mock(return_value={"currentPrice": 10.0})
+        for _ in range(3):
+            self.assertEqual(cache.get_or_fetch("info", "VALE3", fetch), {"currentPrice": 10.0})
+        cache.get("quote", "VALE3")
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(cache.stats()["info"], {"hits": 2, "misses": 1})
+        self.assertEqual(cache.stats()["quote"], {"hits": 0, "misses": 1})
+
+    def test_has_does_not_count_hits_or_misses(self):
+        path = f"{tempfile.mkdtemp()}/cache.sqlite3"
+        self.make_cache(backend=SQLiteCacheBackend(path)).set("info", "PETR4", {"currentPrice": 30.0})
+        cache = self.make_cache(backend=SQLiteCacheBackend(path))
+        cache.set("quote", "VALE3", 60.0)
+        self.assertEqual([cache.has("quote", "VALE3"), cache.has("info", "PETR4"), cache.has("info", "ITUB4")], [True, True, False])
+        self.assertEqual(cache.stats()["info"], {"hits": 0, "misses": 0})
+        self.assertEqual(cache.stats()["quote"], {"hits": 0, "misses": 0})
+
+    def test_sqlite_backend_shares_entries_as_json(self):
+        path = f"{tempfile.mkdtemp()}/cache.sqlite3"
+        frame = make_ohlc_frames(n_tickers=1, min_bars=20, max_bars=21)["T00"]
+        frame.iloc[3, 0] = np.nan
+        writer = self.make_cache(backend=SQLiteCacheBackend(path))
+        writer.set("history", "T00", frame)
+        writer.set("info", "T00", {"currentPrice": 31.7, "sector": "Energia"})
+        writer.set("quote", "T00", None)
+
+        reader = self.make_cache(backend=SQLiteCacheBackend(path))
+        pd.testing.assert_frame_equal(reader.get("history", "T00"), frame, check_freq=False)
+        self.assertEqual(reader.get("info", "T00"), {"currentPrice": 31.7, "sector": "Energia"})
+        self.assertTrue(reader.has("quote", "T00"))
+        self.assertIsNone(reader.get("quote", "T00"))
+        with sqlite3.connect(path) as conn:
+            payload = conn.execute("SELECT payload FROM market_cache WHERE key = 'info:T00'").fetchone()[0]
+        self.assertEqual(json.loads(payload), {"value": {"currentPrice": 31.7, "sector": "Energia"}})
+
+    def test_sqlite_backend_ignores_unreadable_payloads(self):
+        path = f"{tempfile.mkdtemp()}/cache.sqlite3"
+        backend = SQLiteCacheBackend(path)
+        with sqlite3.connect(path) as conn:
+            conn.execute("INSERT INTO market_cache VALUES ('info:T00', ?, ?)", (time.time(), pickle.dumps({"currentPrice": 1.0})))
+        self.assertIsNone(backend.get("info:T00"))
+        self.assertFalse(self.make_cache(backend=backend).has("info", "T00"))
+
+
+def make_quote_frames(prices):
+    index = pd.DatetimeIndex([pd.Timestamp.today().normalize() - pd.Timedelta(days=1), pd.Timestamp.today().normalize()])
+    return {ticker: pd.DataFrame({"Close": [price * 0.9, price], "Volume": [1e6, 1e6]}, index=index) for ticker, price in prices.items()}
+
+
+class QuoteServiceTests(TestCase):
+    def setUp(self):
+        self.download = FakeYahooDownload(make_quote_frames({"PETR4": 38.5, "VALE3": 61.2, "ITUB4": 33.0}))
+        self.service = QuoteService(MarketDataCache(), BulkDownloader(self.download, max_attempts=1))
+
+    def test_miss_fetches_requested_and_universe_tickers_in_one_batch(self):
+        quotes = self.service.get_quotes(["PETR4"], universe=lambda: ["PETR4", "VALE3", "XPTO3"])
+        self.assertEqual(quotes["PETR4"]["price"], 38.5)
+        self.assertEqual(self.download.requests, [["PETR4", "VALE3", "XPTO3"]])
+        # Outro usuário com VALE3 e o ticker sem cotação: tudo sai do cache, sem nova requisição.
+        self.assertEqual(set(self.service.get_quotes(["VALE3", "XPTO3"], universe=lambda: self.fail("universo avaliado"))), {"VALE3"})
+        self.assertEqual(len(self.download.requests), 1)
+        self.assertEqual(self.service.stats()["batches"], 1)
+
+    def test_dashboard_endpoint_marks_positions_to_market(self):
+        user = User.objects.create_user("cotacoes", password="senha-segura-123")
+        portfolio = Portfolio.objects.create(user=user, balance=Decimal("500"))
+        Position.objects.create(portfolio=portfolio, ticker="PETR4", quantity=10, buy_price=Decimal("35"))
+        Position.objects.create(portfolio=portfolio, ticker="XPTO3", quantity=5, buy_price=Decimal("10"))
+        other = Portfolio.objects.create(user=User.objects.create_user("vizinho", password="senha-segura-123"))
+        Position.objects.create(portfolio=other, ticker="ITUB4", quantity=1, buy_price=Decimal("30"))
+        self.client.force_login(user)
+        with mock.patch("trading_app.views.get_quote_service", return_value=self.service):
+            payload = self.client.get(reverse('trading_app:portfolio_quotes')).json()
+            dashboard = self.client.get(reverse('trading_app:dashboard'))
+        self.assertEqual(sorted(self.download.requests[0]), ["ITUB4", "PETR4", "XPTO3"])
+        petr4, xpto3 = payload["positions"]
+        self.assertAlmostEqual(petr4["unrealized_pnl"], 35.0)
+        self.assertIsNone(xpto3["price"])
+        self.assertEqual(payload["totals"]["quoted"], 1)
+        self.assertAlmostEqual(payload["totals"]["equity"], 500 + 385 + 50)
+        # O painel usa só o cache, já preenchido pelo endpoint.
+        self.assertEqual(dashboard.context["totals"], payload["totals"])
+
+
+class QueryCountTests(TestCase):
+    """Número de comandos SQL por página: não pode crescer com posições, operações ou idade da conta."""
+    def setUp(self):
+        self.user = User.objects.create_user("consultas", password="senha-segura-123")
+        UserProfile.objects.create(user=self.user, decision_backend="rules")
+        self.portfolio = Portfolio.objects.create(user=self.user, balance=Decimal("10000"))
+        self.add_holdings(3)
+        get_snapshot(self.portfolio)
+        self.client.force_login(self.user)
+        self.quotes = QuoteService(MarketDataCache(), BulkDownloader(FakeYahooDownload({}), max_attempts=1))
+
+    def add_holdings(self, count):
+        for i in range(count):
+            Position.objects.create(portfolio=self.portfolio, ticker=f"T{i:02d}", quantity=1, buy_price=Decimal("10"))
+            TradeHistory.objects.create(portfolio=self.portfolio, ticker=f"T{i:02d}", side="BUY", quantity=1, price=Decimal("10"))
+
+    def assert_constant_queries(self, count, request):
+        # Sessão e usuário da autenticação entram na conta de cada página.
+        with self.assertNumQueries(count):
+            request()
+        self.add_holdings(20)
+        rebuild_snapshot(self.portfolio)
+        with self.assertNumQueries(count):
+            request()
+
+    def test_dashboard(self):
+        with mock.patch("trading_app.views.get_quote_service", return_value=self.quotes):
+            self.assert_constant_queries(4, lambda: self.client.get(reverse('trading_app:dashboard')))
+
+    def test_report(self):
+        self.assert_constant_queries(4, lambda: self.client.get(reverse('trading_app:report')))
+
+    def test_portfolio_quotes_served_from_cache(self):
+        self.quotes.get_quotes([], universe=held_tickers)
+        with mock.patch("trading_app.views.get_quote_service", return_value=self.quotes), \
+                mock.patch.object(self.quotes, "_missing", return_value=[]):
+            self.assert_constant_queries(4, lambda: self.client.get(reverse('trading_app:portfolio_quotes')))
+
+    def test_full_analysis(self):
+        provider = StaticDataProvider([])
+        context_service = mock.Mock(current=mock.Mock(return_value={"ibov_change": "N/A"}))
+        with mock.patch.object(tasks, "get_shared_data_provider", return_value=provider), \
+                mock.patch.object(tasks, "get_market_context_service", return_value=context_service), \
+                mock.patch.object(tasks, "TICKERS_TO_MONITOR", []):
+            self.assert_constant_queries(3, lambda: self.assertEqual(tasks.perform_full_analysis(self.user.id)["action"], "HOLD"))
+
+    def test_recent_trades_are_read_through_the_index(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("plano de consulta verificado apenas no SQLite")
+        plan = self.portfolio.trade_history.order_by('-timestamp', '-id')[:200].explain()
+        self.assertIn("trade_portfolio_time_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        plan = Position.objects.filter(portfolio=self.portfolio, ticker="T01").explain()
+        self.assertIn("position_portfolio_ticker_idx", plan)
+
+
+class ConcurrentTradeTests(TransactionTestCase):
+    """Operações e ajustes de saldo disparados em paralelo contra o mesmo portfólio não podem perder atualizações."""
+    THREADS = 8
+    REQUESTS_PER_THREAD = 10
+
+    def test_parallel_trades_do_not_lose_balance_updates(self):
+        user = User.objects.create_user("concorrente", password="senha-segura-123")
+        portfolio = Portfolio.objects.create(user=user, balance=Decimal("100000"))
+        start = threading.Barrier(self.THREADS)
+        errors = []
+
+        def worker(index):
+            client = Client()
+            client.force_login(user)
+            start.wait()
+            try:
+                for _ in range(self.REQUESTS_PER_THREAD):
+                    if index % 2:
+                        response = client.post(reverse('trading_app:execute_trade'), {"action": "BUY", "ticker": f"T{index}", "quantity": 3, "price": "10.00"})
+                    else:
+                        response = client.post(reverse('trading_app:update_balance'), {"amount": "7"})
+                    if response.status_code != 302:
+                        errors.append(response.status_code)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        buys = deposits = self.THREADS // 2 * self.REQUESTS_PER_THREAD
+        portfolio.refresh_from_db()
+        self.assertEqual(portfolio.balance, Decimal("100000") - buys * 30 + deposits * 7)
+        self.assertEqual(TradeHistory.objects.filter(portfolio=portfolio).count(), buys)
+        self.assertEqual(Position.objects.filter(portfolio=portfolio).count(), buys)
+        snapshot = PerformanceSnapshot.objects.get(portfolio=portfolio)
+        self.assertEqual((snapshot.trade_count, snapshot.cash_flow), (buys, Decimal(-30 * buys)))
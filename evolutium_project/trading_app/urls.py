@@ -10,8 +10,10 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('report/', views.report_view, name='report'),
+    path('portfolio_quotes/', views.portfolio_quotes, name='portfolio_quotes'),
     path('execute_trade/', views.execute_trade_view, name='execute_trade'),
     path('update_balance/', views.update_balance_view, name='update_balance'),
     path('start_analysis/', views.start_analysis, name='start_analysis'),
+    path('analysis_jobs/<int:job_id>/', views.analysis_job_status, name='analysis_job_status'),
 ]
 
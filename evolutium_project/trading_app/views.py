@@ -1,17 +1,22 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import F
 import math
 import json
 
 from django.http import HttpResponseNotAllowed, JsonResponse
+from django.urls import reverse
 from django.contrib.auth.forms import AuthenticationForm
 
-from .models import Portfolio, UserProfile, Position, TradeHistory
+from .models import Portfolio, UserProfile, Position, TradeHistory, AnalysisJob
 from .forms import CustomUserCreationForm
-from .tasks import perform_full_analysis 
+from .jobs import submit_analysis
+from core_logic.quote_service import get_quote_service
+from .reporting import get_snapshot, held_tickers, record_trade, snapshot_report, value_positions, RECENT_TRADES_IN_TABLE
 
 
 def home(request):
@@ -27,7 +32,7 @@ def register_view(request):
             balance = form.cleaned_data.get('initial_balance')
             api_key = form.cleaned_data.get('gemini_api_key')
             Portfolio.objects.create(user=user, balance=balance)
-            UserProfile.objects.create(user=user, gemini_api_key=api_key)
+            UserProfile.objects.create(user=user, gemini_api_key=api_key, decision_backend=form.cleaned_data.get('decision_backend'))
             login(request, user)
             return redirect('trading_app:dashboard')
     else:
@@ -54,29 +59,58 @@ def logout_view(request):
 
 @login_required
 def dashboard_view(request):
-    portfolio, _ = Portfolio.objects.get_or_create(user=request.user)
-    user_profile, _ = UserProfile.objects.get_or_create(user=request.user)
-    
+    # Portfólio, perfil e snapshot numa consulta e as posições em outra, independentemente do tamanho da carteira.
+    portfolio, _ = (Portfolio.objects.select_related('performance', 'user__userprofile')
+                    .prefetch_related('positions').get_or_create(user=request.user))
+    if not hasattr(portfolio.user, 'userprofile'):
+        UserProfile.objects.create(user=request.user)
+    performance = get_snapshot(portfolio)
+    positions = list(portfolio.positions.all())
+    # Só o que já está em cache: a página não espera a rede; o dashboard.js busca as cotações em seguida.
+    quotes = get_quote_service().cached(position.ticker for position in positions)
+    valuation = value_positions(positions, quotes, portfolio.balance)
+
     context = {
         'portfolio': portfolio,
-        'positions': portfolio.positions.all(),
+        'performance': performance,
+        'positions': valuation['positions'],
+        'totals': valuation['totals'],
         'trade_history': portfolio.trade_history.order_by('-timestamp')[:5]
     }
     return render(request, 'trading_app/dashboard.html', context)
 
+@login_required
+def portfolio_quotes(request):
+    """Marcação a mercado das posições do usuário, em JSON, para o painel atualizar os valores sem recarregar."""
+    portfolio = get_object_or_404(Portfolio, user=request.user)
+    positions = list(portfolio.positions.all())
+    quotes = get_quote_service().get_quotes([position.ticker for position in positions], universe=held_tickers)
+    return JsonResponse(value_positions(positions, quotes, portfolio.balance))
+
+def _job_payload(job):
+    payload = job.as_dict()
+    payload['status_url'] = reverse('trading_app:analysis_job_status', args=[job.id])
+    return payload
+
 @login_required
 def start_analysis(request):
+    """Enfileira a análise e responde 202 na hora; o resultado é consultado em analysis_job_status."""
     if request.method == 'POST':
-        user = request.user
-        analysis_result = perform_full_analysis(user.id)
-        return JsonResponse(analysis_result)
-        
+        job, created = submit_analysis(request.user.id)
+        payload = _job_payload(job)
+        payload['created'] = created
+        return JsonResponse(payload, status=202)
+
     return HttpResponseNotAllowed(['POST'])
 
+@login_required
+def analysis_job_status(request, job_id):
+    job = get_object_or_404(AnalysisJob, id=job_id, user=request.user)
+    return JsonResponse(_job_payload(job))
+
 @login_required
 def execute_trade_view(request):
     if request.method == 'POST':
-        portfolio = Portfolio.objects.get(user=request.user)
         action = request.POST.get('action'); ticker = request.POST.get('ticker')
         quantity = int(request.POST.get('quantity')); price_str = request.POST.get('price', '0').replace(',', '.')
         try:
@@ -85,39 +119,41 @@ def execute_trade_view(request):
             messages.error(request, "O formato do preço recebido é inválido.")
             return redirect('trading_app:dashboard')
 
-        if action == 'BUY':
-            trade_value = price * quantity
-            if portfolio.balance >= trade_value:
-                portfolio.balance -= trade_value
-                Position.objects.create(portfolio=portfolio, ticker=ticker, quantity=quantity, buy_price=price)
-                TradeHistory.objects.create(portfolio=portfolio, ticker=ticker, side='BUY', quantity=quantity, price=price)
-                portfolio.save()
-                messages.success(request, f"Compra de {quantity}x {ticker} executada com sucesso!")
-            else:
-                messages.error(request, "Saldo insuficiente para executar a compra.")
-        
-        elif action == 'SELL':
-            position_to_sell = Position.objects.filter(portfolio=portfolio, ticker=ticker).first()
-            if position_to_sell:
-                trade_value = price * quantity
-                portfolio.balance += trade_value
-                TradeHistory.objects.create(portfolio=portfolio, ticker=ticker, side='SELL', quantity=quantity, price=price)
-                position_to_sell.delete()
-                portfolio.save()
-                messages.success(request, f"Venda de {quantity}x {ticker} executada com sucesso!")
-            else:
-                messages.error(request, "Posição não encontrada para venda.")
+        trade_value = price * quantity
+        with transaction.atomic():
+            # O portfólio fica travado até o fim da transação: operações simultâneas do mesmo usuário são aplicadas
+            # uma de cada vez, e o saldo é alterado no banco (F()) em vez de sobrescrito com um valor lido antes.
+            portfolio = Portfolio.objects.select_for_update().get(user=request.user)
+            if action == 'BUY':
+                if portfolio.balance >= trade_value:
+                    Portfolio.objects.filter(pk=portfolio.pk).update(balance=F('balance') - trade_value)
+                    Position.objects.create(portfolio=portfolio, ticker=ticker, quantity=quantity, buy_price=price)
+                    trade = TradeHistory.objects.create(portfolio=portfolio, ticker=ticker, side='BUY', quantity=quantity, price=price)
+                    record_trade(trade)
+                    messages.success(request, f"Compra de {quantity}x {ticker} executada com sucesso!")
+                else:
+                    messages.error(request, "Saldo insuficiente para executar a compra.")
+
+            elif action == 'SELL':
+                position_to_sell = Position.objects.filter(portfolio=portfolio, ticker=ticker).first()
+                if position_to_sell:
+                    Portfolio.objects.filter(pk=portfolio.pk).update(balance=F('balance') + trade_value)
+                    trade = TradeHistory.objects.create(portfolio=portfolio, ticker=ticker, side='SELL', quantity=quantity, price=price)
+                    record_trade(trade)
+                    position_to_sell.delete()
+                    messages.success(request, f"Venda de {quantity}x {ticker} executada com sucesso!")
+                else:
+                    messages.error(request, "Posição não encontrada para venda.")
         return redirect('trading_app:dashboard')
     return HttpResponseNotAllowed(['POST'])
 
 @login_required
 def update_balance_view(request):
     if request.method == 'POST':
-        portfolio = Portfolio.objects.get(user=request.user)
         amount = Decimal(request.POST.get('amount', '0'))
-        if portfolio.balance + amount >= 0:
-            portfolio.balance += amount
-            portfolio.save()
+        # Atualização condicional numa única instrução: ajustes simultâneos não se sobrescrevem nem deixam o saldo negativo.
+        adjusted = Portfolio.objects.filter(user=request.user, balance__gte=-amount).update(balance=F('balance') + amount)
+        if adjusted:
             messages.success(request, f"Saldo ajustado em R$ {amount:,.2f}.")
         else:
             messages.error(request, "Não é possível deixar o saldo negativo.")
@@ -126,57 +162,19 @@ def update_balance_view(request):
 
 @login_required
 def report_view(request):
-    portfolio = Portfolio.objects.get(user=request.user)
-    trade_history = portfolio.trade_history.order_by('timestamp').all()
-    
-    pnl = Decimal(0)
-    wins = 0
-    total_trades = 0
-    
-    for trade in trade_history:
-        if trade.side == 'SELL':
-            buy_trade = portfolio.trade_history.filter(ticker=trade.ticker, side='BUY', timestamp__lt=trade.timestamp).last()
-            if buy_trade:
-                pnl += (trade.price - buy_trade.price) * trade.quantity
-                if trade.price > buy_trade.price:
-                    wins += 1
-                total_trades += 1
-
-    win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
-
-    balance_over_time = {'labels': [], 'data': []}
-    if trade_history.exists():
-        current_balance = portfolio.balance
-        balance_points = []
-
-        temp_balance = current_balance
-        all_trades = list(reversed(trade_history))
-        
-        for i, trade in enumerate(all_trades):
-            balance_points.append((trade.timestamp, float(temp_balance)))
-            if trade.side == 'BUY':
-                temp_balance += trade.price * Decimal(trade.quantity)
-            else: # SELL
-                temp_balance -= trade.price * Decimal(trade.quantity)
-        
-        initial_balance = temp_balance
-        if trade_history:
-             first_trade_time = trade_history.first().timestamp
-             balance_points.append((first_trade_time, float(initial_balance)))
-
-
-        balance_points.reverse()
-
-        balance_over_time['labels'] = [p[0].strftime('%Y-%m-%d %H:%M') for p in balance_points]
-        balance_over_time['data'] = [p[1] for p in balance_points]
+    portfolio = Portfolio.objects.select_related('performance').get(user=request.user)
+    report = snapshot_report(portfolio)
+    recent_trades = portfolio.trade_history.order_by('-timestamp', '-id')[:RECENT_TRADES_IN_TABLE]
 
     context = {
         'portfolio': portfolio,
-        'trade_history': trade_history,
-        'total_pl': pnl, 
-        'win_rate': win_rate,
-        'total_trades': total_trades,
-        'chart_data': json.dumps(balance_over_time) 
+        'trade_history': recent_trades,
+        'trade_count': report['trade_count'],
+        'recent_trades_limit': RECENT_TRADES_IN_TABLE,
+        'total_pl': report['total_pl'],
+        'win_rate': report['win_rate'],
+        'total_trades': report['total_trades'],
+        'chart_data': json.dumps(report['balance_over_time'])
     }
     return render(request, 'trading_app/report.html', context)
 